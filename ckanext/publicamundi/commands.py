@@ -8,6 +8,7 @@ import optparse
 import zope.interface
 import zope.schema
 import logging
+from StringIO import StringIO
 from datetime import datetime, timedelta, date
 from dateutil.parser import parse as parse_date
 from optparse import make_option 
@@ -68,6 +69,14 @@ class Command(CommandDispatcher):
                 help='Rename dataset if a naming conflict occurs'),
             make_option('--force', action='store_true', dest='force', default=False, 
                 help='Create the dataset even if validation fails'),
+            make_option('--validate-xml', action='store_true', dest='validate_xml', default=False,
+                help='Validate XML metadata against the XML schema (if one exists)'),
+            make_option('--batch', action='store_true', dest='batch', default=False,
+                help='Import several datasets (XML files, directories or zip/tar archives)'),
+            make_option('--batch-size', type='int', dest='batch_size', default=50,
+                help='The number of datasets to be processed as a batch'),
+            make_option('-j', '--jobs', type='int', dest='num_workers', default=1,
+                help='The number of processes used to parse XML metadata'),
         ),
         'adapter-registry-info': (
             make_option('--no-fields', action='store_false', dest='show_fields', default=True),
@@ -81,6 +90,8 @@ class Command(CommandDispatcher):
             make_option('--to-str', action='store_false', dest='to_unicode', default=True),
         ),
         'import-package-translation': (
+            make_option('--batch-size', type='int', dest='batch_size', default=500,
+                help='The number of translations to be written (and committed) as a batch'),
         ),
         'export-package-translation': (
             make_option('--output', type=str, dest='outfile', default='package_translations.csv'),
@@ -229,6 +240,9 @@ class Command(CommandDispatcher):
         if not args:
             raise ValueError('Expected an input file')
         
+        if opts.batch:
+            return self._import_dataset_batch(opts, *args)
+
         source_path = os.path.realpath(args[0])
         if not os.access(source_path, os.R_OK):
             raise ValueError('The input (%s) is not a readable file' %(args[0]))
@@ -237,16 +251,8 @@ class Command(CommandDispatcher):
         # Provide a request context for templating to function
         self._fake_request_context()
         
-        # Create a context for action api calls
-        context = {
-            'model': model,
-            'session': model.Session,
-            'user': self.site_user.get('name'),
-            'ignore_auth': True,
-            'api_version': '3',
-        }
-        
         # Perform api request
+        context = self._make_import_context()
         with open(source_path, 'r') as source:
             data_dict = {
                 'source': source,
@@ -254,12 +260,86 @@ class Command(CommandDispatcher):
                 'owner_org': opts.owner_org,
                 'rename_if_conflict': opts.allow_rename,
                 'continue_on_errors': opts.force,
+                'validate_xml': opts.validate_xml,
             }
             result = get_action('dataset_import')(context, data_dict)
         
         self.logger.info('Imported dataset %(id)s (%(name)s)' %(result))
         return
     
+    def _import_dataset_batch(self, opts, *args):
+        '''Import datasets from several XML files, directories or archives
+        '''
+        
+        import tarfile
+        import zipfile
+        
+        # Classify input paths
+        
+        files, archives = [], []
+        for arg in args:
+            path = os.path.realpath(arg)
+            if os.path.isdir(path):
+                files.extend(sorted(
+                    os.path.join(path, f) for f in os.listdir(path) if f.endswith('.xml')))
+            elif not os.access(path, os.R_OK):
+                raise ValueError('The input (%s) is not a readable file' %(arg))
+            elif zipfile.is_zipfile(path) or tarfile.is_tarfile(path):
+                archives.append(path)
+            else:
+                files.append(path)
+        
+        # Provide a request context for templating to function
+        self._fake_request_context()
+        
+        context = self._make_import_context()
+        
+        data_dict = {
+            'dtype': opts.dtype,
+            'owner_org': opts.owner_org,
+            'rename_if_conflict': opts.allow_rename,
+            'continue_on_errors': opts.force,
+            'validate_xml': opts.validate_xml,
+            'batch_size': opts.batch_size,
+            'num_workers': opts.num_workers,
+        }
+        
+        results = []
+        if files:
+            data_dict['sources'] = iter_file_sources(files)
+            results.extend(get_action('dataset_import_batch')(context, data_dict))
+        for path in archives:
+            self.logger.info('Reading XML metadata from archive %s' %(path))
+            data_dict['sources'] = None
+            data_dict['archive'] = path
+            results.extend(get_action('dataset_import_batch')(context, data_dict))
+        
+        # Report
+        
+        for r in results:
+            if r['status'] == 'created':
+                self.logger.info('Imported dataset %(id)s (%(name)s) from %(source)s' %(r))
+            else:
+                self.logger.error('Failed to import from %s (%s): %s' %(
+                    r['source'], r['status'], r.get('errors')))
+        
+        num_created = sum(1 for r in results if r['status'] == 'created')
+        self.logger.info('Imported %d of %d datasets' %(num_created, len(results)))
+        return
+    
+    def _make_import_context(self):
+        '''Create a context for action api calls
+        '''
+        return {
+            'model': model,
+            'session': model.Session,
+            'user': self.site_user.get('name'),
+            'ignore_auth': True,
+            'api_version': '3',
+            # Allow local archive paths and a pool of workers (see dataset_import_batch)
+            'local_import': True,
+        }
+
     @subcommand('formatter-info', options=options_config['adapter-registry-info'])
     def print_formatter_info(self, opts, *args):
         '''Print information for registered formatters
@@ -384,62 +464,47 @@ class Command(CommandDispatcher):
         '''Import (key-based) package translations from a CSV file.
         
         Note that the importer will only add/update translations for existing packages. 
+        Translations are written in batches (see --batch-size), each one committed
+        separately.
         
         The CSV input is expected to contain lines of: 
         (package_id, source_language, language, key, value, state)
         '''
-        from ckan.plugins import toolkit
-        
-        from ckanext.publicamundi.lib.languages import Language
         from ckanext.publicamundi.lib.metadata.i18n import package_translation
-        from ckanext.publicamundi.lib.metadata import fields, bound_field
         
         infile = args[0]
         if not os.access(infile, os.R_OK):
             raise ValueError('The input (%s) is not readable', infile)
         
-        def get_package(pkg_id):
-            context = {
-                'model': model,
-                'session': model.Session,
-                'ignore_auth': True,
-                'api_version': '3',
-                'validate': False,
-                'translate': False,
-            }
-            return toolkit.get_action('package_show')(context, {'id': pkg_id})
+        # Note Check existence for all packages at once (instead of a package_show
+        # per package)
 
-        uf = fields.TextField()
-        cnt_processed_packages, cnt_skipped_packages = 0, 0
+        package_ids = set(r[0] for r in model.Session.query(model.Package.id))
+        skipped_package_ids = set()
+        
+        def iter_records(reader):
+            for r in reader:
+                if not r['package_id'] in package_ids:
+                    skipped_package_ids.add(r['package_id'])
+                    continue
+                r['value'] = r['value'].decode('utf-8')
+                r.pop('state', None) # always imported as active
+                yield r
+        
+        def report_progress(counts):
+            self.logger.info(
+                'Processed %d translations: %d created, %d updated, %d skipped', 
+                sum(counts.values()), counts['created'], counts['updated'], counts['skipped'])
+        
         with open(infile, 'r') as ifp:
             reader = csv.DictReader(ifp)
-            for pkg_id, records in groupby(reader, itemgetter('package_id')):
-                try:
-                    pkg = get_package(pkg_id)
-                except toolkit.ObjectNotFound:
-                    pkg = None
-                if not pkg:
-                    cnt_skipped_packages += 1
-                    continue
-                cnt_processed_packages += 1
-                cnt_failed_fields, cnt_updated_fields = 0, 0;
-                for r in records:
-                    tr = package_translation.FieldTranslation(pkg_id, r['source_language'])
-                    yf = bound_field(uf, r['key'], '')
-                    try:
-                        tr.translate(yf, r['language'], r['value'].decode('utf-8'))
-                    except Exception as ex:
-                        cnt_failed_fields += 1
-                        self.logger.warn('Failed to update key "%s" for package %s: %s', 
-                            r['key'], pkg_id, str(ex))
-                    else:    
-                        cnt_updated_fields += 1
-                self.logger.info('Updated translations for %d fields for package: %s', 
-                    cnt_updated_fields, pkg_id)
-
+            counts = package_translation.upsert_translations(
+                iter_records(reader), batch_size=opts.batch_size, progress=report_progress)
+        
         self.logger.info(
-            'Imported translations for %d packages. Skipped %d non-existing packages',
-            cnt_processed_packages, cnt_skipped_packages);
+            'Imported %d translations (%d failed). Skipped %d non-existing packages',
+            counts['created'] + counts['updated'], counts['skipped'],
+            len(skipped_package_ids));
         return
     
     @subcommand('migrate-package-extra', options=options_config['migrate-package-extra'])
@@ -597,4 +662,17 @@ def resolve_object_cls(name):
     assert issubclass(object_cls, types.Object), (
         'Expected a subclass of %r (got %r)' % (types.Object, field_cls))
     return object_cls
+
+def iter_file_sources(paths):
+    '''Iterate on sources (file-like objects) for the given file paths.
+    
+    Files are read lazily (i.e. one at a time, as consumed), but every file is
+    read (and closed) before it is yielded: a batch of sources is consumed 
+    before any source of it is read.
+    '''
     
+    for path in paths:
+        with open(path, 'r') as fp:
+            source = StringIO(fp.read())
+        source.name = path
+        yield source
@@ -5,9 +5,16 @@ import errno
 import fcntl
 import logging
 import datetime
+import itertools
+import multiprocessing
+import zipfile
+import tarfile
 import requests
 import urlparse
 import pylons
+from contextlib import closing
+from lxml import etree
+from StringIO import StringIO
 from operator import itemgetter, attrgetter
 
 import ckan.model as model
@@ -18,6 +25,7 @@ from ckan.lib.uploader import get_storage_path
 
 from ckanext.publicamundi import reference_data
 from ckanext.publicamundi.cache_manager import get_cache
+from ckanext.publicamundi.lib import xml_cache
 from ckanext.publicamundi.lib.actions import (
     NameConflict, IdentifierConflict, Invalid)
 from ckanext.publicamundi.lib.languages import check as check_language
@@ -127,6 +135,10 @@ def dataset_import(context, data_dict):
     
     :param rename_if_conflict: hint on what to do when a name conflict is encountered
     :type rename_if_conflict: boolean
+    
+    :param validate_xml: validate source against the XML schema (if one is provided 
+        for this dataset-type) before parsing it
+    :type validate_xml: boolean
 
     :rtype: basic info for the newly created package 
     '''
@@ -149,52 +161,19 @@ def dataset_import(context, data_dict):
         
     allow_rename = data_dict.get('rename_if_conflict', False)
     allow_validation_errors = data_dict.get('continue_on_errors', False)
+    validate_xml = data_dict.get('validate_xml', False)
 
     # Fetch raw XML data
     
-    xmldata = None
-    
-    if isinstance(source, basestring):
-        # Assume source is a URL
-        if not source.startswith('http://'):
-            source = pylons.config['ckan.site_url'] + source.strip('/')
-        source = urlparse.urlparse(source)
-        r1 = requests.get(source.geturl())
-        if not r1.ok:
-            raise Invalid({'source': _('Cannot fetch metadata from source URL')})
-        elif not r1.headers['content-type'] in ['application/xml', 'text/xml']:
-            raise Invalid({'source': _('The source does not contain XML data')})
-        else:
-            xmldata = r1.content
-    else:
-        # Assume source is a file-like object
-        try:
-            xmldata = source.read()
-        except:
-            raise Invalid({'source': _('Cannot read from source')})
+    xmldata = _fetch_xml_source(source)
 
     # Parse XML data as metadata of `dtype` schema
     
-    obj = make_metadata(dtype)
-    try:
-        obj = xml_serializer_for(obj).loads(xmldata)
-    except AssertionError as ex:
-        raise ex
-    except Exception as ex:
-        # Map all parse exceptions to Invalid
-        log.info('Failed to parse XML metadata: %s', ex)
-        raise Invalid({'source': _('The given XML file is malformed: %s') % (ex)})
+    obj = _parse_xml_metadata(dtype, xmldata, validate_xml)
 
     # Prepare package dict
 
-    pkg_dict = {'version': '1.0'}
-    pkg_dict.update(obj.deduce_fields())
-    pkg_dict.update({ 
-        'owner_org': owner_org,
-        'type': 'dataset',
-        'dataset_type': dtype,
-        dtype: obj.to_dict(flat=False),
-    })
+    pkg_dict = _make_package_dict(obj, dtype, owner_org)
     
     # If an identifier is passed, check that this is not already present.
     # Note This is no guarantee that the identifier will be available when
@@ -219,52 +198,137 @@ def dataset_import(context, data_dict):
         pkg_dict['name'] = name
         pkg_dict['title'] += ' ' + name[len(basename):]
     
-    # Create/Update package
+    # Create package
     
-    schema1, validation_errors, error_message = None, None, None
+    return _create_package(context, pkg_dict, allow_validation_errors)
+
+def dataset_import_batch(context, data_dict):
+    '''Import several datasets from given XML sources, in batches.
     
-    if identifier:
-        # Must override catalog-wide schema for actions in this context
-        schema1 = lookup_package_plugin().create_package_schema()
-        schema1['id'] = [unicode]
+    Sources are fetched and parsed (optionally by a pool of worker processes), 
+    name conflicts are resolved with a single query per batch, and packages are 
+    created one batch after another. A failure on a source is reported in its 
+    status entry, and does not stop the import.
+
+    :param sources: a list of sources, each being either a string representing 
+        a (local or external) URL or a file-like object.
+    :type sources: list
     
-    ctx = _make_context(context)
-    if schema1:
-        ctx['schema'] = schema1
+    :param archive: a zip or tar archive of XML files, given as a file-like object 
+        (or as a local path, only for a trusted caller). Can be combined with `sources`.
+    :type archive: string or file-like
+
+    :param dtype: the dataset-type i.e. the schema of imported metadata
+    :type dtype: string
+
+    :param owner_org: the machine-name for the owner organization 
+    :type owner_org: string
+
+    :param continue_on_errors: hint on what to do when validation fails
+    :type continue_on_errors: boolean
+    
+    :param rename_if_conflict: hint on what to do when a name conflict is encountered
+    :type rename_if_conflict: boolean
+    
+    :param validate_xml: validate sources against the XML schema (if one is provided 
+        for this dataset-type) before parsing them
+    :type validate_xml: boolean
+    
+    :param batch_size: the number of sources to be processed as a batch (default: 50)
+    :type batch_size: int
+    
+    :param num_workers: the number of processes to parse sources with (default: 1,
+        i.e. parse in the calling process). Only a trusted caller may request more
+        than one worker.
+    :type num_workers: int
+
+    :rtype: a list of status entries (one for each source), in input order 
     
+    Note A caller is trusted when the context has a true `local_import` flag (this
+    is set by the paster command, it cannot be set by an API request). 
+    '''
+    
+    # Read parameters
+
+    sources = data_dict.get('sources') or []
+    archive = data_dict.get('archive')
+    if not (sources or archive):
+        raise Invalid({'sources': 'Either `sources` or `archive` is required'})
+    
+    dtype = data_dict.get('dtype', 'inspire')
+
     try:
-        pkg_dict = _get_action('package_create')(ctx, data_dict=pkg_dict)
-    except toolkit.ValidationError as ex:
-        if 'name' in ex.error_dict:
-            # The name is probably taken, re-raise exception
-            raise ex
-        elif allow_validation_errors:
-            # Save errors and retry with a different context
-            validation_errors = ex.error_dict
-            error_message = ex.message or _('The dataset contains invalid metadata')
-            ctx = _make_context(context, skip_validation=True)
-            if schema1:
-                ctx['schema'] = schema1
-            pkg_dict = _get_action('package_create')(ctx, data_dict=pkg_dict)
-            log.warn('Forced to create an invalid package as %r ' % (name))
-        else:
-            raise ex
+        owner_org = data_dict['owner_org']
+    except KeyError:
+        raise Invalid({'owner_org':
+            'The `owner_org` parameter is required.\n'
+            'Hint: Use `organization_list_for_user` to retrieve a valid list.'})
+        
+    allow_rename = data_dict.get('rename_if_conflict', False)
+    allow_validation_errors = data_dict.get('continue_on_errors', False)
+    validate_xml = data_dict.get('validate_xml', False)
+    
+    errors = {}
+    try:
+        batch_size = max(int(data_dict.get('batch_size', 50)), 1)
+    except (TypeError, ValueError):
+        errors['batch_size'] = _('Expected an integer')
+    try:
+        num_workers = int(data_dict.get('num_workers', 1))
+    except (TypeError, ValueError):
+        errors['num_workers'] = _('Expected an integer')
+    
+    # Note Reading server-side paths, or forking worker processes (from the web
+    # process), is only allowed for a trusted (i.e. non-API) caller
+    
+    if not context.get('local_import'):
+        if isinstance(archive, basestring):
+            errors['archive'] = _('Expected an uploaded file (not a path)')
+        if not 'num_workers' in errors and num_workers > 1:
+            errors['num_workers'] = _('Only a single worker is allowed')
+    
+    if errors:
+        raise Invalid(errors)
 
-    assert name == pkg_dict['name']
-    assert (not identifier) or (identifier == pkg_dict['id'])
+    # Prepare an iterator on (label, source) pairs
 
-    return {
-        # Provide basic package fields
-        'id': pkg_dict['id'], 
-        'name': name,
-        'title': pkg_dict['title'],
-        'state': pkg_dict.get('state'),
-        # Provide details on validation (meaningfull if allow_validation_errors)
-        'validation': {
-            'message': error_message,
-            'errors': validation_errors,
-        },
-    }
+    items = ((_label_for_source(source, i), source) 
+        for i, source in enumerate(sources))
+    if archive:
+        items = itertools.chain(items, _iter_archive(archive))
+
+    # Process in batches
+
+    pool = None
+    if num_workers > 1:
+        pool = multiprocessing.Pool(num_workers, initializer=_init_worker)
+    
+    max_num_probes = 10 if allow_rename else 1
+    
+    results = []
+    try:
+        while True:
+            batch = list(itertools.islice(items, batch_size))
+            if not batch:
+                break
+            
+            # Fetch and parse (in parallel, if a pool is available)
+            
+            parsed = _parse_batch(
+                [t[1] for t in batch], dtype, owner_org, validate_xml, pool)
+            
+            results.extend(_create_package_batch(
+                context, [t[0] for t in batch], parsed, 
+                max_num_probes, allow_validation_errors))
+            
+            log.info('Imported a batch of %d datasets (%d so far)', 
+                len(batch), len(results))
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    
+    return results
 
 def dataset_translation_update_field(context, data_dict):
     '''Translate a dataset field for the active language.
@@ -405,26 +469,30 @@ def dataset_translation_update(context, data_dict):
     _check_access(
         'package_translation_update', context, {'org': pkg['owner_org']})
     
-    # Translate structured metadata
-    
+    # Note All translations (structured and core metadata) are written at once
+
     translator = translator_for(md, source_lang)
-    md = translator.translate(lang, data_dict[dtype])
+    with translator.batch():
     
-    pkg[dtype] = md.to_json(return_string=False)
-
-    # Translate core CKAN metadata
-
-    field_translator = translator.get_field_translator
-    uf = fields.TextField()
-    for k in ('title', 'notes'):
-        v = data_dict.get(k)
-        if not (v and pkg.get(k)):
-            continue # nothing to translate
-        tr = field_translator(bound_field(uf, (k,), pkg[k]))
-        if not tr:
-            continue 
-        yf = tr.translate(lang, v)
-        pkg[k] = v
+        # Translate structured metadata
+        
+        md = translator.translate(lang, data_dict[dtype])
+        
+        pkg[dtype] = md.to_json(return_string=False)
+
+        # Translate core CKAN metadata
+
+        field_translator = translator.get_field_translator
+        uf = fields.TextField()
+        for k in ('title', 'notes'):
+            v = data_dict.get(k)
+            if not (v and pkg.get(k)):
+                continue # nothing to translate
+            tr = field_translator(bound_field(uf, (k,), pkg[k]))
+            if not tr:
+                continue 
+            yf = tr.translate(lang, v)
+            pkg[k] = v
 
     # Return translated view of this package
 
@@ -470,6 +538,332 @@ def _target_language(data_dict):
             raise Invalid({'translate_to_language': msg}) 
     return lang
 
+def _fetch_xml_source(source):
+    '''Fetch raw XML data from a source (a URL or a file-like object)
+    '''
+    
+    xmldata = None
+    
+    if isinstance(source, basestring):
+        # Assume source is a URL
+        if not source.startswith('http://'):
+            source = pylons.config['ckan.site_url'] + source.strip('/')
+        source = urlparse.urlparse(source)
+        r1 = requests.get(source.geturl())
+        if not r1.ok:
+            raise Invalid({'source': _('Cannot fetch metadata from source URL')})
+        elif not r1.headers['content-type'] in ['application/xml', 'text/xml']:
+            raise Invalid({'source': _('The source does not contain XML data')})
+        else:
+            xmldata = r1.content
+    else:
+        # Assume source is a file-like object
+        try:
+            xmldata = source.read()
+        except:
+            raise Invalid({'source': _('Cannot read from source')})
+    
+    return xmldata
+
+def _parse_xml_metadata(dtype, xmldata, validate=False):
+    '''Parse XML data as metadata of `dtype` schema.
+
+    If `validate` is requested (and the XML serializer can validate against a
+    schema), the XML data are validated before they are parsed.
+    '''
+    
+    obj = make_metadata(dtype)
+    xser = xml_serializer_for(obj)
+    
+    if validate and hasattr(xser, 'validate_xml'):
+        try:
+            e = etree.fromstring(xmldata, etree.XMLParser(resolve_entities=False))
+        except etree.XMLSyntaxError as ex:
+            raise Invalid({'source': _('The given XML file is malformed: %s') % (ex)})
+        errors = xser.validate_xml(e)
+        if errors:
+            raise Invalid({'source': [
+                _('Line %d: %s') % (line, message) for line, message in errors]})
+    
+    try:
+        obj = xser.loads(xmldata)
+    except AssertionError as ex:
+        raise ex
+    except Exception as ex:
+        # Map all parse exceptions to Invalid
+        log.info('Failed to parse XML metadata: %s', ex)
+        raise Invalid({'source': _('The given XML file is malformed: %s') % (ex)})
+    
+    return obj
+
+def _make_package_dict(obj, dtype, owner_org):
+    '''Prepare a package dict for a parsed metadata object
+    '''
+    
+    pkg_dict = {'version': '1.0'}
+    pkg_dict.update(obj.deduce_fields())
+    pkg_dict.update({ 
+        'owner_org': owner_org,
+        'type': 'dataset',
+        'dataset_type': dtype,
+        dtype: obj.to_dict(flat=False),
+    })
+
+    return pkg_dict
+
+def _create_package(context, pkg_dict, allow_validation_errors=False):
+    '''Create a package from a prepared (i.e. named) package dict.
+    '''
+    
+    name = pkg_dict['name']
+    identifier = pkg_dict.get('id')
+    
+    schema1, validation_errors, error_message = None, None, None
+    
+    if identifier:
+        # Must override catalog-wide schema for actions in this context
+        schema1 = lookup_package_plugin().create_package_schema()
+        schema1['id'] = [unicode]
+    
+    ctx = _make_context(context)
+    if schema1:
+        ctx['schema'] = schema1
+    
+    try:
+        pkg_dict = _get_action('package_create')(ctx, data_dict=pkg_dict)
+    except toolkit.ValidationError as ex:
+        if 'name' in ex.error_dict:
+            # The name is probably taken, re-raise exception
+            raise ex
+        elif allow_validation_errors:
+            # Save errors and retry with a different context
+            validation_errors = ex.error_dict
+            error_message = ex.message or _('The dataset contains invalid metadata')
+            ctx = _make_context(context, skip_validation=True)
+            if schema1:
+                ctx['schema'] = schema1
+            pkg_dict = _get_action('package_create')(ctx, data_dict=pkg_dict)
+            log.warn('Forced to create an invalid package as %r ' % (name))
+        else:
+            raise ex
+
+    assert name == pkg_dict['name']
+    assert (not identifier) or (identifier == pkg_dict['id'])
+
+    return {
+        # Provide basic package fields
+        'id': pkg_dict['id'], 
+        'name': name,
+        'title': pkg_dict['title'],
+        'state': pkg_dict.get('state'),
+        # Provide details on validation (meaningfull if allow_validation_errors)
+        'validation': {
+            'message': error_message,
+            'errors': validation_errors,
+        },
+    }
+
+def _label_for_source(source, i):
+    if isinstance(source, basestring):
+        return source
+    return getattr(source, 'name', None) or ('source-%d' % (i))
+
+def _iter_archive(archive):
+    '''Iterate on (name, file-like) pairs for XML members of a zip/tar archive
+    '''
+    
+    is_zip = zipfile.is_zipfile(archive)
+    if not isinstance(archive, basestring):
+        archive.seek(0)
+    
+    if is_zip:
+        with zipfile.ZipFile(archive) as zf:
+            for info in zf.infolist():
+                if info.filename.endswith('.xml'):
+                    yield info.filename, StringIO(zf.read(info))
+    else:
+        try:
+            if isinstance(archive, basestring):
+                tf = tarfile.open(archive)
+            else:
+                tf = tarfile.open(fileobj=archive)
+        except tarfile.TarError:
+            raise Invalid({'archive': _('Expected a zip or tar archive')})
+        with closing(tf):
+            for member in tf:
+                if member.isfile() and member.name.endswith('.xml'):
+                    yield member.name, StringIO(tf.extractfile(member).read())
+
+def _normalize_source(source):
+    '''Convert a source to something that can be passed to a worker process,
+    i.e. a full URL or raw XML data (wrapped into a file-like object)
+    '''
+    
+    if isinstance(source, basestring):
+        if not source.startswith('http://'):
+            source = pylons.config['ckan.site_url'] + source.strip('/')
+        return source
+    else:
+        return StringIO(_fetch_xml_source(source))
+
+def _parse_batch(sources, dtype, owner_org, validate_xml=False, pool=None):
+    '''Fetch and parse a batch of sources into package dicts (in parallel, if a 
+    pool of workers is given).
+
+    Return a list of (<pkg-dict>, <error-dict>) tuples (see _parse_source).
+    '''
+    
+    args = []
+    for source in sources:
+        try:
+            source = _normalize_source(source)
+        except Invalid as ex:
+            source = ex
+        args.append((dtype, owner_org, validate_xml, source))
+    
+    return pool.map(_parse_source, args) if pool else map(_parse_source, args)
+
+# Keep objects inherited by a worker process (see _init_worker)
+_inherited_by_worker = []
+
+def _init_worker():
+    '''Initialize a worker process of the pool used to parse sources.
+    
+    A worker is forked from a process that may already hold database connections
+    (e.g. inside the session), so these must never be used or closed by it (this 
+    would break the connections of the parent process). Keep them referenced
+    (so they are not finalized), and let the worker start with a fresh session 
+    and connection pool.
+    '''
+    
+    engine = model.meta.engine
+    if engine is None:
+        return # noop: the model is not initialized
+    
+    _inherited_by_worker.append((engine.pool, model.Session.registry()))
+    engine.pool = engine.pool.recreate()
+    model.Session.registry.clear()
+
+def _parse_source(args):
+    '''Fetch and parse a source into a package dict. 
+    
+    This is meant to run inside a worker process, so it returns a (picklable) 
+    tuple of (<pkg-dict>, <error-dict>).
+    '''
+    dtype, owner_org, validate_xml, source = args
+    try:
+        if isinstance(source, Exception):
+            raise source
+        xmldata = _fetch_xml_source(source)
+        obj = _parse_xml_metadata(dtype, xmldata, validate_xml)
+        pkg_dict = _make_package_dict(obj, dtype, owner_org)
+    except toolkit.ValidationError as ex:
+        return (None, ex.error_dict)
+    except Exception as ex:
+        return (None, {'source': '%s: %s' % (type(ex).__name__, ex)})
+    return (pkg_dict, None)
+
+def _create_package_batch(context, labels, parsed, max_num_probes=1, 
+        allow_validation_errors=False):
+    '''Create packages for a batch of parsed package dicts.
+
+    Name and identifier conflicts are checked with a single query (for the whole
+    batch). Return a list of status entries.
+    '''
+    
+    results = [{'source': label} for label in labels]
+    
+    # Check identifiers in bulk
+    
+    identifiers = [p.get('id') for p, errors in parsed if p and p.get('id')]
+    taken_identifiers = _find_existing_package_ids(context, identifiers)
+    
+    # Find names in bulk
+
+    basenames = [p['name'] if p else None for p, errors in parsed]
+    names = _find_package_names(context, basenames, max_num_probes)
+    
+    # Create
+    
+    for result, (pkg_dict, errors), name in zip(results, parsed, names):
+        if errors:
+            result.update({'status': 'invalid', 'errors': errors})
+            continue
+        
+        identifier = pkg_dict.get('id')
+        if identifier and identifier in taken_identifiers:
+            result.update({'status': 'conflict', 'errors': {
+                'id': _('A package identified as %s already exists') % (identifier)}})
+            continue
+        if identifier:
+            taken_identifiers.add(identifier)
+        
+        basename = pkg_dict['name']
+        if not name:
+            result.update({'status': 'conflict', 'errors': {
+                'name': _('The package name %r is not available') % (basename)}})
+            continue
+        pkg_dict['name'] = name
+        pkg_dict['title'] += ' ' + name[len(basename):]
+        
+        try:
+            result.update(_create_package(context, pkg_dict, allow_validation_errors))
+        except toolkit.ValidationError as ex:
+            result.update({'status': 'invalid', 'errors': ex.error_dict})
+        except Exception as ex:
+            log.exception('Failed to create package %r', name)
+            result.update({'status': 'failed', 'errors': {
+                '__after': ['%s: %s' % (type(ex).__name__, ex)]}})
+        else:
+            result['status'] = 'created'
+    
+    return results
+
+def _find_existing_package_ids(context, identifiers):
+    '''Return the subset of identifiers that are already used by packages 
+    '''
+    if not identifiers:
+        return set()
+    model = context['model']
+    q = model.Session.query(model.Package.id).filter(
+        model.Package.id.in_(set(identifiers)))
+    return set(r[0] for r in q)
+
+def _find_package_names(context, basenames, max_num_probes=12):
+    '''Find available (non-occupied) package names for several packages at once.
+    
+    This works like _find_a_package_name, but probes all candidate names with a 
+    single query. Names assigned to earlier items are also considered occupied.
+    A None basename maps to None.
+    '''
+    
+    suffix_fmt = '~{num_probes:d}'
+    
+    def candidates(basename):
+        yield basename
+        for num_probes in range(1, max_num_probes):
+            yield basename + suffix_fmt.format(num_probes=num_probes)
+    
+    all_candidates = set(itertools.chain.from_iterable(
+        candidates(basename) for basename in set(basenames) if basename))
+    
+    taken = set()
+    if all_candidates:
+        model = context['model']
+        q = model.Session.query(model.Package.name).filter(
+            model.Package.name.in_(all_candidates))
+        taken.update(r[0] for r in q)
+
+    names = []
+    for basename in basenames:
+        name = None
+        if basename:
+            name = next((n for n in candidates(basename) if not n in taken), None)
+            if name:
+                taken.add(name)
+        names.append(name)
+    return names
+
 def _make_context(context, **opts):
     '''Make a new context for an action, based on an initial context.
     
@@ -531,15 +925,11 @@ def _find_a_package_name(context, basename, max_num_probes=12):
     return name if found else None
 
 def _transform_dcat(xml_dom):
-    from lxml import etree
-
+    
+    # Transform using XSLT (compiled once per process)
     xsl_file = reference_data.get_path('xsl/iso-19139-to-dcat-ap.xsl')
-    result = None
-    with open(xsl_file, 'r') as fp:
-        # Transform using XSLT
-        dcat_xslt = etree.parse(fp)
-        dcat_transform = etree.XSLT(dcat_xslt)
-        result = dcat_transform(xml_dom)
-        result = unicode(result).encode('utf-8')
+    dcat_transform = xml_cache.get_xslt(xsl_file)
+    result = dcat_transform(xml_dom)
+    result = unicode(result).encode('utf-8')
 
     return result
@@ -6,77 +6,92 @@ from operator import itemgetter, attrgetter
 
 def flatten(d, key_converter=None):
     '''Flatten a dictionary'''
-    res = None
-    d1 = _flatten_items(d.iteritems())
     if key_converter and callable(key_converter):
-        res = { key_converter(k):v for k,v in d1.items() }
+        return { key_converter(k): v for k, v in iter_flattened(d) }
     else:
-        res = d1
-    return res
+        return dict(iter_flattened(d))
+
+def iter_flattened(d):
+    '''Iterate on the (flattened) key/value pairs of a dictionary.
+    
+    This yields the same pairs that flatten() would keep in its result, 
+    without building intermediate dicts. 
+    '''
+    
+    # Walk using an explicit stack of (key-prefix, items-iterator) pairs
+    stack = [((), d.iteritems())]
+    push, pop = stack.append, stack.pop
+    while stack:
+        prefix, it = stack[-1]
+        for k, v in it:
+            # Detect value type, decide if we must descend
+            if isinstance(v, dict):
+                push((prefix + (k,), v.iteritems()))
+                break
+            elif isinstance(v, (list, tuple)):
+                push((prefix + (k,), enumerate(v)))
+                break
+            else:
+                yield prefix + (k,), v
+        else:
+            pop()
 
 def unflatten(d, key_converter=None):
     '''Unflatten a dictionary'''
-    res = None
     if key_converter and callable(key_converter):
-        d1 = { key_converter(k):v for k,v in d.items() }
+        items = ((key_converter(k), v) for k, v in d.iteritems())
     else:
-        d1 = d
-    res = _unflatten(d)
-    return res
-
-def _unflatten(d):
-    keys = sorted(d)
-    
-    # Collect all pairs (k,res1) for this level
-    
-    pairs = list()
-    is_list, i1, i = True, -1, None
-    for k,g in itertools.groupby(keys, lambda t: t[0]):
-        # Guess the key type (update is_list flag)
-        if is_list:
-            # We have'nt (yet) discovered a non-index key  
-            i = _as_integer(k)
-            is_list = isinstance(i, int) and (i == i1 +1)
-            i1 = i
-        # Create another pair
-        d1 = dict()
-        for k1 in g:
-            d1[k1[1:]] = d[k1]
-        if d1.has_key(()):
-            res1 = d1.pop(())
+        items = d.iteritems()
+    return _unflatten(items)
+
+class _Node(dict):
+    '''A (non-leaf) node of the trie built while unflattening'''
+    __slots__ = ()
+
+def _unflatten(items):
+    '''Unflatten (key, value) pairs in a single pass. 
+    
+    Keys are inserted in a trie, and each level is converted to a list (when 
+    its keys are found to be a sequence of integers, starting at 0) or to a 
+    dict. Note that a leaf value shadows any deeper key under the same path. 
+    '''
+
+    root = _Node()
+    for k, v in items:
+        node = root
+        for k1 in k[:-1]:
+            child = node.get(k1)
+            if child is None and not k1 in node:
+                child = node[k1] = _Node()
+            elif not isinstance(child, _Node):
+                break # shadowed by a leaf value
+            node = child
         else:
-            res1 = _unflatten(d1)
-        pairs.append((k, res1))
+            node[k[-1]] = v
+    return _build_from_node(root)
+
+def _build_from_node(node):
+    keys = sorted(node)
     
-    # Build result to proper type (dict/list)
+    # Guess the key type: a list has (sorted) keys 0, 1, 2, ...
     
-    res = None
-    if not pairs:
-        res = dict()
-    elif is_list:
-        res = [ v for k, v in sorted(pairs) ]
+    is_list, i1 = True, -1
+    for k in keys:
+        i = _as_integer(k)
+        is_list = isinstance(i, int) and (i == i1 +1)
+        if not is_list:
+            break
+        i1 = i
+    
+    # Build result to proper type (dict/list)
+
+    if is_list and keys:
+        return [
+            (_build_from_node(v) if isinstance(v, _Node) else v) 
+                for v in (node[k] for k in keys)]
     else:
-        res = dict(pairs)
-    return res
-
-def _flatten_items(items):
-    ''' A simple flattening routine based on the type of each value item.'''
-    res = {}
-    for k,v in items:
-        # Detect value type
-        it1 = None
-        if isinstance(v, dict):
-            it1 = v.iteritems()
-        elif isinstance(v, list) or isinstance(v, tuple):
-            it1 = enumerate(v)
-        # Decide if we must descent
-        if it1:
-            res1 = _flatten_items(it1)
-            for k1,v1 in res1.items():
-                res[(k,)+k1] = v1
-        else:
-            res[(k,)] = v
-    return res
+        return { k: (_build_from_node(v) if isinstance(v, _Node) else v) 
+            for k, v in node.iteritems() }
 
 def _as_integer(x):
     n = None
@@ -3,13 +3,16 @@ import datetime
 
 class JsonEncoder(json.JSONEncoder):
     '''Override default json.JSONEncoder behaviour so that it can serialize
-    datetime objects
+    datetime objects and metadata objects (even lazy ones).
     '''
     def default(self, o):
+        from ckanext.publicamundi.lib.metadata.base import Object
+        
         if (isinstance(o, datetime.datetime) or 
                 isinstance(o, datetime.date) or
                 isinstance(o, datetime.time)):
             return o.isoformat()
+        elif isinstance(o, Object):
+            return o.to_json(return_string=False)
         else:
             return json.JSONEncoder.default(self, o)
-
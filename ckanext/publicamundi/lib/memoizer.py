@@ -1,20 +1,153 @@
+'''Provide a memoizer for (mostly introspection-related) helpers.
+
+Every memoized function keeps its own cache of results which is protected by a
+lock (so it can be shared among threads) and is optionally bounded (as an LRU
+cache). For example:
+
+    >>> @memoize
+    ... def f(x):
+    ...     return x * 2
+
+    >>> @memoize(maxsize=64)
+    ... def g(x, y):
+    ...     return x + y
+
+A memoized function exposes its cache (as `cache` attribute) so that it can be
+inspected or cleared, i.e.:
+
+    >>> g.cache.stats()
+    {'hits': 0, 'misses': 0, 'size': 0, 'maxsize': 64}
+    >>> g.cache.clear()
+
+Caches are reported (see `stats`) under the module-qualified name of a function,
+unless a name is explicitly given, e.g. `@memoize(name='Foo.get_schema')`.
+
+'''
+
+import threading
+import weakref
+from collections import OrderedDict
 from functools import wraps
 
-# Note Not sure if _cache is thread-safe. 
-# At least for CPython, it is supposed to be safe as of GIL, see:
-# https://docs.python.org/2/glossary.html#term-global-interpreter-lock
-# If not, it should be replaced by a threading.local instance.
-_cache = dict()
+# Keep a (weak) registry of all per-function caches: a cache is kept alive only
+# by the memoized function that uses it
+
+_caches = weakref.WeakValueDictionary()
+
+class Cache(object):
+    '''A thread-safe (and optionally bounded) cache for the results of a function.
+    '''
+
+    def __init__(self, fn, maxsize=None, name=None):
+        self.fn = fn
+        self.name = name
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict() if maxsize else dict()
+        self._lock = threading.Lock()
+
+    def get(self, cid, default=None):
+        with self._lock:
+            try:
+                res = self._data[cid]
+            except KeyError:
+                self.misses += 1
+                return default
+            self.hits += 1
+            if self.maxsize:
+                # Mark as most recently used
+                del self._data[cid]
+                self._data[cid] = res
+        return res
+
+    def set(self, cid, res):
+        with self._lock:
+            data = self._data
+            data[cid] = res
+            if self.maxsize:
+                while len(data) > self.maxsize:
+                    data.popitem(last=False)
+
+    def delete_many(self, cids):
+        with self._lock:
+            for cid in cids:
+                self._data.pop(cid, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+        }
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, cid):
+        return cid in self._data
+
+_missing = object()
+
+def memoize(fn=None, maxsize=None, name=None):
+    '''Memoize a function (on its positional arguments).
+
+    Can be used either as a plain decorator, or (when options are needed) as a
+    decorator factory, e.g. `@memoize(maxsize=100)`.
+
+    The cache is named after the function (qualified by its module), unless an
+    explicit `name` is given.
+
+    Note that results are computed outside of the cache lock, so a function
+    may (rarely) be evaluated more than once for the same arguments.
+    '''
+
+    if fn is None:
+        return lambda fn: memoize(fn, maxsize=maxsize, name=name)
+
+    if not name:
+        name = '%s.%s' % (fn.__module__, fn.__name__)
+    cache = Cache(fn, maxsize, name=name)
+    _caches[id(cache)] = cache
 
-def memoize(fn):
-    cached_results = _cache[fn] = dict()
     @wraps(fn)
     def wrapped(*args):
         cid = args
-        if cid in cached_results:
-            res = cached_results[cid]
-        else:
-            res = cached_results[cid] = fn(*args)
+        try:
+            res = cache.get(cid, _missing)
+        except TypeError:
+            # Unhashable arguments: cannot be memoized
+            return fn(*args)
+        if res is _missing:
+            res = fn(*args)
+            cache.set(cid, res)
         return res
+
+    wrapped.cache = cache
     return wrapped
 
+def clear():
+    '''Clear all caches kept for memoized functions.
+    '''
+    for cache in _caches.values():
+        cache.clear()
+
+def stats():
+    '''Return statistics for all memoized functions, keyed by cache name.
+    '''
+    result = {}
+    for cache in _caches.values():
+        name = cache.name
+        if name in result:
+            # Ambiguous (e.g. equally named methods in a module): add line number
+            code = getattr(cache.fn, 'func_code', None)
+            name = '%s:%d' % (name, code.co_firstlineno if code else id(cache))
+        result[name] = cache.stats()
+    return result
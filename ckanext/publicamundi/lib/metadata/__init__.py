@@ -30,6 +30,7 @@ from .base import (
     FieldContext,
     bound_field,
     ErrorDict,
+    ErrorRecord,
     object_null_adapter,
     factory_for_object,
     class_for_object,
@@ -3,6 +3,9 @@ import logging
 import json
 import itertools
 import copy
+import operator
+import hashlib
+from collections import namedtuple
 import zope.interface
 import zope.interface.verify
 import zope.schema
@@ -23,6 +26,8 @@ from .ibase import (
     IFormatter, IFormatSpec)
 from .fields import IObjectField
 from . import formatters
+from . import format_cache
+from .lazy import materialize
 from .formatters import (
     formatter_for_field, field_format_adapter, 
     BaseFormatter, BaseFieldFormatter, FormatSpec)
@@ -71,6 +76,146 @@ def flatten_field(field):
     
     return res
 
+class _Wildcard(object):
+    
+    __slots__ = ()
+
+    def __repr__(self):
+        return '*'
+
+class FlattenedFieldIndex(object):
+    '''A lazy index of the flattened fields of a zope-based schema.
+    
+    Unlike flatten_schema(), collection positions (i.e. list indices, or dict keys
+    from a vocabulary) are represented by a wildcard (FlattenedFieldIndex.ANY), so 
+    the index has exactly one entry per leaf field. Concrete keys are only 
+    materialized when asked for.
+    
+    Example:
+        >>> index = FlattenedFieldIndex(IFoo)
+        >>> index.patterns()
+        [('title',), ('contacts', *, 'email'), ...]
+        >>> index.lookup(('contacts', 0, 'email'))
+        <zope.schema._bootstrapfields.TextLine object at 0x...>
+    '''
+    
+    ANY = _Wildcard()
+
+    __slots__ = ('schema', '_entries', '_trie')
+
+    def __init__(self, schema):
+        self.schema = schema
+        self._entries = None
+        self._trie = None
+    
+    @property
+    def entries(self):
+        '''A list of (pattern, field, domains) entries, where domains is a tuple 
+        of the domains (i.e. list of keys) for every wildcard of pattern.
+        '''
+        if self._entries is None:
+            entries = []
+            self._index_schema(self.schema, (), (), entries)
+            self._entries = entries
+        return self._entries
+
+    def patterns(self):
+        return [t[0] for t in self.entries]
+
+    def iteritems(self, predicate=None):
+        '''Iterate on materialized (key, field) pairs.
+        
+        If a predicate is given, only entries whose field satisfy it will be
+        materialized.
+        '''
+        ANY = self.ANY
+        for pattern, field, domains in self.entries:
+            if predicate and not predicate(field):
+                continue
+            if not domains:
+                yield pattern, field
+                continue
+            for values in itertools.product(*domains):
+                values = iter(values)
+                yield tuple(
+                    (next(values) if k is ANY else k) for k in pattern), field
+    
+    def materialize(self):
+        return dict(self.iteritems())
+
+    def lookup(self, kt):
+        '''Lookup a leaf field at a (concrete) key path kt. 
+        Return None if nothing is found.
+        '''
+        if self._trie is None:
+            self._trie = self._build_trie()
+        
+        ANY = self.ANY
+        node = self._trie
+        for k in kt:
+            if not isinstance(node, dict):
+                return None
+            child = node.get(k)
+            if child is None:
+                t = node.get(ANY)
+                if t is None:
+                    return None
+                domain, child = t
+                if isinstance(domain, xrange):
+                    if not (isinstance(k, (int, long)) and 0 <= k < len(domain)):
+                        return None
+                elif not k in domain:
+                    return None
+            node = child
+        return None if isinstance(node, dict) else node
+
+    def __len__(self):
+        return sum(
+            reduce(lambda n, domain: n * len(domain), domains, 1) 
+                for pattern, field, domains in self.entries)
+
+    def _build_trie(self):
+        ANY = self.ANY
+        trie = {}
+        for pattern, field, domains in self.entries:
+            node, domains = trie, iter(domains)
+            for i, k in enumerate(pattern):
+                is_last = (i + 1 == len(pattern))
+                if k is ANY:
+                    t = node.get(ANY)
+                    if t is None:
+                        t = node[ANY] = (next(domains), field if is_last else {})
+                    else:
+                        next(domains)
+                    node = t[1]
+                else:
+                    node = node.setdefault(k, field if is_last else {})
+        return trie
+    
+    @classmethod
+    def _index_schema(cls, schema, prefix, domains, entries):
+        for k, field in zope.schema.getFields(schema).iteritems():
+            cls._index_field(field, prefix + (k,), domains, entries)
+
+    @classmethod
+    def _index_field(cls, field, prefix, domains, entries):
+        assert isinstance(field, zope.schema.Field)
+        
+        if isinstance(field, zope.schema.Object):
+            cls._index_schema(field.schema, prefix, domains, entries)
+        elif isinstance(field, (zope.schema.List, zope.schema.Tuple)):
+            domain = xrange(0, field.max_length)
+            cls._index_field(
+                field.value_type, prefix + (cls.ANY,), domains + (domain,), entries)
+        elif isinstance(field, zope.schema.Dict):
+            assert isinstance(field.key_type, zope.schema.Choice), \
+                'Only zope.schema.Choice supported for key_type'
+            domain = tuple(t.value for t in field.key_type.vocabulary)
+            cls._index_field(
+                field.value_type, prefix + (cls.ANY,), domains + (domain,), entries)
+        else:
+            entries.append((prefix, field, domains))
+
 #
 # Base implementation  
 #
@@ -90,10 +235,197 @@ class FieldContext(object):
 def bound_field(field, key, value, title=None):
     return field.bind(FieldContext(key=key, value=value, title=title))
 
+class FieldSlot(object):
+    '''A data descriptor for a field of a compact Object class. 
+    
+    The value is kept at a fixed position of the instance's value list.
+    '''
+
+    __slots__ = ('name', 'index', 'class_attr')
+
+    def __init__(self, name, index, class_attr=None):
+        self.name, self.index, self.class_attr = name, index, class_attr
+
+    def __get__(self, obj, obj_cls=None):
+        if obj is None:
+            return self
+        try:
+            return obj._field_values_[self.index]
+        except AttributeError:
+            raise AttributeError(self.name)
+
+    def __set__(self, obj, value):
+        try:
+            values = obj._field_values_
+        except AttributeError:
+            values = obj._field_values_ = list(type(obj)._get_compact_layout().defaults)
+        values[self.index] = value
+
+    def __repr__(self):
+        return '%s(%r, %d)' % (self.__class__.__name__, self.name, self.index)
+
+class CompactLayout(object):
+    '''Describe the value list for instances of a compact Object class.
+
+    Immutable (non-factory) defaults are shared as a template, and are only 
+    copied when an instance is created.
+    '''
+
+    def __init__(self, obj_cls):
+        self.keys = tuple(k for k, _ in obj_cls.iter_fields(exclude_properties=True))
+        self.index = {k: i for i, k in enumerate(self.keys)}
+        defaults, factories = [], []
+        for i, (k, field) in enumerate(obj_cls.iter_fields(exclude_properties=True)):
+            factory = obj_cls.get_field_factory(k, field)
+            if factory:
+                factories.append((i, k, factory))
+                defaults.append(None)
+            else:
+                defaults.append(field.default)
+        self.defaults = tuple(defaults)
+        self.factories = tuple(factories)
+    
+    def install(self, obj_cls):
+        for i, k in enumerate(self.keys):
+            attr = getattr(obj_cls, k, _missing)
+            if isinstance(attr, FieldSlot):
+                attr = attr.class_attr
+            setattr(obj_cls, k, FieldSlot(k, i, attr))
+
+def _getstate_compact(obj):
+    state = obj.__dict__.copy()
+    values = getattr(obj, '_field_values_', None)
+    if values is not None:
+        keys = type(obj)._get_compact_layout().keys
+        state['_field_values_'] = dict(zip(keys, values))
+    return state
+
+def _copy_compact(obj):
+    res = type(obj).__new__(type(obj))
+    values = getattr(obj, '_field_values_', None)
+    if values is not None:
+        res._field_values_ = list(values)
+    d = getattr(obj, '__dict__', None)
+    if d:
+        res.__dict__.update(d)
+    return res
+
+def _setstate_compact(obj, state):
+    state = dict(state)
+    values = state.pop('_field_values_', None)
+    if values is not None:
+        layout = type(obj)._get_compact_layout()
+        obj._field_values_ = list(layout.defaults)
+        for k, v in values.iteritems():
+            setattr(obj, k, v)
+    obj.__dict__.update(state)
+
+# A digest is cached per instance (see Object.get_digest) and is discarded when
+# a field of this instance is set. It also records the (cached) digests of the
+# nested objects it was computed from, so that a change on a nested object (e.g.
+# obj.contact.email = ...) is detected without keeping any link to the parent.
+#
+# Leaf values are hashed in a normalized encoding, so that equal values (e.g. 
+# u'x' and 'x', or 1 and 1.0) always contribute the same bytes.
+
+def _encode_str(v):
+    try:
+        v.decode('ascii')
+    except UnicodeDecodeError:
+        return 'B%d:%s;' % (len(v), v)
+    return 'U%d:%s;' % (len(v), v)
+
+def _encode_unicode(v):
+    b = v.encode('utf-8')
+    return 'U%d:%s;' % (len(b), b)
+
+def _encode_int(v):
+    return 'I%d;' % (v)
+
+def _encode_float(v):
+    return ('I%d;' % (v)) if v.is_integer() else ('F%r;' % (v))
+
+_leaf_encoders = {
+    type(None): lambda v: 'N;',
+    str: _encode_str,
+    unicode: _encode_unicode,
+    bool: _encode_int,
+    int: _encode_int,
+    long: _encode_int,
+    float: _encode_float,
+}
+
+def _encode_leaf(v):
+    for cls in type(v).__mro__:
+        encode = _leaf_encoders.get(cls)
+        if encode is not None:
+            return encode(v)
+    return 'R%r;' % (v,)
+
+def _encode_value(v, deps):
+    h = hashlib.sha1()
+    _update_digest(h, v, deps)
+    return h.digest()
+
+def _update_digest(h, v, deps):
+    encode = _leaf_encoders.get(type(v))
+    if encode is not None:
+        h.update(encode(v))
+    elif isinstance(v, Object):
+        digest = v.get_digest()
+        deps.append((v, digest))
+        h.update('O%s;' % (digest))
+    elif isinstance(v, list):
+        h.update('L%d:' % len(v))
+        for y in v:
+            _update_digest(h, y, deps)
+        h.update(';')
+    elif isinstance(v, tuple):
+        h.update('T%d:' % len(v))
+        for y in v:
+            _update_digest(h, y, deps)
+        h.update(';')
+    elif isinstance(v, dict):
+        h.update('D%d:' % len(v))
+        for ek, k in sorted((_encode_value(k, deps), k) for k in v):
+            h.update(ek)
+            _update_digest(h, v[k], deps)
+        h.update(';')
+    elif isinstance(v, (set, frozenset)):
+        h.update('S%d:' % len(v))
+        for ey in sorted(_encode_value(y, deps) for y in v):
+            h.update(ey)
+        h.update(';')
+    else:
+        h.update(_encode_leaf(v))
+
+class Object_Type(type):
+    '''The metaclass for Object classes.
+
+    A class can opt-in for compact storage (by setting `_compact_`): its field 
+    values are kept into a single list (held in a slot) instead of the instance's 
+    __dict__. Note that field descriptors cannot be installed here (as the schema 
+    is declared after class creation), so they are installed on first instantiation.
+    '''
+
+    def __new__(meta, name, bases, cls_dict):
+        if cls_dict.get('_compact_') and not '__slots__' in cls_dict:
+            if not any(hasattr(b, '_field_values_') for b in bases):
+                cls_dict['__slots__'] = ('_field_values_', '_digest_')
+            cls_dict.setdefault('__copy__', _copy_compact)
+            cls_dict.setdefault('__getstate__', _getstate_compact)
+            cls_dict.setdefault('__setstate__', _setstate_compact)
+        return type.__new__(meta, name, bases, cls_dict)
+
 @zope.interface.provider(IIntrospective)
 @zope.interface.implementer(IObject)
 class Object(object):
 
+    __metaclass__ = Object_Type
+
+    # Opt-in for compact storage of field values (see Object_Type)
+    _compact_ = False
+
     ## interface IObject ##
 
     @classmethod
@@ -128,32 +460,22 @@ class Object(object):
     def iter_fields(cls, exclude_properties=False):
         '''Iterate on (key, field)
         '''
-        schema = cls.get_schema()
-        fields = zope.schema.getFields(schema).iteritems()
-        if not exclude_properties:
-            for k, field in fields:
-                yield k, field
-        else:
-            for k, field in fields:
-                a = getattr(cls, k, None)
-                if isinstance(a, property):
-                    continue
-                yield k, field
+        return iter(cls._get_field_items(bool(exclude_properties)))
 
     @classmethod
     def get_flattened_fields(cls, opts={}):
         '''Return a map of flattened fields for the schema of our class.
         '''
         
-        schema = cls.get_schema()
-        res = flatten_schema(schema)
         if opts.get('serialize-keys', False):
-            kser = serializer_for_key_tuple(opts.get('key-prefix'))
-            return { kser.dumps(k): field for k, field in res.iteritems() }
+            res = cls._get_flattened_fields(True, opts.get('key-prefix'))
         else:
-            return res
+            res = cls._get_flattened_fields(False, None)
+        
+        # Return a copy, as caller may modify it
+        return dict(res)
 
-    def validate(self, dictize_errors=False):
+    def validate(self, dictize_errors=False, keys=None):
         '''Validate against all known (schema-based or invariants) rules. 
         
         If dictize_errors is unset, return a list <errors> structured as:
@@ -169,15 +491,41 @@ class Object(object):
         If dictize_errors is set, the previous error list is attempted to
         be converted to a dict of errors (with keys corresponding to
         object's attributes or keys).
+        
+        If keys is given (an iterable of top-level field names), validation is
+        restricted to these fields (e.g. the ones known to be changed). Fields
+        based on properties and the object's own invariants are always checked,
+        as their dependencies are not known.
 
         '''
 
         cls = type(self)
-        errors = cls.Validator(self).validate()
+        opts = {'keys': frozenset(keys)} if keys is not None else None
+        errors = cls.Validator(self, opts).validate()
         if dictize_errors:
             return self.dictize_errors(errors)
         else:
             return errors
+    
+    @classmethod
+    def validate_many(cls, objs):
+        '''Validate a batch of objects (instances of this class), against the same 
+        rules as validate() does.
+        
+        The rules are compiled once per class, and no exception trees are built. 
+        Instead, for each object return a list of ErrorRecord tuples, each one 
+        holding:
+          * key: a key path, as the one we get from flatten_errors()
+          * code: the name of the exception class (e.g. 'RequiredMissing')
+          * message: the error message
+        '''
+        
+        results = []
+        for obj in objs:
+            assert isinstance(obj, cls)
+            plan = ValidationPlan.for_class(type(obj))
+            results.append(plan.validate(obj))
+        return results
 
     def to_dict(self, flat=False, opts={}):
         '''Convert to a (flat or nested) dict.
@@ -233,7 +581,7 @@ class Object(object):
             res = self.flatten(opts)
             if serialize_keys:
                 kser = serializer_for_key_tuple(opts.get('key-prefix'))
-                res = { kser.dumps(k): v for k, v in res.iteritems() }
+                res = kser.dumps_all(res)
         else:
             res = self.dictize(opts)
         
@@ -297,9 +645,14 @@ class Object(object):
             if unserialize_keys:
                 key_prefix = opts.get('key-prefix')
                 kser = serializer_for_key_tuple(key_prefix)
-                is_key = kser.get_key_predicate(basestring, strict=True)
-                d = { kser.loads(k): v for k, v in d.iteritems() if is_key(k) }
-            d = dictization.unflatten(d)
+                items = kser.loads_all(d).iteritems()
+            else:
+                items = d.iteritems()
+            if not update:
+                # Reload directly from flattened items (no need to unflatten)
+                cls.Loader(self, opts).load_flattened(items)
+                return self
+            d = dictization.unflatten(dict(items))
                 
         # Load self
 
@@ -309,6 +662,10 @@ class Object(object):
         return self
 
     def to_json(self, flat=False, return_string=True, indent=None):
+        if return_string and not flat and indent is None:
+            # Write directly to JSON (no intermediate dict is needed)
+            return JsonWriter().encode(self, type(self).Dictizer.max_depth)
+        
         opts = {
             'serialize-keys': flat,
             'serialize-values': 'json-s',
@@ -340,13 +697,45 @@ class Object(object):
         '''
 
         cls = type(self)
+        if cls._compact_:
+            self._init_compact(kwargs)
+            return
+        
         for k, field in cls.iter_fields(exclude_properties=True):
             if kwargs.has_key(k):
                 v = kwargs.get(k)
             else:
                 factory = cls.get_field_factory(k, field)
                 v = factory() if factory else field.default
-            setattr(self, k, v)
+            # Note A newly created object cannot affect any cached digest
+            object.__setattr__(self, k, v)
+
+    def __setattr__(self, k, v):
+        if not k.startswith('_'):
+            object.__setattr__(self, '_digest_', None)
+        object.__setattr__(self, k, v)
+
+    def _init_compact(self, kwargs):
+        layout = type(self)._get_compact_layout()
+        values = list(layout.defaults)
+        for i, k, factory in layout.factories:
+            if not kwargs.has_key(k):
+                values[i] = factory()
+        if kwargs:
+            index = layout.index
+            for k, v in kwargs.iteritems():
+                i = index.get(k)
+                if i is not None:
+                    values[i] = v
+        self._field_values_ = values
+    
+    @classmethod
+    @memoize
+    def _get_compact_layout(cls):
+        assert cls._compact_
+        layout = CompactLayout(cls)
+        layout.install(cls)
+        return layout
 
     ## Formatters / Representers
 
@@ -375,14 +764,65 @@ class Object(object):
         fo = formatter_for_object(self, p.name)
         return fo.format(self, p.opts) if fo else repr(self)
 
+    ## Structural digest
+
+    def get_digest(self):
+        '''Return a (stable) structural digest for this object, as a hex string.
+
+        The digest is computed lazily and is cached until a field is set (on this 
+        object or on a nested one). Note that in-place changes to container values
+        (e.g. appending to a list) are not tracked: call invalidate_digest() after
+        such changes.
+        '''
+        
+        digest = self._get_cached_digest()
+        if digest is None:
+            cls = type(self)
+            deps = []
+            h = hashlib.sha1('%s.%s:' % (cls.__module__, cls.__name__))
+            for k in cls._get_digest_keys():
+                h.update(k)
+                _update_digest(h, getattr(self, k), deps)
+            digest = h.hexdigest()
+            object.__setattr__(self, '_digest_', (digest, tuple(deps)))
+        return digest
+    
+    def invalidate_digest(self):
+        '''Discard the cached digest for this object (and for nested objects).
+        '''
+        t = getattr(self, '_digest_', None)
+        if t is not None:
+            object.__setattr__(self, '_digest_', None)
+            for obj, _ in t[1]:
+                obj.invalidate_digest()
+
+    def _get_cached_digest(self):
+        t = getattr(self, '_digest_', None)
+        if t is None:
+            return None
+        digest, deps = t
+        for obj, obj_digest in deps:
+            if obj._get_cached_digest() != obj_digest:
+                return None
+        return digest
+    
+    @classmethod
+    @memoize
+    def _get_digest_keys(cls):
+        return tuple(sorted(k for k, _ in cls.iter_fields(exclude_properties=True)))
+
     ## Equality
 
     def __eq__(self, other):
         '''Check if equals to another object'''
+        other = materialize(other)
         cls, other_cls = type(self), type(other)
 
         if not (cls is other_cls):
             return False
+        
+        # Note Do not compare (cached) digests here: a digest does not track in-place
+        # changes to container values, so it may be stale
 
         res = True
         for k, field in self.iter_fields(exclude_properties=True):
@@ -408,12 +848,45 @@ class Object(object):
 
     @classmethod
     def get_field_names(cls, order=False):
+        return list(cls._get_field_names(bool(order)))
+    
+    @classmethod
+    @memoize
+    def _get_field_names(cls, order):
         schema = cls.get_schema()
         if not order:
             names = zope.schema.getFieldNames(schema)
         else:
             names = zope.schema.getFieldNamesInOrder(schema)
-        return names
+        return tuple(names)
+
+    @classmethod
+    @memoize
+    def _get_field_items(cls, exclude_properties):
+        schema = cls.get_schema()
+        fields = zope.schema.getFields(schema).iteritems()
+        if not exclude_properties:
+            return tuple(fields)
+        else:
+            return tuple((k, field) for k, field in fields 
+                if not isinstance(getattr(cls, k, None), property))
+    
+    @classmethod
+    @memoize
+    def get_flattened_field_index(cls):
+        '''Return a (lazy) index of flattened fields for the schema of our class.
+        '''
+        return FlattenedFieldIndex(cls.get_schema())
+
+    @classmethod
+    @memoize(maxsize=256)
+    def _get_flattened_fields(cls, serialize_keys, key_prefix):
+        res = cls.get_flattened_field_index().materialize()
+        if serialize_keys:
+            kser = serializer_for_key_tuple(key_prefix)
+            return kser.dumps_all(res)
+        else:
+            return res
     
     @classmethod
     def get_field_factory(cls, key=None, field=None):
@@ -439,8 +912,11 @@ class Object(object):
         
         # Check if a factory is defined explicitly as a class attribute
 
-        if key and hasattr(cls, key):
-            factory = getattr(cls, key)
+        factory = getattr(cls, key, _missing) if key else _missing
+        if isinstance(factory, FieldSlot):
+            # A compact class: check the attribute replaced by the descriptor
+            factory = factory.class_attr
+        if factory is not _missing:
             return factory if callable(factory) else None
         
         # If reached here, there is no hint via class attribute. 
@@ -542,12 +1018,33 @@ class Object(object):
             else:
                 return self.validate_invariants()
 
+        def _iter_fields(self):
+            '''Iterate on (key, field) to be validated for our object'''
+            obj = self.obj
+            keys = self.opts.get('keys')
+            if keys is None:
+                return obj.iter_fields()
+            else:
+                # Restrict to given keys (but always include properties)
+                plain_keys = set(k for k, _ in obj.iter_fields(exclude_properties=True))
+                return ((k, field) for k, field in obj.iter_fields() 
+                    if (k in keys) or not (k in plain_keys))
+
+        def _make_nested(self, obj):
+            '''Make a validator for a nested object.
+            Note that keys (if given) only refer to top-level fields.
+            '''
+            opts = self.opts
+            if 'keys' in opts:
+                opts = {k: v for k, v in opts.iteritems() if k != 'keys'}
+            return type(self)(obj, opts)
+
         def validate_schema(self):
             '''Return <errors>'''
             errors = []
             
             obj = self.obj
-            for k, field in obj.iter_fields():
+            for k, field in self._iter_fields():
                 f = field.get(obj)
                 ef = self._validate_schema_for_field(f, field)
                 if ef:
@@ -575,11 +1072,10 @@ class Object(object):
                     ef.append(ex)
                 # If provides, descend into object's schema validation
                 if not ef and isinstance(f, Object):
-                    cls = type(self)
                     # Note: Here, maybe we should just validate(). It depends on if
                     # we consider a failed invariant on a field as a schema error 
                     # on our level. 
-                    errors = cls(f, self.opts).validate_schema()
+                    errors = self._make_nested(f).validate_schema()
                     if errors:
                         ef.append(zope.interface.Invalid(errors))
             elif isinstance(field, (zope.schema.List, zope.schema.Tuple)):
@@ -665,7 +1161,7 @@ class Object(object):
             except KeyError:
                 pass
             if recurse:
-                for k, field in obj.iter_fields():
+                for k, field in self._iter_fields():
                     f = field.get(obj)
                     ef = self._validate_invariants_for_field(f, field)
                     if ef:
@@ -694,8 +1190,7 @@ class Object(object):
             
             ex  = None
             if isinstance(field, zope.schema.Object):
-                cls = type(self)
-                errors = cls(f, self.opts).validate_invariants()
+                errors = self._make_nested(f).validate_invariants()
                 if errors:
                     ex = zope.interface.Invalid(errors)
             elif isinstance(field, (zope.schema.List, zope.schema.Tuple)):
@@ -818,7 +1313,7 @@ class Object(object):
 
     class Dictizer(object):
         
-        __slots__ = ('obj', 'opts', 'max_depth')
+        __slots__ = ('obj', 'opts', 'plan')
         
         max_depth = 16
 
@@ -829,158 +1324,18 @@ class Object(object):
             '''
             self.obj = obj
             self.opts = opts
+            self.plan = DictizePlan.for_class(
+                type(obj), DictizePlan.make_spec(opts))
 
         def dictize(self):
-            obj = self.obj
-            
             max_depth = self.opts.get('max-depth', self.max_depth) 
             assert max_depth > 0
-            
-            res = {}
-            for k, field in obj.iter_fields(exclude_properties=False):
-                f = field.get(obj)
-                res[k] = self._dictize_field(f, field, max_depth -1)
-            
-            return res
-
-        def _is_field_accessible(self, field):
-            
-            format_spec = self.opts.get('format-values')
-            if format_spec:
-                # Check if this field allows us to descend in order to format it's
-                # parts (or stop here and format it as a whole).
-                fo_conf = formatters.config_for_field(field, format_spec.name)
-                return fo_conf.get('descend-if-dictized', True) if fo_conf else True
-            else:
-                # No formatting takes place
-                return True
-        
-        def _get_field_value(self, v, field):
-            '''Get the value of a field considered a leaf.
-            Serialize or format (not both!) this value, if requested so.
-            '''
-            assert v is not None, 'This was supposed to be checked at dictize()'
-            
-            # Check if value needs to be serialized
-
-            serializer_name = self.opts.get('serialize-values', False)
-            if serializer_name:
-                ser = serializer_for_field(field, serializer_name)
-                if ser:
-                    try:
-                        v = ser.dumps(v)
-                    except Exception as ex:
-                        logger.warn(
-                            'Failed to serialize value %r for field %r (%s): %s' % (
-                                v, field.__name__, field.__class__.__name__, ex))
-                        v = None
-                # Return here, no need to do anything more
-                return v
-            
-            # Check if value needs to be formatted 
-            
-            format_spec = self.opts.get('format-values', False)
-            if format_spec:
-                assert isinstance(format_spec, FormatSpec)
-                fo = formatter_for_field(field, format_spec.name)
-                if fo:
-                    fo_opts = format_spec.opts
-                    # Fetch any extra field-level extra options
-                    fo_conf = formatters.config_for_field(field, format_spec.name)
-                    if fo_conf and 'extra-opts' in fo_conf:
-                        fo_opts = copy.copy(fo_opts)
-                        fo_opts.update(fo_conf.get('extra-opts'))
-                    # Try to format
-                    try:
-                        v = fo.format(v, opts=fo_opts)
-                    except Exception as ex:
-                        logger.warn(
-                            'Failed to format value %r for field %r (%s): %s' % (
-                                v, field.__name__, field.__class__.__name__, ex))
-                        v = None
-            
-            return v
-
-        def _dictize_field(self, f, field, max_depth):
-            
-            if f is None:
-                return None
-            
-            if max_depth == 0 or not self._is_field_accessible(field):
-                return self._get_field_value(f, field)
-            
-            # Descend into this field
-            
-            dictize_field = self._dictize_field
-
-            if isinstance(field, zope.schema.Object):
-                if isinstance(f, Object):
-                    dictizer_factory = type(self)
-                    opts = copy.copy(self.opts)
-                    opts['max-depth'] = max_depth
-                    return dictizer_factory(f, opts).dictize()
-                else:
-                    return None # unknown structure
-            elif isinstance(field, (zope.schema.List, zope.schema.Tuple)):
-                return [ dictize_field(y, field.value_type, max_depth -1) 
-                    for y in f ]
-            elif isinstance(field, zope.schema.Dict):
-                return { k: dictize_field(y, field.value_type, max_depth -1) 
-                    for k,y in f.items() } 
-            else:
-                # Handle a leaf field 
-                return self._get_field_value(f, field)
+            return self.plan.dictize(self.obj, max_depth)
 
         def flatten(self):
-            obj = self.obj
-
             max_depth = self.opts.get('max-depth', self.max_depth) 
             assert max_depth > 0
-
-            res = {}
-            for k, field in obj.iter_fields(exclude_properties=True):
-                f = field.get(obj)
-                res1 = self._flatten_field(f, field, max_depth -1)
-                for k1, v1 in res1.iteritems():
-                    res[(k,) + k1] = v1
-            
-            return res
-
-        def _flatten_field(self, f, field, max_depth):
-            
-            if f is None:
-                return { (): None }
-            
-            if max_depth == 0 or not self._is_field_accessible(field):
-                v = self._get_field_value(f, field)
-                return { (): v }
-            
-            # Descend into this field
-           
-            if isinstance(field, zope.schema.Object):
-                if isinstance(f, Object):
-                    dictizer_factory = type(self)
-                    opts = copy.copy(self.opts)
-                    opts['max-depth'] = max_depth
-                    return dictizer_factory(f, opts).flatten()
-                else:
-                    return { (): None } # unknown structure
-            elif isinstance(field, (zope.schema.List, zope.schema.Tuple)):
-                return self._flatten_field_items(enumerate(f), field, max_depth)
-            elif isinstance(field, zope.schema.Dict):
-                return self._flatten_field_items(f.iteritems(), field, max_depth)
-            else:
-                # Handle a leaf field
-                v = self._get_field_value(f, field)
-                return { (): v }
-
-        def _flatten_field_items(self, items, field, max_depth):
-            res = dict()
-            for k, y in items:
-                yres = self._flatten_field(y, field.value_type, max_depth -1)
-                for yk, yv in yres.iteritems():
-                    res[(k,) + yk] = yv
-            return res
+            return self.plan.flatten_into({}, (), self.obj, max_depth)
 
     class Loader(object):
         
@@ -1013,6 +1368,16 @@ class Object(object):
             
             return res
         
+        def load_flattened(self, items):
+            '''Fully reload the target object from flattened (key-tuple, value) 
+            pairs, following a compiled plan for the object's class.
+            '''
+            assert not self.opts.get('update', False)
+            plan = LoaderPlan.for_class(
+                type(self.obj), self.opts.get('unserialize-values', False))
+            plan.reload(self, self.obj, items)
+            return self
+
         def _reload(self, data):
             '''Fully reload the target object from input data.
             If a key is missing from input, its counterpart field will be 
@@ -1243,6 +1608,798 @@ class ErrorDict(dict):
 
     global_key = '__after'
 
+class ErrorRecord(namedtuple('_ErrorRecord', ('key', 'code', 'message'))):
+    '''Provide a compact record for a validation error (see Object.validate_many).
+    '''
+
+    __slots__ = ()
+
+    @classmethod
+    def from_exception(cls, key, ex, message=None):
+        if message is None:
+            message = stringify_exception(ex)
+        return cls(key, type(ex).__name__, message)
+
+#
+# Compiled dictization/loading plans
+#
+
+class DictizePlan(object):
+    '''A compiled plan to dictize (or flatten) instances of an Object class.
+    
+    A plan resolves (once per class and per opts signature) everything that 
+    does not depend on actual values: the fields to be visited, the kind of 
+    each (possibly nested) field and the serializer/formatter to be applied on
+    leafs. Plans are invalidated whenever new adapters are registered. 
+    '''
+    
+    __slots__ = ('obj_cls', 'spec', 'generation', 'entries', 'flat_entries')
+
+    _plans = {}
+    
+    def __init__(self, obj_cls, spec):
+        self.obj_cls = obj_cls
+        self.spec = spec
+        self.generation = adapter_registry._generation
+        self.entries = self._compile_entries(exclude_properties=False)
+        self.flat_entries = self._compile_entries(exclude_properties=True)
+
+    def _compile_entries(self, exclude_properties):
+        spec = self.spec
+        return tuple(
+            (k, operator.attrgetter(k), DictizePlanNode(field, spec))
+                for k, field in self.obj_cls.iter_fields(exclude_properties))
+
+    @staticmethod
+    def make_spec(opts):
+        '''Reduce (sanitized) dictizer opts to a spec of (serializer_name, format_spec)
+        '''
+        serializer_name = opts.get('serialize-values')
+        if serializer_name:
+            return (serializer_name, None)
+        format_spec = opts.get('format-values')
+        if format_spec:
+            assert isinstance(format_spec, FormatSpec)
+            return (None, format_spec)
+        return (None, None)
+
+    @classmethod
+    def for_class(cls, obj_cls, spec):
+        '''Get a (cached) plan for an Object class under a certain spec.
+        '''
+        serializer_name, format_spec = spec
+        if format_spec:
+            format_key = (format_spec.name, tuple(sorted(format_spec.opts.items())))
+        else:
+            format_key = None
+        key = (obj_cls, serializer_name, format_key)
+        
+        try:
+            plan = cls._plans.get(key)
+        except TypeError:
+            # Unhashable format options: compile an uncached plan
+            return cls(obj_cls, spec)
+        
+        if plan is None or plan.generation != adapter_registry._generation:
+            plan = cls._plans[key] = cls(obj_cls, spec)
+        return plan
+    
+    @classmethod
+    def clear(cls):
+        cls._plans.clear()
+
+    def dictize(self, obj, max_depth):
+        assert max_depth > 0
+        dictize_value = self._dictize_value
+        return { k: dictize_value(getter(obj), node, max_depth -1)
+            for k, getter, node in self.entries }
+
+    def flatten_into(self, res, prefix, obj, max_depth):
+        assert max_depth > 0
+        flatten_value = self._flatten_value
+        for k, getter, node in self.flat_entries:
+            flatten_value(res, prefix + (k,), getter(obj), node, max_depth -1)
+        return res
+
+    def _dictize_value(self, f, node, max_depth):
+        if f is None:
+            return None
+        
+        if max_depth == 0 or not node.accessible:
+            return node.convert(f)
+
+        kind = node.kind
+        if kind is DictizePlanNode.OBJECT:
+            if isinstance(f, Object):
+                plan = DictizePlan.for_class(type(f), self.spec)
+                return plan.dictize(f, max_depth)
+            else:
+                return None # unknown structure
+        elif kind is DictizePlanNode.LIST:
+            dictize_value, y_node = self._dictize_value, node.item
+            return [dictize_value(y, y_node, max_depth -1) for y in f]
+        elif kind is DictizePlanNode.DICT:
+            dictize_value, y_node = self._dictize_value, node.item
+            return { k: dictize_value(y, y_node, max_depth -1) 
+                for k, y in f.iteritems() }
+        else:
+            return node.convert(f)
+
+    def _flatten_value(self, res, key, f, node, max_depth):
+        if f is None:
+            res[key] = None
+            return
+        
+        if max_depth == 0 or not node.accessible:
+            res[key] = node.convert(f)
+            return
+        
+        kind = node.kind
+        if kind is DictizePlanNode.OBJECT:
+            if isinstance(f, Object):
+                plan = DictizePlan.for_class(type(f), self.spec)
+                plan.flatten_into(res, key, f, max_depth)
+            else:
+                res[key] = None # unknown structure
+        elif kind is DictizePlanNode.LIST:
+            flatten_value, y_node = self._flatten_value, node.item
+            for i, y in enumerate(f):
+                flatten_value(res, key + (i,), y, y_node, max_depth -1)
+        elif kind is DictizePlanNode.DICT:
+            flatten_value, y_node = self._flatten_value, node.item
+            for k, y in f.iteritems():
+                flatten_value(res, key + (k,), y, y_node, max_depth -1)
+        else:
+            res[key] = node.convert(f)
+
+class DictizePlanNode(object):
+    '''A compiled node of a dictization plan, i.e. a (possibly nested) field.
+    
+    The leaf converter (a serializer or a formatter) is lazily resolved, i.e. 
+    only when a value is to be treated as a leaf for the first time.
+    '''
+
+    __slots__ = ('field', 'spec', 'kind', 'accessible', 'item', '_convert')
+
+    LEAF, OBJECT, LIST, DICT = 'leaf', 'object', 'list', 'dict'
+
+    def __init__(self, field, spec):
+        self.field = field
+        self.spec = spec
+        self._convert = None
+        
+        # Check if this field allows us to descend in order to format it's
+        # parts (or stop here and format it as a whole).
+        serializer_name, format_spec = spec
+        self.accessible = True
+        if format_spec:
+            fo_conf = formatters.config_for_field(field, format_spec.name)
+            if fo_conf:
+                self.accessible = fo_conf.get('descend-if-dictized', True)
+        
+        self.item = None
+        if isinstance(field, zope.schema.Object):
+            self.kind = self.OBJECT
+        elif isinstance(field, (zope.schema.List, zope.schema.Tuple)):
+            self.kind = self.LIST
+            self.item = DictizePlanNode(field.value_type, spec)
+        elif isinstance(field, zope.schema.Dict):
+            self.kind = self.DICT
+            self.item = DictizePlanNode(field.value_type, spec)
+        else:
+            self.kind = self.LEAF
+    
+    def convert(self, v):
+        '''Get the value of a field considered a leaf.
+        Serialize or format (not both!) this value, if requested so.
+        '''
+        assert v is not None, 'This was supposed to be checked at dictize()'
+        convert = self._convert
+        if convert is None:
+            convert = self._convert = self._make_converter()
+        return convert(v)
+    
+    def get_converter(self):
+        convert = self._convert
+        if convert is None:
+            convert = self._convert = self._make_converter()
+        return convert
+    
+    def _make_converter(self):
+        field = self.field
+        serializer_name, format_spec = self.spec
+        
+        # Check if value needs to be serialized
+
+        if serializer_name:
+            ser = serializer_for_field(field, serializer_name)
+            if not ser:
+                return _identity
+            def convert(v):
+                try:
+                    return ser.dumps(v)
+                except Exception as ex:
+                    logger.warn(
+                        'Failed to serialize value %r for field %r (%s): %s' % (
+                            v, field.__name__, field.__class__.__name__, ex))
+                    return None
+            return convert
+        
+        # Check if value needs to be formatted 
+        
+        if format_spec:
+            fo = formatter_for_field(field, format_spec.name)
+            if not fo:
+                return _identity
+            fo_opts = format_spec.opts
+            # Fetch any extra field-level extra options
+            fo_conf = formatters.config_for_field(field, format_spec.name)
+            if fo_conf and 'extra-opts' in fo_conf:
+                fo_opts = copy.copy(fo_opts)
+                fo_opts.update(fo_conf.get('extra-opts'))
+            def convert(v):
+                try:
+                    return fo.format(v, opts=fo_opts)
+                except Exception as ex:
+                    logger.warn(
+                        'Failed to format value %r for field %r (%s): %s' % (
+                            v, field.__name__, field.__class__.__name__, ex))
+                    return None
+            return convert
+        
+        return _identity
+
+class JsonWriter(object):
+    '''Encode objects to JSON directly from their attributes.
+    
+    The writer follows the dictization plans (under the `json-s` serializer), so 
+    the result is equivalent to json.dumps of the nested dict (as returned by
+    to_dict), but no intermediate dict is ever built. The (encoded) keys and the
+    leaf converters are compiled once per class.
+    '''
+
+    __slots__ = ('ensure_ascii', 'encode_string', 'item_separator', 'key_separator')
+    
+    spec = ('json-s', None)
+    
+    _entries = {}
+
+    def __init__(self, ensure_ascii=True, separators=(', ', ': ')):
+        self.ensure_ascii = bool(ensure_ascii)
+        if ensure_ascii:
+            self.encode_string = json.encoder.encode_basestring_ascii
+        else:
+            self.encode_string = self._encode_string_non_ascii
+        self.item_separator, self.key_separator = separators
+    
+    def encode(self, obj, max_depth):
+        assert max_depth > 0
+        chunks = []
+        self._write_object(chunks.append, obj, max_depth)
+        return ''.join(chunks)
+    
+    @classmethod
+    def clear(cls):
+        cls._entries.clear()
+
+    @staticmethod
+    def _encode_string_non_ascii(s):
+        if isinstance(s, str):
+            s = s.decode('utf-8')
+        return json.encoder.encode_basestring(s)
+
+    def _get_entries(self, obj_cls):
+        plan = DictizePlan.for_class(obj_cls, self.spec)
+        key = (obj_cls, self.ensure_ascii, self.item_separator, self.key_separator)
+        t = self._entries.get(key)
+        if t is None or not (t[0] is plan):
+            # Note Plans are recompiled when adapters change, so are our entries
+            t = self._entries[key] = (plan, self._compile_entries(plan))
+        return t[1]
+
+    def _compile_entries(self, plan):
+        entries = []
+        sep = '{'
+        for k, getter, node in plan.entries:
+            prefix = sep + self.encode_string(k) + self.key_separator
+            entries.append((prefix, getter, node, self._make_leaf_encoder(node)))
+            sep = self.item_separator
+        return tuple(entries)
+    
+    def _make_leaf_encoder(self, node):
+        '''Make a function to encode values of a leaf node (or None if not a leaf)
+        '''
+        if not (node.kind is DictizePlanNode.LEAF and node.accessible):
+            return None
+        encode_leaf, convert = self._encode_leaf, node.get_converter()
+        if convert is _identity:
+            return encode_leaf
+        return lambda v: encode_leaf(convert(v))
+
+    def _write_object(self, write, obj, max_depth):
+        entries = self._get_entries(type(obj))
+        if not entries:
+            write('{}')
+            return
+        write_value = self._write_value
+        for prefix, getter, node, encode in entries:
+            write(prefix)
+            f = getter(obj)
+            if f is None:
+                write('null')
+            elif encode is not None:
+                write(encode(f))
+            else:
+                write_value(write, f, node, max_depth -1)
+        write('}')
+
+    def _write_value(self, write, f, node, max_depth):
+        if f is None:
+            write('null')
+            return
+        
+        if max_depth == 0 or not node.accessible:
+            write(self._encode_leaf(node.convert(f)))
+            return
+
+        kind = node.kind
+        if kind is DictizePlanNode.OBJECT:
+            if isinstance(f, Object):
+                self._write_object(write, f, max_depth)
+            else:
+                write('null') # unknown structure
+        elif kind is DictizePlanNode.LIST:
+            y_node = node.item
+            encode = self._make_leaf_encoder(y_node) if max_depth > 1 else None
+            if encode is not None:
+                # A list of leafs: encode directly
+                write('[')
+                write(self.item_separator.join(
+                    (encode(y) if y is not None else 'null') for y in f))
+                write(']')
+                return
+            write_value = self._write_value
+            write('[')
+            sep = ''
+            for y in f:
+                write(sep)
+                write_value(write, y, y_node, max_depth -1)
+                sep = self.item_separator
+            write(']')
+        elif kind is DictizePlanNode.DICT:
+            write_value, y_node = self._write_value, node.item
+            write('{')
+            sep = ''
+            for k, y in f.iteritems():
+                write(sep)
+                write(self._encode_key(k))
+                write(self.key_separator)
+                write_value(write, y, y_node, max_depth -1)
+                sep = self.item_separator
+            write('}')
+        else:
+            write(self._encode_leaf(node.convert(f)))
+
+    def _encode_leaf(self, v):
+        if isinstance(v, basestring):
+            return self.encode_string(v)
+        elif v is None:
+            return 'null'
+        elif v is True:
+            return 'true'
+        elif v is False:
+            return 'false'
+        elif isinstance(v, (int, long)):
+            return str(v)
+        elif isinstance(v, float) and not (v != v or v in (_inf, -_inf)):
+            return repr(v)
+        else:
+            # Note This is not a plain literal: delegate to json
+            return json.dumps(v, ensure_ascii=self.ensure_ascii,
+                separators=(self.item_separator, self.key_separator))
+    
+    def _encode_key(self, k):
+        if isinstance(k, basestring):
+            return self.encode_string(k)
+        # Note Convert like json does (i.e. dump as a literal, then quote)
+        return self.encode_string(json.dumps(k))
+
+_inf = float('inf')
+
+class LoaderPlan(object):
+    '''A compiled plan to (re)load instances of an Object class from flattened
+    input, i.e. from (key-tuple, value) pairs.
+    
+    Flattened keys are dispatched directly to the fields they refer to, so no 
+    intermediate nested dict is ever built. Field factories and value 
+    unserializers are resolved once per class (and per serialization format).
+    Plans are invalidated whenever new adapters are registered.
+    '''
+
+    __slots__ = ('obj_cls', 'serializer_name', 'generation', 'entries')
+
+    _plans = {}
+
+    def __init__(self, obj_cls, serializer_name):
+        self.obj_cls = obj_cls
+        self.serializer_name = serializer_name
+        self.generation = adapter_registry._generation
+        self.entries = tuple(
+            (k, field, LoaderPlanNode(field, serializer_name), 
+                obj_cls.get_field_factory(k, field))
+            for k, field in obj_cls.iter_fields(exclude_properties=True))
+
+    @classmethod
+    def for_class(cls, obj_cls, serializer_name=None):
+        '''Get a (cached) plan for an Object class.
+        '''
+        key = (obj_cls, serializer_name or None)
+        plan = cls._plans.get(key)
+        if plan is None or plan.generation != adapter_registry._generation:
+            plan = cls._plans[key] = cls(obj_cls, serializer_name)
+        return plan
+    
+    @classmethod
+    def clear(cls):
+        cls._plans.clear()
+
+    @staticmethod
+    def group_items(items):
+        '''Group flattened (key-tuple, value) pairs by the head of their keys.
+
+        Return a map of { <head>: [<value>, <pairs>] } where <value> is the value
+        found exactly at <head> (or a marker if there is no such value) and 
+        <pairs> is a list of (<key-tuple-tail>, <value>) pairs under <head>. 
+        '''
+        groups = {}
+        for kt, v in items:
+            if not kt:
+                continue
+            g = groups.get(kt[0])
+            if g is None:
+                g = groups[kt[0]] = [_missing, []]
+            if len(kt) == 1:
+                g[0] = v
+            else:
+                g[1].append((kt[1:], v))
+        return groups
+    
+    def reload(self, loader, obj, items):
+        '''Fully reload obj from flattened items. 
+        
+        Semantics are the same as of unflattening items and feeding the result 
+        to loader (i.e. if a key is missing from input, its counterpart field 
+        will be (re)initialized to defaults).
+        '''
+        groups = self.group_items(items)
+        
+        use_defaults = loader.opts.get('use-defaults', True)
+        
+        for k, field, node, factory in self.entries:
+            g = groups.get(k)
+            if g is None or g[0] is None:
+                # No input
+                if use_defaults:
+                    f = factory() if factory else field.default
+                else:
+                    f = None
+            else:
+                f = self._create_field(loader, g, node, factory)
+            setattr(obj, k, f)
+
+        return obj
+
+    def _create_field(self, loader, g, node, factory=None):
+        v, pairs = g
+        field = node.field
+        
+        if v is not _missing:
+            # A value was provided exactly at this key
+            if node.kind is LoaderPlanNode.LEAF and v is not None:
+                return node.load(v)
+            return loader._create_field(v, field, factory)
+        
+        kind = node.kind
+        if kind is LoaderPlanNode.OBJECT:
+            if not factory:
+                factory = type(loader.obj).get_field_factory(field=field)
+            f = factory()
+            if isinstance(f, Object):
+                plan = LoaderPlan.for_class(type(f), self.serializer_name)
+                plan.reload(loader, f, pairs)
+            return f
+        elif kind is LoaderPlanNode.LIST:
+            indexed = {}
+            for k, yg in self.group_items(pairs).iteritems():
+                i = dictization._as_integer(k)
+                if isinstance(i, int):
+                    indexed[i] = yg
+            n = (max(indexed) + 1) if indexed else 0
+            y_node, create_field = node.item, self._create_field
+            return [
+                create_field(loader, indexed[i], y_node) if i in indexed else
+                    loader._create_field(None, y_node.field)
+                for i in xrange(0, n)]
+        elif kind is LoaderPlanNode.DICT:
+            y_node, create_field = node.item, self._create_field
+            return { k: create_field(loader, yg, y_node) 
+                for k, yg in self.group_items(pairs).iteritems() }
+        else:
+            # Nested keys under a leaf field: let loader make what it can 
+            return loader._create_field(dictization.unflatten(dict(pairs)), field)
+
+class LoaderPlanNode(object):
+    '''A compiled node of a loader plan, i.e. a (possibly nested) field.
+    '''
+
+    __slots__ = ('field', 'serializer_name', 'kind', 'item', '_ser')
+
+    LEAF, OBJECT, LIST, DICT = 'leaf', 'object', 'list', 'dict'
+
+    def __init__(self, field, serializer_name):
+        self.field = field
+        self.serializer_name = serializer_name
+        self._ser = _missing
+        
+        self.item = None
+        if isinstance(field, zope.schema.Object):
+            self.kind = self.OBJECT
+        elif isinstance(field, (zope.schema.List, zope.schema.Tuple)):
+            self.kind = self.LIST
+            self.item = LoaderPlanNode(field.value_type, serializer_name)
+        elif isinstance(field, zope.schema.Dict):
+            self.kind = self.DICT
+            self.item = LoaderPlanNode(field.value_type, serializer_name)
+        else:
+            self.kind = self.LEAF
+
+    def load(self, v):
+        '''Create a leaf field value, unserializing v if requested so.
+        '''
+        assert v is not None, 'This was supposed to be checked at load()'
+        
+        ser = self._ser
+        if ser is _missing:
+            ser = self._ser = (serializer_for_field(
+                self.field, self.serializer_name) if self.serializer_name else None)
+        
+        f = None
+        if ser:
+            try:
+                f = ser.loads(v)
+            except:
+                logger.warn(
+                    'Failed to unserialize value %r for field %r' %(v, self.field))
+        
+        if f is None:
+            f = copy.copy(v)
+        
+        return f
+
+#
+# Compiled validation plans
+#
+
+class ValidationPlan(object):
+    '''A compiled plan to validate instances of an Object class.
+    
+    This is the vectorized counterpart of Object.Validator: the (possibly 
+    nested) fields of a class are resolved once, into a list of rules, and
+    validation errors are collected as flat ErrorRecord tuples.
+
+    The records (keys and messages) are equivalent to what we get by
+    dictizing the errors of Object.validate(). 
+    '''
+
+    __slots__ = ('obj_cls', 'entries', 'recurse_on_invariants')
+
+    _plans = {}
+    
+    # Keep (schema, class) pairs for which an instance is already verified
+    _verified = set()
+    
+    def __init__(self, obj_cls):
+        self.obj_cls = obj_cls
+        self.entries = tuple(
+            (k, operator.attrgetter(k), ValidationPlanNode(field))
+                for k, field in obj_cls.iter_fields())
+        schema = obj_cls.get_schema()
+        self.recurse_on_invariants = schema.queryTaggedValue(
+            'recurse-on-invariants', False)
+
+    @classmethod
+    def for_class(cls, obj_cls):
+        plan = cls._plans.get(obj_cls)
+        if plan is None:
+            plan = cls._plans[obj_cls] = cls(obj_cls)
+        return plan
+    
+    @classmethod
+    def clear(cls):
+        cls._plans.clear()
+        cls._verified.clear()
+
+    def validate(self, obj):
+        '''Validate obj, return a list of ErrorRecord tuples.
+        '''
+        
+        out = []
+        self.check_schema(obj, (), out)
+        if not out:
+            # Only check invariants when schema is valid (as Validator does)
+            self.check_invariants(obj, (), out)
+        return out
+    
+    def check_schema(self, obj, prefix, out):
+        check_field = self._check_field
+        for k, getter, node in self.entries:
+            check_field(getter(obj), node, prefix + (k,), out)
+    
+    def check_invariants(self, obj, prefix, out):
+        if self.recurse_on_invariants:
+            check_field_invariants = self._check_field_invariants
+            for k, getter, node in self.entries:
+                check_field_invariants(getter(obj), node, prefix + (k,), out)
+        
+        ef = []
+        try:
+            self.obj_cls.get_schema().validateInvariants(obj, ef)
+        except zope.interface.Invalid:
+            key = prefix + (ErrorDict.global_key,)
+            out.extend(ErrorRecord.from_exception(key, ex, str(ex)) for ex in ef)
+    
+    def _check_field(self, f, node, key, out):
+        field = node.field
+        
+        # Check if empty
+        
+        if f is None:
+            try:
+                field.validate(f)
+            except zope.interface.Invalid as ex:
+                out.append(ErrorRecord.from_exception(key, ex))
+            return
+        
+        # Check non-empty field
+        
+        kind = node.kind
+        if kind is ValidationPlanNode.OBJECT:
+            try:
+                self._verify_object(f, field.schema)
+            except zope.interface.Invalid as ex:
+                out.append(ErrorRecord.from_exception(key, ex))
+                return
+            if isinstance(f, Object):
+                ValidationPlan.for_class(type(f)).check_schema(f, key, out)
+        elif kind is ValidationPlanNode.LEAF:
+            try:
+                field.validate(f)
+            except zope.interface.Invalid as ex:
+                out.append(ErrorRecord.from_exception(key, ex))
+        else:
+            # A collection field (list/tuple/dict)
+            if kind is ValidationPlanNode.LIST:
+                is_valid_type = isinstance(f, (list, tuple))
+            else:
+                is_valid_type = isinstance(f, dict)
+            if not is_valid_type:
+                try:
+                    field.validate(f)
+                except zope.interface.Invalid as ex:
+                    out.append(ErrorRecord.from_exception(key, ex))
+                    return
+            self._check_field_items(f, node, key, out)
+
+    def _check_field_items(self, f, node, key, out):
+        field = node.field
+        
+        if node.kind is ValidationPlanNode.LIST:
+            items = list(enumerate(f))
+        else:
+            items = f.items()
+        
+        # 1. Validate length contraints
+        
+        exs = []
+        if field.min_length and len(items) < field.min_length:
+            exs.append(zope.schema.interfaces.TooShort(
+                'The collection is too short (< %d)' % (field.min_length)))
+        if field.max_length and len(items) > field.max_length:
+            exs.append(zope.schema.interfaces.TooBig(
+                'The collection is too big (> %d)' % (field.max_length)))
+        
+        # 2. Validate items
+        
+        n = len(out)
+        
+        # 2.1 Validate item keys (if exist)
+        key_field = node.key_field
+        if key_field:
+            for k, y in items:
+                try:
+                    key_field.validate(k)
+                except zope.interface.Invalid as ex:
+                    out.append(ErrorRecord.from_exception(key + (k,), ex))
+        
+        # 2.2 Validate item values
+        # Note When dictized, errors on an item's value replace errors on its key
+        check_field, y_node = self._check_field, node.item
+        for k, y in items:
+            m = len(out)
+            check_field(y, y_node, key + (k,), out)
+            if key_field and len(out) > m:
+                k1 = key + (k,)
+                out[n:m] = [r for r in out[n:m] if r.key != k1]
+
+        # Place errors on the collection itself: if item errors are present,
+        # they are kept under the global key (as dictize_errors does)
+        
+        if exs:
+            key1 = key + (ErrorDict.global_key,) if len(out) > n else key
+            out.extend(ErrorRecord.from_exception(key1, ex) for ex in exs)
+
+    def _check_field_invariants(self, f, node, key, out):
+        if not f:
+            return
+        
+        kind = node.kind
+        if kind is ValidationPlanNode.OBJECT:
+            ValidationPlan.for_class(type(f)).check_invariants(f, key, out)
+        elif kind is ValidationPlanNode.LIST:
+            check_field_invariants, y_node = self._check_field_invariants, node.item
+            for k, y in enumerate(f):
+                check_field_invariants(y, y_node, key + (k,), out)
+        elif kind is ValidationPlanNode.DICT:
+            check_field_invariants, y_node = self._check_field_invariants, node.item
+            for k, y in f.iteritems():
+                check_field_invariants(y, y_node, key + (k,), out)
+    
+    def _verify_object(self, f, schema):
+        '''Verify that f provides schema. 
+        
+        For instances of Object, verification is done once per class, as all 
+        schema attributes are set by the constructor.
+        '''
+        
+        t = (schema, type(f))
+        if t in self._verified and schema.providedBy(f):
+            return
+        zope.interface.verify.verifyObject(schema, f)
+        if isinstance(f, Object):
+            self._verified.add(t)
+
+class ValidationPlanNode(object):
+    '''A compiled node of a validation plan, i.e. a (possibly nested) field.
+    '''
+    
+    __slots__ = ('field', 'kind', 'item', 'key_field')
+    
+    LEAF, OBJECT, LIST, DICT = ('leaf', 'object', 'list', 'dict')
+
+    def __init__(self, field):
+        self.field = field
+        self.item = None
+        self.key_field = None
+        
+        if isinstance(field, zope.schema.Object):
+            self.kind = self.OBJECT
+        elif isinstance(field, (zope.schema.List, zope.schema.Tuple)):
+            self.kind = self.LIST
+            self.item = ValidationPlanNode(field.value_type)
+        elif isinstance(field, zope.schema.Dict):
+            self.kind = self.DICT
+            self.item = ValidationPlanNode(field.value_type)
+            if field.key_type:
+                assert isinstance(field.key_type, zope.schema.Choice)
+                self.key_field = field.key_type
+        else:
+            self.kind = self.LEAF
+
+def _identity(v):
+    return v
+
+_missing = object()
+
 #
 # Named null adapters (aka implementers)
 #
@@ -1302,11 +2459,25 @@ class ObjectSerializer(BaseSerializer):
         factory = type(self.obj)
         return factory().from_json(s)
 
+@object_serialize_adapter(IObject, 'blob')
+class ObjectBlobSerializer(ObjectSerializer):
+    '''Provide a serializer to a compact JSON blob, i.e. the nested dict of an
+    object dumped without any whitespace or escaping of non-ASCII characters.
+    '''
+    
+    def dumps(self, o=None):
+        if o is None:
+            o = self.obj
+        assert isinstance(o, Object)
+        writer = JsonWriter(ensure_ascii=False, separators=(',', ':'))
+        return writer.encode(o, type(o).Dictizer.max_depth)
+
 def serializer_for_object(obj, name='default'):
     '''Get a proper serializer for an Object instance.
     ''' 
     assert name in serializers.supported_formats
     
+    obj = materialize(obj)
     serializer = adapter_registry.queryMultiAdapter(
         [obj], ISerializer, 'serialize:%s' %(name))
     return serializer
@@ -1329,15 +2500,22 @@ def object_format_adapter(required_iface, name='', is_fallback=False):
 @object_format_adapter(IObject)
 class ObjectFormatter(BaseFormatter):
     '''Provide a simple formatter for derivatives of Object.
+
+    The formatted output is cached (see format_cache), unless use_cache is unset
+    (i.e. for formatters that depend on anything beyond the object and the opts).
     '''
+    
+    use_cache = True
 
     def __init__(self, obj):
         self.obj = obj
     
     def format(self, obj=None, opts={}):
-        if obj is None:
-            obj = self.obj
-        return self._format(obj, opts)
+        obj = self.obj if obj is None else materialize(obj)
+        key = format_cache.make_key(self, obj, opts) if self.use_cache else None
+        if key is None:
+            return self._format(obj, opts)
+        return format_cache.get(key, lambda: self._format(obj, opts))
     
     def _format(self, obj, opts):
         '''Format the object according to our named format.
@@ -1382,6 +2560,8 @@ def formatter_for_object(obj, name=''):
     '''Get a proper formatter for an object instance.
     '''
     
+    obj = materialize(obj)
+    
     candidates = ['format']
     if name:
         candidates.insert(0, 'format:%s' % (name))
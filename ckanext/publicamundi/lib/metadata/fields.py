@@ -7,6 +7,7 @@ from zope.schema-related modules.
 
 '''
 
+import threading
 from itertools import islice
 
 import zope.interface
@@ -76,6 +77,7 @@ __all__ = [
     'EmailAddressField',
     
     # Export helpers / utilities
+    'AdapterLookupCache',
 ]
 
 #
@@ -195,11 +197,12 @@ leaf_ifaces = [
 # Utilities
 #
 
-def build_adaptee(field, expand_collection=True):
+def build_adaptee(field, expand_collection=True, max_length=None):
     '''Build an adaptee vector for a field instance.
     
     This vector is to be used while trying to adapt on fields (for serialization,
-    formatting, widgets etc.).
+    formatting, widgets etc.). If max_length is given, the vector is truncated 
+    to (at most) this length.
     '''
 
     # Load (if not already) the object-factory lookup function. 
@@ -215,6 +218,8 @@ def build_adaptee(field, expand_collection=True):
 
     y = field
     while IContainerField.providedBy(y):
+        if max_length and len(adaptee) == max_length:
+            return adaptee
         adaptee.append(y.value_type)
         y = y.value_type
      
@@ -225,6 +230,86 @@ def build_adaptee(field, expand_collection=True):
 
     return adaptee
 
+def build_adaptee_key(field, expand_collection=True):
+    '''Build a (hashable) key that identifies the adaptee vector for a field
+    instance, i.e. the interfaces provided by every member of the vector. 
+    
+    This key can be used to cache adapter lookups without building the vector
+    itself (see build_adaptee). A (probably nested) container of objects is 
+    represented by the underlying schema.
+    '''
+    
+    provided_by = zope.interface.providedBy
+
+    key = [provided_by(field)]
+    
+    if not expand_collection:
+        return tuple(key)
+
+    y = field
+    while IContainerField.providedBy(y):
+        y = y.value_type
+        key.append(provided_by(y))
+
+    if not (y is field) and IObjectField.providedBy(y):
+        key[-1] = y.schema
+
+    return tuple(key)
+
+class AdapterLookupCache(object):
+    '''A cache for adapter lookups (on a certain adapter registry). 
+    
+    Cached entries are invalidated whenever new adapters are registered. Note
+    that a cache should keep adapter factories (not adapters), as an adapter is 
+    usually bound to its adaptee. 
+    '''
+
+    caches = {}
+
+    def __init__(self, name, registry):
+        self.name = name
+        self.registry = registry
+        self.hits = 0
+        self.misses = 0
+        self._generation = registry._generation
+        self._data = {}
+        self._lock = threading.Lock()
+        AdapterLookupCache.caches[name] = self
+
+    def get(self, key, default=None):
+        data = self._data
+        if self._generation != self.registry._generation:
+            self.clear()
+            data = self._data
+        try:
+            value = data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        with self._lock:
+            if self._generation == self.registry._generation:
+                self._data[key] = value
+
+    def clear(self):
+        with self._lock:
+            self._generation = self.registry._generation
+            self._data = {}
+    
+    def stats(self):
+        return {
+            'hits': self.hits, 
+            'misses': self.misses, 
+            'size': len(self._data),
+        }
+    
+    def __repr__(self):
+        return '<%s %r hits=%d misses=%d size=%d>' % (
+            type(self).__name__, self.name, self.hits, self.misses, len(self._data))
+
 def check_multiadapter_ifaces(required_ifaces):
     '''Check if a vector of required interfaces is valid to be registered as a field
     multiadapter.
@@ -0,0 +1,126 @@
+'''Provide a cache for the formatted output of metadata objects.
+
+Formatting an object (e.g. as markup for a dataset page) descends into all of
+its fields, while the metadata of a dataset rarely change between page views.
+So, keep the formatted output keyed by a digest of the object's current values,
+the formatter and its options (and the active language):
+
+    >>> key = make_key(formatter, obj, opts)
+    >>> s = get(key, lambda: formatter._format(obj, opts))
+
+The cache is disabled by default (i.e. the backend is 'none'), as making a key 
+costs a good part of formatting an object. It can be enabled, so that entries are
+kept into a process-wide LRU cache, or into a beaker-based cache shared among 
+processes (see ckanext.publicamundi.cache_manager):
+
+    >>> setup(backend='memory')
+    >>> setup(backend='beaker')
+
+'''
+
+import json
+import hashlib
+import pylons.i18n
+
+from ckanext.publicamundi.lib.memoizer import Cache
+
+__all__ = [
+    'setup',
+    'make_key',
+    'get',
+    'clear',
+    'stats',
+]
+
+backends = ('memory', 'beaker', 'none')
+
+_backend = 'none'
+
+_cache = Cache(None, maxsize=2048)
+
+_beaker_cache_name = 'formatted'
+
+_missing = object()
+
+def setup(backend='none', maxsize=None):
+    '''Setup the backend (one of `backends`) for the module-global cache.
+    '''
+    global _backend, _cache
+
+    if not backend in backends:
+        raise ValueError('Unknown backend for format cache: %r' % (backend))
+
+    _backend = backend
+    if backend == 'memory' and maxsize:
+        _cache = Cache(None, maxsize=int(maxsize))
+
+    return
+
+def make_key(formatter, obj, opts):
+    '''Make a (string) key for formatting obj with formatter under opts.
+
+    The key is based on a digest computed from the current values of obj (not 
+    on its cached digest, which does not track in-place changes).
+
+    Return None if the result should not be cached, e.g. if opts contain values 
+    other than primitive ones (or lists/dicts of them).
+    '''
+
+    if _backend == 'none':
+        return None
+    
+    try:
+        opts_str = json.dumps(_canonicalize(opts), sort_keys=True)
+    except TypeError:
+        return None # cannot identify these opts
+
+    cls, obj_cls = type(formatter), type(obj)
+    digest = hashlib.sha1(obj.to_json()).hexdigest()
+    return '%s.%s:%s:%s.%s:%s:%s:%s' % (
+        cls.__module__, cls.__name__,
+        getattr(formatter, 'requested_name', None) or '',
+        obj_cls.__module__, obj_cls.__name__,
+        digest,
+        opts_str,
+        _get_language() or '')
+
+def get(key, createfunc):
+    '''Get the cached value for key, or create (and cache) it with createfunc.
+    '''
+
+    if _backend == 'beaker':
+        from ckanext.publicamundi.cache_manager import get_cache
+        return get_cache(_beaker_cache_name).get(key, createfunc=createfunc)
+
+    res = _cache.get(key, _missing)
+    if res is _missing:
+        res = createfunc()
+        _cache.set(key, res)
+    return res
+
+def clear():
+    '''Clear all cached entries (kept in process).
+    '''
+    _cache.clear()
+
+def stats():
+    return dict(_cache.stats(), backend=_backend)
+
+def _canonicalize(v):
+    '''Convert a value to a JSON-friendly (primitive) one, or raise TypeError.
+    '''
+    if v is None or isinstance(v, (bool, int, long, float, basestring)):
+        return v
+    if isinstance(v, (list, tuple)):
+        return [_canonicalize(y) for y in v]
+    if isinstance(v, dict):
+        return {str(k): _canonicalize(y) for k, y in v.iteritems()}
+    raise TypeError('Not a primitive value: %r' % (type(v)))
+
+def _get_language():
+    try:
+        lang = pylons.i18n.get_lang()
+    except TypeError:
+        # Not inside a request
+        return None
+    return lang[0] if lang else None
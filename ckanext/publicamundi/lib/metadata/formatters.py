@@ -15,7 +15,7 @@ from ckanext.publicamundi.lib import logger
 from ckanext.publicamundi.lib.util import quote, raise_for_stub_method
 from ckanext.publicamundi.lib.metadata.fields import *
 from ckanext.publicamundi.lib.metadata.fields import (
-    build_adaptee, check_multiadapter_ifaces)
+    build_adaptee, build_adaptee_key, check_multiadapter_ifaces)
 from ckanext.publicamundi.lib.metadata import adapter_registry
 from ckanext.publicamundi.lib.metadata.ibase import IFormatSpec, IFormatter
 
@@ -93,11 +93,39 @@ def field_format_multiadapter(required_ifaces, name='', is_fallback=False):
 
 # Utilities
 
+_lookup_cache = AdapterLookupCache('formatter_for_field', adapter_registry)
+
 def formatter_for_field(field, name=''):
     '''Get a proper formatter for a zope.schema.Field instance.
     '''  
     assert isinstance(field, zope.schema.Field)
     
+    # Find the formatter factory for this adaptee (and the length of the 
+    # adaptee vector it was registered for)
+   
+    key = (build_adaptee_key(field, expand_collection=True), name)
+    t = _lookup_cache.get(key)
+    if t is None:
+        t = _lookup_formatter_factory(field, name)
+        _lookup_cache.set(key, t)
+    factory, n = t
+    
+    if not factory:
+        return None
+
+    adaptee = build_adaptee(field, expand_collection=True, max_length=n)
+    formatter = factory(*adaptee)
+    if formatter:
+        formatter.requested_name = name
+    return formatter
+
+def _lookup_formatter_factory(field, name):
+    '''Lookup for a formatter factory for a field, falling back to a more 
+    general version of its adaptee vector. 
+    
+    Return a tuple of (factory, length-of-adaptee) or (None, 0) if not found.
+    '''
+    
     # Build adaptee vector
     
     adaptee = build_adaptee(field, expand_collection=True)
@@ -108,21 +136,17 @@ def formatter_for_field(field, name=''):
     if name:
         candidates.insert(0, 'format:%s' % (name))
     
-    formatter = None
-    while adaptee:
+    provided_by = zope.interface.providedBy
+    required = map(provided_by, adaptee)
+    while required:
         for candidate in candidates: 
-            formatter = adapter_registry.queryMultiAdapter(
-                adaptee, IFormatter, candidate)
-            if formatter:
-                break
-        if formatter:
-            break
+            factory = adapter_registry.lookup(required, IFormatter, candidate)
+            if factory:
+                return (factory, len(required))
         # Fallback to a more general version of this adaptee    
-        adaptee.pop()
-
-    if formatter:
-        formatter.requested_name = name
-    return formatter
+        required.pop()
+    
+    return (None, 0)
 
 def config_for_field(field, name=''):
     '''Get config options for field.
@@ -1,3 +1,5 @@
+import copy
+from contextlib import contextmanager, nested
 import zope.interface
 import zope.schema
 from zope.interface import implementer, alsoProvides
@@ -6,7 +8,7 @@ from zope.interface.verify import verifyObject
 from ckanext.publicamundi.lib import logger
 from ckanext.publicamundi.lib.languages import (ILanguage, Language)
 from ckanext.publicamundi.lib.metadata import adapter_registry
-from ckanext.publicamundi.lib.metadata import (IMetadata, Metadata)
+from ckanext.publicamundi.lib.metadata import (IMetadata, Metadata, Object)
 from ckanext.publicamundi.lib.metadata.fields import *
 from ckanext.publicamundi.lib.metadata.base import (IFieldContext, FieldContext)
 
@@ -64,6 +66,37 @@ def translator_for_field(field, source_language, field_translation):
         [field, Language(source_language), field_translation], ITranslator, name)
     return translator
 
+def make_overlay(obj, overrides):
+    '''Build a copy-on-write view of obj, with overrides (as pairs of flattened 
+    keys and leaf values) applied.
+
+    Only the containers (objects, lists or dicts) found on the path of an overriden
+    leaf are (shallow) copied, everything else is shared with obj. So, the result 
+    should be treated as a read-only view.
+    '''
+
+    groups = {}
+    for kt, value in overrides:
+        groups.setdefault(kt[0], []).append((kt[1:], value))
+
+    if isinstance(obj, Object):
+        res = copy.copy(obj)
+        get_item, set_item = getattr, setattr
+    elif isinstance(obj, (list, dict)):
+        res = type(obj)(obj)
+        get_item, set_item = type(obj).__getitem__, type(obj).__setitem__
+    else:
+        raise TypeError('Cannot override items of %r' % (obj,))
+
+    for k, items in groups.iteritems():
+        if len(items) == 1 and not items[0][0]:
+            value = items[0][1] # a leaf
+        else:
+            value = make_overlay(get_item(obj, k), items)
+        set_item(res, k, value)
+    
+    return res
+
 ## Base 
 
 @translate_adapter()
@@ -90,6 +123,41 @@ class MetadataTranslator(object):
                 self.md.identifier, self.source_language),
         )
     
+    def rebind(self, md):
+        '''Return a translator for md (another view of the same metadata), sharing
+        field translations (and any translations already loaded by them) with self.
+        '''
+        assert isinstance(md, type(self.md))
+        assert md.identifier == self.md.identifier
+
+        translator = copy.copy(self)
+        translator.md = md
+        return translator
+
+    def get_version(self, language):
+        '''Return a version for the translations available for language, i.e. a 
+        string that changes whenever any of these translations changes.
+        
+        Return None if field translations cannot provide a version.
+        '''
+        
+        versions = []
+        for translation in self._translations:
+            if not hasattr(translation, 'get_version'):
+                return None
+            versions.append(translation.get_version(language))
+        
+        return ':'.join(versions)
+
+    @contextmanager
+    def batch(self):
+        '''Write translations (added inside this block) in bulk, for all field 
+        translations that support it.
+        '''
+        
+        with nested(*(t.batch() for t in self._translations if hasattr(t, 'batch'))):
+            yield self
+
     def _make_metadata_from_dict(self, d):
         '''Load a metadata object from a dict.
         '''
@@ -121,28 +189,29 @@ class MetadataTranslator(object):
         # present in the source metadata object (i.e. self.md).
 
         flattened = self.md.to_dict(flat=True)
-        for kp, value in flattened.items():
-            yf = self.md.get_field(kp)
-            yf.context.key = (key_prefix,) + kp
-            if yf.queryTaggedValue('translatable'):
-                try:
-                    yf1 = translated.get_field(kp)
-                except Exception as ex:
-                    yf1 = None
-                if not (yf1 and yf1.context.value):
-                    continue # no translation for kp
-                for translation in self._translations:
-                    tr = translator_for_field(yf, source_language, translation)
-                    if not tr:
-                        continue # no registered translator
-                    yf1 = tr.translate(language, yf1.context.value)
-                    flattened[kp] = yf1.context.value
-                    break # translated field
+        overrides = []
+        with self.batch(): # write all translations at once
+            for kp, value in flattened.iteritems():
+                yf = self.md.get_field(kp)
+                yf.context.key = (key_prefix,) + kp
+                if yf.queryTaggedValue('translatable'):
+                    try:
+                        yf1 = translated.get_field(kp)
+                    except Exception as ex:
+                        yf1 = None
+                    if not (yf1 and yf1.context.value):
+                        continue # no translation for kp
+                    for translation in self._translations:
+                        tr = translator_for_field(yf, source_language, translation)
+                        if not tr:
+                            continue # no registered translator
+                        yf1 = tr.translate(language, yf1.context.value)
+                        overrides.append((kp, yf1.context.value))
+                        break # translated field
         
-        # Build and return a metadata object
+        # Build and return a (copy-on-write) metadata object
 
-        md = type(self.md)()
-        md.from_dict(flattened, is_flat=True)
+        md = make_overlay(self.md, overrides)
         md.source_language = self.source_language
         md.translation_language = language
 
@@ -156,7 +225,8 @@ class MetadataTranslator(object):
         # Lookup all available translations 
         
         flattened = self.md.to_dict(flat=True)
-        for kp, value in flattened.items():
+        overrides = []
+        for kp, value in flattened.iteritems():
             yf = self.md.get_field(kp)
             yf.context.key = (key_prefix,) + kp
             if yf.queryTaggedValue('translatable'):
@@ -166,13 +236,13 @@ class MetadataTranslator(object):
                         continue # no registered translator
                     yf1 = tr.get(language)
                     if yf1:
-                        flattened[kp] = yf1.context.value
+                        overrides.append((kp, yf1.context.value))
                         break # translated field
         
-        # Build a translated metadata object
+        # Build a translated (copy-on-write) metadata object: only overriden 
+        # leafs are stored, all other values are shared with the source object
 
-        md = type(self.md)()
-        md.from_dict(flattened, is_flat=True)
+        md = make_overlay(self.md, overrides)
         md.source_language = self.source_language
         md.translation_language = language
 
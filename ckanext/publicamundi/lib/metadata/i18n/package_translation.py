@@ -3,10 +3,13 @@
 
 import zope.interface
 from zope.interface.verify import verifyObject
+import json
+import hashlib
 import sqlalchemy
 import sqlalchemy.orm as orm
 import logging
 import pylons
+from contextlib import contextmanager
 
 import ckan.model as model
 
@@ -15,6 +18,7 @@ from ckanext.publicamundi.lib.util import check_uuid
 from ckanext.publicamundi.lib.metadata.fields import Field, IField, TextField
 from ckanext.publicamundi.lib.metadata.base import FieldContext, IFieldContext
 from ckanext.publicamundi.lib.languages import check as check_language
+from ckanext.publicamundi.lib.metadata import object_cache
 
 from .ibase import (IFieldTranslation, IKeyBasedFieldTranslation)
 
@@ -26,11 +30,36 @@ log1 = logging.getLogger(__name__)
 class FieldTranslation(object):
     '''Provide a key-based field translation mechanism in the scope of a package.
 
-    Use main database as persistence layer.
+    Use main database as persistence layer. 
+    
+    All translations of the package (for a target language) are loaded with a 
+    single query on the first lookup, and further lookups are served from memory
+    (see preload).
     '''
 
     def defer_commit(self, flag=True):
         self._defer_commit = flag
+    
+    @contextmanager
+    def batch(self):
+        '''Queue translations (added/updated inside this block) and write them
+        in bulk when the block exits. Blocks can be nested, only the outermost
+        one writes.
+        '''
+        
+        self._batch_depth += 1
+        try:
+            yield self
+        except:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                del self._pending[:]
+            raise
+        else:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                records, self._pending = self._pending, []
+                upsert_translations(records, commit=(not self._defer_commit))
 
     def __init__(self, package, source_language=None):
         
@@ -52,6 +81,13 @@ class FieldTranslation(object):
         self._source_language = check_language(source_language)
         
         self._defer_commit = False
+        
+        # Map (language, state) to a dict of preloaded translations (keyed on key)
+        self._preloaded = {}
+        
+        # Keep translations queued inside a batch (see batch)
+        self._batch_depth = 0
+        self._pending = []
 
     def __str__(self):
         return '<FieldTranslation ns=%s source=%s>' % (
@@ -93,21 +129,7 @@ class FieldTranslation(object):
 
         # Lookup for a translation on this key
         
-        cond = dict(
-            package_id = self._package_id,
-            source_language = self._source_language,
-            key = key,
-            language = language)
-        if state and (state != '*'):
-            cond['state'] = state
-        r1, value = None, None
-        q = model.Session.query(ext_model.PackageTranslation).filter_by(**cond)
-        try:
-            r1 = q.one()
-        except orm.exc.NoResultFound as ex:
-            pass
-        else:
-            value = r1.value
+        value = self.preload(language, state).get(key)
         
         if value:
             return field.bind(FieldContext(key=field.context.key, value=value))
@@ -126,28 +148,45 @@ class FieldTranslation(object):
         if not value:
             raise ValueError('value: Missing')
         
-        # Insert or update a translation
+        # Insert or update a translation (or queue it, if inside a batch)
 
         cond = dict(
             package_id = self._package_id,
             source_language = self._source_language,
             key = key,
             language = language)
-        q = model.Session.query(ext_model.PackageTranslation).filter_by(**cond)
-        r1 = None
-        try:
-            r1 = q.one()
-        except orm.exc.NoResultFound as ex:
-            # Insert
-            r1 = ext_model.PackageTranslation(**cond)
-            model.Session.add(r1)
         
-        r1.value = value
-        r1.state = state
+        if self._batch_depth:
+            self._pending.append(dict(cond, value=value, state=state))
+        else:
+            q = model.Session.query(ext_model.PackageTranslation).filter_by(**cond)
+            r1 = None
+            try:
+                r1 = q.one()
+            except orm.exc.NoResultFound as ex:
+                # Insert
+                r1 = ext_model.PackageTranslation(**cond)
+                model.Session.add(r1)
+            r1.value = value
+            r1.state = state
+        
+        for (lang, st), preloaded in self._preloaded.iteritems():
+            if lang != language:
+                continue
+            if st in (state, '*', None):
+                preloaded[key] = value
+            else:
+                preloaded.pop(key, None)
+        
+        if self._batch_depth:
+            return field.bind(FieldContext(key=field.context.key, value=value))
         
         if not self._defer_commit:
             model.Session.commit()
         
+        # Objects built (and translated) for this package are now stale
+        object_cache.invalidate(self._package_id)
+        
         return field.bind(FieldContext(key=field.context.key, value=value))
 
     def discard(self, field=None, language=None):
@@ -171,9 +210,13 @@ class FieldTranslation(object):
         
         q = model.Session.query(ext_model.PackageTranslation).filter_by(**cond)
         n = q.delete()
-
+        
+        self._preloaded.clear()
+        
         if not self._defer_commit:
             model.Session.commit()
+        
+        object_cache.invalidate(self._package_id)
         return n
 
     ## IKeyBasedFieldTranslation interface ##
@@ -183,6 +226,34 @@ class FieldTranslation(object):
         return self._package_id
     
     ## Helpers ##
+    
+    def preload(self, language, state='active'):
+        '''Load all translations for a given language in a single query (unless 
+        already loaded).
+        
+        Return a dict mapping keys to translated values.
+        '''
+        
+        language = check_language(language)
+        
+        preloaded = self._preloaded.get((language, state))
+        if preloaded is None:
+            preloaded = {yf.context.key: yf.context.value 
+                for st, yf in self.iter_fields(language, state)}
+            self._preloaded[(language, state)] = preloaded
+        
+        return preloaded
+    
+    def get_version(self, language, state='active'):
+        '''Return a version (a digest) for all translations of a given language.
+        
+        The version changes whenever a translation is added, updated or discarded
+        (even by another process), so it can be part of a cache key for objects
+        built from these translations. 
+        '''
+        
+        preloaded = self.preload(language, state)
+        return hashlib.sha1(json.dumps(sorted(preloaded.iteritems()))).hexdigest()
 
     def iter_fields(self, language, state='active'):
         '''Iterate on field translations for a given language.
@@ -203,3 +274,151 @@ class FieldTranslation(object):
         for r in q.all():
             yield r.state, uf.bind(FieldContext(key=r.key, value=r.value))
          
+
+## Bulk operations ##
+
+def get_translations(packages, keys, language, state='active'):
+    '''Lookup translations for several packages (and keys) in a single query.
+
+    The packages are given as (package_id, source_language) pairs, while keys 
+    are given as dotted key paths (e.g. 'title' or 'inspire.abstract').
+
+    Return a dict mapping (package_id, key) to a translated value.
+    '''
+    
+    source_languages = {str(pkg_id): check_language(source_lang)
+        for pkg_id, source_lang in packages}
+    if not (source_languages and keys):
+        return {}
+    
+    cls = ext_model.PackageTranslation
+    q = model.Session.query(cls.package_id, cls.source_language, cls.key, cls.value)
+    q = q.filter(cls.package_id.in_(source_languages.keys()))
+    q = q.filter(cls.key.in_(list(keys)))
+    q = q.filter(cls.language == check_language(language))
+    if state and (state != '*'):
+        q = q.filter(cls.state == state)
+    
+    # Note Translations from another source language are filtered out here, as this
+    # is much simpler than filtering on (package_id, source_language) pairs
+
+    result = {}
+    for pkg_id, source_lang, key, value in q.all():
+        if value and source_languages.get(pkg_id) == source_lang:
+            result[(pkg_id, key)] = value
+    return result
+
+_record_columns = ('package_id', 'source_language', 'language', 'key', 'value', 'state')
+
+def upsert_translations(records, batch_size=500, commit=True, progress=None):
+    '''Add or update translations in bulk.
+
+    Every record is a dict of (package_id, source_language, language, key, value)
+    and (optionally) state. Invalid records are skipped (with a warning).
+    
+    Records are written in batches, and every batch costs a query (to find which 
+    translations already exist), an update and an insert (both executed as a
+    single multi-row statement). If commit is set, every batch is committed.
+
+    If given, progress is called after each batch with the counts so far.
+    
+    Return a dict with counts of created, updated and skipped records.
+    '''
+    
+    counts = {'created': 0, 'updated': 0, 'skipped': 0}
+    
+    batch = []
+    for r in records:
+        try:
+            batch.append(_check_record(r))
+        except ValueError as ex:
+            log1.warn('Skipping translation record %r: %s', r, str(ex))
+            counts['skipped'] += 1
+            continue
+        if len(batch) == batch_size:
+            _upsert_batch(batch, counts, commit)
+            batch = []
+            if progress:
+                progress(dict(counts))
+    
+    if batch:
+        _upsert_batch(batch, counts, commit)
+        if progress:
+            progress(dict(counts))
+    
+    return counts
+
+def _check_record(r):
+    '''Check a translation record, return it as a tuple of
+    (package_id, source_language, language, key, value, state)
+    '''
+    
+    package_id = check_uuid(str(r.get('package_id', '')))
+    if not package_id:
+        raise ValueError('package_id: Expected a UUID identifier')
+    
+    key = str(r.get('key') or '')
+    if not key:
+        raise ValueError('key: Missing')
+    
+    value = unicode(r.get('value') or '')
+    if not value:
+        raise ValueError('value: Missing')
+    
+    state = r.get('state') or 'active'
+    if not state in ext_model.package_translation.translation_states:
+        raise ValueError('state: Unknown state %r' % (state))
+    
+    source_language = r.get('source_language') or \
+        pylons.config['ckan.locale_default']
+    
+    return (
+        package_id,
+        check_language(source_language),
+        check_language(r.get('language')),
+        key, value, state)
+
+def _upsert_batch(batch, counts, commit):
+    
+    # Keep the last record for every unique (package_id, source_language, language, key)
+    
+    records = {r[:4]: r for r in batch}
+    
+    # Find which translations already exist
+    
+    table = ext_model.PackageTranslation.__table__
+    q = sqlalchemy.select(
+        [table.c.tid, table.c.package_id, table.c.source_language, table.c.language, table.c.key],
+        sqlalchemy.and_(
+            table.c.package_id.in_(set(t[0] for t in records)),
+            table.c.key.in_(set(t[3] for t in records))))
+    existing = {tuple(map(str, row[1:])): row[0] for row in model.Session.execute(q)}
+    
+    # Update existing translations, insert new ones
+
+    updates, inserts = [], []
+    for t, r in records.iteritems():
+        tid = existing.get(t)
+        if tid:
+            updates.append({'_tid': tid, '_value': r[4], '_state': r[5]})
+        else:
+            inserts.append(dict(zip(_record_columns, r)))
+
+    if updates:
+        bindparam = sqlalchemy.bindparam
+        stmt = table.update().where(table.c.tid == bindparam('_tid')).values(
+            value=bindparam('_value'), state=bindparam('_state'))
+        model.Session.execute(stmt, updates)
+    if inserts:
+        model.Session.execute(table.insert(), inserts)
+    
+    if commit:
+        model.Session.commit()
+
+    counts['updated'] += len(updates)
+    counts['created'] += len(inserts)
+    
+    # Objects built (and translated) for these packages are now stale
+
+    for package_id in set(t[0] for t in records):
+        object_cache.invalidate(package_id)
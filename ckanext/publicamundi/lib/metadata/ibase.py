@@ -29,6 +29,18 @@ class IKeyTupleSerializer(ISerializer):
         for the certain serializer and the certain key_type.  
         '''
 
+    def dumps_all(d):
+        '''Serialize all (tuple) keys of a flattened dict d. 
+        
+        Return a new dict with serialized keys.
+        '''
+
+    def loads_all(d):
+        '''Unserialize all (string) keys of dict d (skipping keys not under our prefix). 
+        
+        Return a new (flattened) dict with tuple keys.
+        '''
+
 class IXmlSerializer(ISerializer):
     
     target_namespace = zope.schema.URI(required = True)
@@ -68,6 +80,21 @@ class IXmlSerializer(ISerializer):
         '''Load and return an object from an XML tree e.
         '''
 
+    def iter_dumps(o=None):
+        '''Dump a given object o to an XML document, generated incrementally as 
+        a sequence of byte chunks.
+        '''
+    
+    def dump(fp, o=None):
+        '''Dump a given object o to an XML document, written incrementally to
+        a file-like object fp.
+        '''
+
+    def iter_loads(source, tag=None):
+        '''Load objects from a (possibly multi-record) XML source, yielding
+        them one by one.
+        '''
+
 class ISerializable(Interface):
 
     def loads(s):
@@ -0,0 +1,156 @@
+'''Provide lazy (i.e. built on first access) metadata objects.
+
+Many callers of package_show (e.g. storers, helpers or templates that only read
+core fields) never touch the metadata object of a package, while building it is
+the most expensive part of after_show. So, a LazyObject proxy is put in place of
+the actual object, which is built (from a factory) only when it is really needed:
+
+    >>> md = LazyObject(InspireMetadata, lambda: InspireMetadata.from_converted_data(data))
+    >>> isinstance(md, InspireMetadata) # not built yet
+    True
+    >>> md.title # built now
+    u'Foo'
+
+Keep counters on created/materialized proxies, so that the actual benefit can be
+measured:
+
+    >>> stats()
+    {'created': 1, 'materialized': 1}
+
+Note that a proxy is not an instance of its class as far as type() is concerned,
+so code that dispatches on type() (e.g. serializers) should use the actual object:
+
+    >>> type(materialize(md)) is InspireMetadata
+    True
+
+'''
+
+import copy
+import logging
+import threading
+
+__all__ = [
+    'LazyObject',
+    'is_materialized',
+    'materialize',
+    'stats',
+    'clear',
+]
+
+log1 = logging.getLogger(__name__)
+
+_counters = {
+    'created': 0,
+    'materialized': 0,
+}
+
+_counters_lock = threading.Lock()
+
+def _count(name):
+    with _counters_lock:
+        _counters[name] += 1
+
+class LazyObject(object):
+    '''A proxy for an object that is created on first attribute access.
+
+    The proxy claims to be an instance of the given class (so that isinstance
+    checks succeed without building the object), while every other attribute
+    is forwarded to the actual object.
+    '''
+
+    __slots__ = ('_lazy_cls_', '_lazy_factory_', '_lazy_obj_')
+
+    def __init__(self, obj_cls, factory):
+        object.__setattr__(self, '_lazy_cls_', obj_cls)
+        object.__setattr__(self, '_lazy_factory_', factory)
+        object.__setattr__(self, '_lazy_obj_', None)
+        _count('created')
+
+    def _get_object(self):
+        obj = object.__getattribute__(self, '_lazy_obj_')
+        if obj is None:
+            factory = object.__getattribute__(self, '_lazy_factory_')
+            obj = factory()
+            object.__setattr__(self, '_lazy_obj_', obj)
+            object.__setattr__(self, '_lazy_factory_', None)
+            _count('materialized')
+            log1.debug('Materialized a lazy %s', type(obj).__name__)
+        return obj
+
+    @property
+    def __class__(self):
+        return object.__getattribute__(self, '_lazy_cls_')
+
+    def __getattr__(self, k):
+        return getattr(self._get_object(), k)
+
+    def __setattr__(self, k, v):
+        setattr(self._get_object(), k, v)
+
+    def __delattr__(self, k):
+        delattr(self._get_object(), k)
+
+    # Note Special methods are looked up on the type, so forward them explicitly
+
+    def __repr__(self):
+        if not is_materialized(self):
+            return '<lazy %s>' % (object.__getattribute__(self, '_lazy_cls_').__name__)
+        return repr(self._get_object())
+
+    def __str__(self):
+        return str(self._get_object())
+
+    def __unicode__(self):
+        return unicode(self._get_object())
+
+    def __format__(self, format_spec):
+        return format(self._get_object(), format_spec)
+
+    def __nonzero__(self):
+        return True
+
+    def __eq__(self, other):
+        if isinstance(other, LazyObject):
+            other = other._get_object()
+        return self._get_object() == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self._get_object())
+
+    def __copy__(self):
+        return copy.copy(self._get_object())
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(self._get_object(), memo)
+
+    def __reduce_ex__(self, protocol):
+        return self._get_object().__reduce_ex__(protocol)
+
+def is_materialized(obj):
+    '''Check if obj is not a lazy object or it is already built.
+    '''
+    if type(obj) is not LazyObject:
+        return True
+    return object.__getattribute__(obj, '_lazy_obj_') is not None
+
+def materialize(obj):
+    '''Return the actual object for obj (built now, if needed), or obj itself if
+    it is not a lazy object.
+    '''
+    if type(obj) is not LazyObject:
+        return obj
+    return obj._get_object()
+
+def stats():
+    with _counters_lock:
+        return dict(_counters)
+
+def clear():
+    '''Reset counters.
+    '''
+    with _counters_lock:
+        for k in _counters:
+            _counters[k] = 0
@@ -0,0 +1,182 @@
+'''Provide a cache for the metadata objects built for shown packages.
+
+Building the metadata object for a package (e.g. at after_show) means loading
+and converting all of its flattened fields, while the same packages are shown
+again and again. So, keep the built object (or its JSON rendering) keyed by the
+package id, the package revision, the dataset type, the active language and the
+view applied on it:
+
+    >>> key = make_key(pkg_dict, return_json, view)
+    >>> result = get(key)
+    >>> if result is None:
+    ...     result = build(pkg_dict)
+    ...     put(key, result)
+
+A key is bound to a specific revision of a package, so a package update will
+never hit a stale entry. Still, some changes (e.g. translations) do not affect
+the revision of a package, so a view depending on such data must identify their
+version in its cache key (e.g. a translated view includes a version of the 
+translations it is built from). Entries for a package can also be discarded using:
+
+    >>> invalidate(pkg_id)
+
+but note that, for the (default) memory backend, this only affects the current
+process, i.e. other processes may still serve these entries.
+
+By default, entries are kept into a process-wide LRU cache. A beaker-based cache
+(see ckanext.publicamundi.cache_manager) can be used instead, so that entries are
+shared among processes:
+
+    >>> setup(backend='beaker')
+
+Note that cached objects are shared, so callers should never modify them.
+'''
+
+import uuid
+import threading
+import pylons.i18n
+
+from ckanext.publicamundi.lib.memoizer import Cache
+
+__all__ = [
+    'setup',
+    'make_key',
+    'get',
+    'put',
+    'invalidate',
+    'clear',
+    'stats',
+]
+
+backends = ('memory', 'beaker', 'none')
+
+_backend = 'memory'
+
+_cache = Cache(None, maxsize=4096)
+
+# Map a package id to the set of keys (for this package) held in memory
+_keys_by_package = dict()
+
+_keys_lock = threading.Lock()
+
+_beaker_cache_name = 'metadata_objects'
+
+def setup(backend='memory', maxsize=None):
+    '''Setup the backend (one of `backends`) for the module-global cache.
+    '''
+    global _backend, _cache
+
+    if not backend in backends:
+        raise ValueError('Unknown backend for object cache: %r' % (backend))
+
+    _backend = backend
+    if backend == 'memory' and maxsize:
+        _cache = Cache(None, maxsize=int(maxsize))
+    clear()
+
+    return
+
+def make_key(pkg_dict, return_json=False, view=None):
+    '''Make a (string) key for the metadata object built for pkg_dict.
+
+    A view (if given) must provide a `cache_key` attribute, i.e. a string that
+    identifies the way a view is derived from the original object (including a 
+    version of any data it depends on, apart from the package itself).
+
+    Return None if the result should not be cached.
+    '''
+
+    if _backend == 'none':
+        return None
+
+    pkg_id = pkg_dict.get('id')
+    revision = pkg_dict.get('revision_id') or pkg_dict.get('metadata_modified')
+    if not (pkg_id and revision):
+        return None
+
+    view_key = ''
+    if view is not None:
+        view_key = getattr(view, 'cache_key', None)
+        if not view_key:
+            return None # cannot identify this view
+
+    key = '%s:%s:%s:%s:%s:%s' % (
+        pkg_id, revision, pkg_dict.get('dataset_type'),
+        _get_language() or '', 'json' if return_json else 'object', view_key)
+
+    if _backend == 'beaker':
+        key = '%s:%s' % (key, _get_beaker_epoch(pkg_id))
+
+    return key
+
+def get(key):
+    '''Get the cached value for key, or None if missing.
+    '''
+
+    if _backend == 'beaker':
+        try:
+            return _get_beaker_cache().get(key)
+        except KeyError:
+            return None
+
+    return _cache.get(key)
+
+def put(key, value):
+    '''Cache value (an object or a JSON-friendly dict) under key.
+    '''
+
+    if _backend == 'beaker':
+        _get_beaker_cache().put(key, value)
+        return
+
+    pkg_id = key.split(':', 1)[0]
+    with _keys_lock:
+        # Forget keys already evicted from the cache (e.g. for older revisions)
+        keys = set(k for k in _keys_by_package.get(pkg_id, ()) if k in _cache)
+        keys.add(key)
+        _keys_by_package[pkg_id] = keys
+    _cache.set(key, value)
+
+def invalidate(pkg_id):
+    '''Discard all cached entries for a package.
+    '''
+
+    if _backend == 'beaker':
+        _get_beaker_cache().put(_beaker_epoch_key(pkg_id), uuid.uuid4().hex)
+        return
+
+    with _keys_lock:
+        keys = _keys_by_package.pop(pkg_id, None)
+    if keys:
+        _cache.delete_many(keys)
+    return
+
+def clear():
+    '''Clear all cached entries (kept in process).
+    '''
+    with _keys_lock:
+        _keys_by_package.clear()
+    _cache.clear()
+
+def stats():
+    return dict(_cache.stats(), backend=_backend)
+
+def _get_language():
+    try:
+        lang = pylons.i18n.get_lang()
+    except TypeError:
+        # Not inside a request
+        return None
+    return lang[0] if lang else None
+
+def _get_beaker_cache():
+    from ckanext.publicamundi.cache_manager import get_cache
+    return get_cache(_beaker_cache_name)
+
+def _beaker_epoch_key(pkg_id):
+    return 'epoch:%s' % (pkg_id)
+
+def _get_beaker_epoch(pkg_id):
+    '''Get the current epoch for a package (renewed on every invalidation)'''
+    return _get_beaker_cache().get(
+        _beaker_epoch_key(pkg_id), createfunc=lambda: uuid.uuid4().hex)
@@ -62,10 +62,12 @@ class IMetadata(IBaseMetadata):
         title=u'Title', required=True, min_length=5)    
     title.setTaggedValue('links-to', 'title')
     title.setTaggedValue('translatable', True)
+    title.setTaggedValue('searchable', True)
 
     identifier = zope.schema.NativeStringLine(
         title=u'Identifier', required=True, min_length=3)
     identifier.setTaggedValue('links-to', 'id')
+    identifier.setTaggedValue('searchable', True)
 
 # Import actual interfaces into schemata
 
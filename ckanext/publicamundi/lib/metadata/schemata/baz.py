@@ -29,10 +29,12 @@ class IBazMetadata(IMetadata):
     keywords = zope.schema.Object(IThesaurusTerms,
         title = u'Baz Keywords',
         required = False)
+    keywords.setTaggedValue('searchable', True)
 
     bbox = zope.schema.Object(IGeographicBoundingBox,
         title = u'Baz BBox',
         required = True)
+    bbox.setTaggedValue('searchable', True)
 
     resolution = zope.schema.Object(ISpatialResolution,
         title = u'Spatial Resolution',
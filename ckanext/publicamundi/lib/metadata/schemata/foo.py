@@ -25,6 +25,7 @@ class IFooMetadata(IMetadata):
         title = u'Category',
         required = True,
         default = 'economy')
+    thematic_category.setTaggedValue('searchable', True)
 
     baz = zope.schema.TextLine(
         title = u'Baz',
@@ -42,11 +43,13 @@ class IFooMetadata(IMetadata):
         max_length = 5,)
     tags.setTaggedValue('allow-partial-update', False)
     tags.setTaggedValue('format', { 'descend-if-dictized': False, 'extra-opts': {}, })
+    tags.setTaggedValue('searchable', True)
 
     temporal_extent = zope.schema.Object(ITemporalExtent,
         title = u'Temporal Extent',
         required = False)
     temporal_extent.setTaggedValue('format', { 'descend-if-dictized': False })
+    temporal_extent.setTaggedValue('searchable', True)
 
     geometry = zope.schema.List(
         title = u'Geometry Feature',
@@ -70,6 +73,7 @@ class IFooMetadata(IMetadata):
         title = u'Notes',
         description = u'Add your notes')
     description.setTaggedValue('translatable', True)
+    description.setTaggedValue('searchable', True)
 
     contacts = zope.schema.Dict(
         title = u'Contacts',
@@ -56,12 +56,14 @@ class IInspireMetadata(IMetadata):
         description = _(u'This a characteristic (and often unique) name by which the resource is known.'),
         required = True)
     title.setTaggedValue('translatable', True)
+    title.setTaggedValue('searchable', True)
 
     identifier = zope.schema.NativeStringLine(
         title = _(u'Identifier'),
         description = _(u'A value uniquely identifying the dataset. The value domain of this metadata element is a mandatory character string code, generally assigned by the data owner, and a character string namespace uniquely identifying the context of the identifier code (for example, the data owner).'),
         required = True)
     identifier.setTaggedValue('links-to', 'id')
+    identifier.setTaggedValue('searchable', True)
 
     abstract = zope.schema.Text(
         title = _(u'Resource Abstract'),
@@ -69,6 +71,7 @@ class IInspireMetadata(IMetadata):
         required = True)
     abstract.setTaggedValue('translatable', True)
     abstract.setTaggedValue('links-to', 'notes')
+    abstract.setTaggedValue('searchable', True)
 
     locator = zope.schema.List(
         title = _(u'Resource Locator'),
@@ -88,6 +91,7 @@ class IInspireMetadata(IMetadata):
         value_type = zope.schema.Choice(
             title = _(u'Resource Language'),
             vocabulary = vocabularies.by_name('languages-iso-639-2').get('vocabulary'),))
+    resource_language.setTaggedValue('searchable', True)
 
     # Classification 
 
@@ -101,6 +105,7 @@ class IInspireMetadata(IMetadata):
             title = _(u'Topic Category'),
             vocabulary = vocabularies.by_name('topic-category').get('vocabulary'),))
     topic_category.setTaggedValue('format:markup', {'descend-if-dictized': False})
+    topic_category.setTaggedValue('searchable', True)
 
     # Keywords
 
@@ -117,6 +122,7 @@ class IInspireMetadata(IMetadata):
         value_type = zope.schema.Object(IThesaurusTerms, 
             title = _(u'Keywords')))
     keywords.setTaggedValue('format:markup', {'descend-if-dictized': False})
+    keywords.setTaggedValue('searchable', True)
 
     @zope.interface.invariant
     def check_keywords(obj):
@@ -133,6 +139,7 @@ class IInspireMetadata(IMetadata):
             value_type = zope.schema.Object(IFreeKeyword,
                 title = _(u'Free Keyword')))
     free_keywords.setTaggedValue('format:markup', {'descend-if-dictized': False})
+    free_keywords.setTaggedValue('searchable', True)
 
     # Geographic
 
@@ -145,6 +152,7 @@ class IInspireMetadata(IMetadata):
         value_type = zope.schema.Object(IGeographicBoundingBox,
             title = _(u'Bounding Box')))
     bounding_box.setTaggedValue('format:markup', {'descend-if-dictized': True})
+    bounding_box.setTaggedValue('searchable', True)
 
     # Temporal 
 
@@ -155,21 +163,25 @@ class IInspireMetadata(IMetadata):
         max_length = 3,
         value_type = zope.schema.Object(ITemporalExtent,
             title = _(u'Extent')))
+    temporal_extent.setTaggedValue('searchable', True)
 
     creation_date = zope.schema.Date(
         title = _(u'Creation Date'),
         description = _(u'This is the date of creation of the resource. There shall not be more than one date of creation.'),
         required = False)
+    creation_date.setTaggedValue('searchable', True)
 
     publication_date = zope.schema.Date(
         title = _(u'Publication Date'),
         description = _(u'This is the date of publication of the resource when available, or the date of entry into force. There may be more than one date of publication.'),
         required = False)
+    publication_date.setTaggedValue('searchable', True)
 
     revision_date = zope.schema.Date(
         title = _(u'Revision Date'),
         description = _(u'This is the date of last revision of the resource, if the resource has been revised. There shall not be more than one date of last revision.'),
         required = False)
+    revision_date.setTaggedValue('searchable', True)
 
     @zope.interface.invariant
     def check_creation_publication_order(obj):
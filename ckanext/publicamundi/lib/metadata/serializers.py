@@ -14,6 +14,10 @@ So far, the formats supported are:
         understood by json.dumps. This kind of serializer will *not* be registered to
         handle data types inherently supported by JSON (e.g. like integers and floats).
 
+    * blob:
+        Only meaningfull for objects: dump a whole object into a single (compact) 
+        string, which is cheap to load in one step (see base.ObjectBlobSerializer).
+
 Note that for a specific format and a field interface, a serializer may not exist:
 this is not an error, it usually means that serialization is not meaningfull in this 
 context (and maybe values should be left unchanged, see examples below).
@@ -42,6 +46,7 @@ import zope.schema
 from itertools import chain
 
 from ckanext.publicamundi.lib.util import raise_for_stub_method
+from ckanext.publicamundi.lib.memoizer import memoize
 from ckanext.publicamundi.lib.metadata.fields import *
 from ckanext.publicamundi.lib.metadata import adapter_registry
 from ckanext.publicamundi.lib.metadata.ibase import (
@@ -52,6 +57,7 @@ __all__ = [
     'field_serialize_adapter',
     'BaseSerializer', 
     'serializer_for_key_tuple', 
+    'key_path_registry',
     'serializer_for_field',
     'serializer_factory_for_key_tuple', 
     'serializer_factory_for_field',
@@ -59,7 +65,7 @@ __all__ = [
 
 # Decorators for adaptation
 
-supported_formats = [ 'default', 'json-s' ]
+supported_formats = [ 'default', 'json-s', 'blob' ]
 
 def field_serialize_adapter(required_iface, name='default'):
     assert required_iface.isOrExtends(IField)
@@ -86,15 +92,34 @@ def serializer_for_key_tuple(key_prefix=None):
         serializer.prefix = key_prefix
     return serializer
 
+_lookup_cache = AdapterLookupCache('serializer_for_field', adapter_registry)
+
 def serializer_for_field(field, name='default'):
     '''Get a proper serializer for a zope.schema.Field instance.
     Normally, this will be used for leaf (non collection-based) fields.
     ''' 
     assert isinstance(field, zope.schema.Field)
     assert name in supported_formats
-    serializer = adapter_registry.queryMultiAdapter(
-        [field], ISerializer, 'serialize:%s' %(name))
-    return serializer
+    
+    key = (zope.interface.providedBy(field), name)
+    factory = _lookup_cache.get(key, False)
+    if factory is False:
+        factory = adapter_registry.lookup(
+            [key[0]], ISerializer, 'serialize:%s' %(name))
+        _lookup_cache.set(key, factory)
+    
+    return factory(field) if factory else None
+
+_key_path_registries = dict()
+
+def key_path_registry(prefix=None, glue='.'):
+    '''Get the (process-wide) registry of interned key paths for a key prefix.
+    '''
+    key = (prefix, glue)
+    registry = _key_path_registries.get(key)
+    if registry is None:
+        registry = _key_path_registries.setdefault(key, KeyPathRegistry(prefix, glue))
+    return registry
 
 def serializer_factory_for_key_tuple():
     '''Get a proper serializer factory for the tuple-typed keys of a dict.
@@ -274,6 +299,74 @@ class TimeFieldSerializer(BaseFieldSerializer):
             t = t.time()
         return t
 
+class KeyPathRegistry(object):
+    '''Intern the serialized forms of key paths (under a certain prefix).
+
+    Every distinct key path is joined (or split) only once, and the resulting 
+    strings (or tuples) are shared among all callers (so, they are immutable).
+    '''
+
+    # Stop interning beyond this size (should never happen for schema-based keys)
+    maxsize = 100000
+
+    def __init__(self, prefix, glue):
+        self.prefix = prefix
+        self.glue = glue
+        self._dumped = dict()
+        self._loaded = dict()
+    
+    def dumps(self, kt):
+        try:
+            return self._dumped[kt]
+        except KeyError:
+            pass
+        except TypeError:
+            kt = tuple(kt) # probably a list
+            s = self._dumped.get(kt)
+            if s is not None:
+                return s
+        
+        q = chain([self.prefix], kt) if self.prefix else iter(kt)
+        s = intern(self.glue.join(map(str, q)))
+        if len(self._dumped) < self.maxsize:
+            self._dumped[kt] = s
+        return s
+
+    def loads(self, s):
+        kt = self._loaded.get(s)
+        if kt is not None:
+            return kt
+
+        q = str(s).split(self.glue)
+        if self.prefix:
+            prefix = q.pop(0)
+            if not prefix == self.prefix:
+                raise ValueError('The key dump is malformed')
+        kt = tuple(map(intern, q))
+        if len(self._loaded) < self.maxsize:
+            self._loaded[intern(str(s))] = kt
+        return kt
+
+    def __len__(self):
+        return len(self._dumped) + len(self._loaded)
+
+@memoize
+def _make_key_predicate(prefix, glue, key_type, strict):
+    if not prefix:
+        return lambda k: True
+    elif issubclass(key_type, basestring):
+        p = prefix + glue
+        if strict:
+            return lambda k: isinstance(k, key_type) and k.startswith(p)
+        else:
+            return lambda k: k.startswith(p)                
+    elif key_type is tuple:
+        p = prefix
+        if strict:
+            return lambda k: isinstance(k, key_type) and k and k[0] == p
+        else:
+            return lambda k: k and k[0] == p
+
 @key_tuple_serialize_adapter()
 class KeyTupleSerializer(BaseSerializer):
 
@@ -284,20 +377,7 @@ class KeyTupleSerializer(BaseSerializer):
     _prefix = None
 
     def get_key_predicate(self, key_type, strict=False):        
-        if not self._prefix:
-            return lambda k: True
-        elif issubclass(key_type, basestring):
-            p = self._prefix + self.glue
-            if strict:
-                return lambda k: isinstance(k, key_type) and k.startswith(p)
-            else:
-                return lambda k: k.startswith(p)                
-        elif key_type is tuple:
-            p = self._prefix
-            if strict:
-                return lambda k: isinstance(k, key_type) and k and k[0] == p
-            else:
-                return lambda k: k and k[0] == p
+        return _make_key_predicate(self._prefix, self.glue, key_type, bool(strict))
            
     @property
     def prefix(self):
@@ -309,16 +389,23 @@ class KeyTupleSerializer(BaseSerializer):
             assert isinstance(value, basestring) and value.find(self.glue) < 0
             self._prefix = str(value)
 
+    @property
+    def registry(self):
+        return key_path_registry(self._prefix, self.glue)
+
     def dumps(self, l):
         assert isinstance(l, tuple) or isinstance(l, list)
-        q = chain([self._prefix], l) if self._prefix else iter(l)
-        return self.glue.join(map(str, q))
+        return self.registry.dumps(l)
 
     def loads(self, s):
-        q = str(s).split(self.glue)
-        if self._prefix:
-            prefix = q.pop(0)
-            if not prefix == self._prefix:
-                raise ValueError('The key dump is malformed')
-        return tuple(q)
+        return self.registry.loads(s)
+
+    def dumps_all(self, d):
+        dumps = self.registry.dumps
+        return {dumps(k): v for k, v in d.iteritems()}
+
+    def loads_all(self, d):
+        loads = self.registry.loads
+        is_key = self.get_key_predicate(basestring, strict=True)
+        return {loads(k): v for k, v in d.iteritems() if is_key(k)}
 
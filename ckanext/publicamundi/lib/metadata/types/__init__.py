@@ -8,7 +8,8 @@ from ckan.lib.munge import (munge_name, munge_title_to_name)
 from ckanext.publicamundi.lib.memoizer import memoize
 from ckanext.publicamundi.lib.metadata import adapter_registry
 from ckanext.publicamundi.lib.metadata.base import (
-    Object, object_null_adapter, factory_for_object, class_for_object)
+    Object, Object_Type, object_null_adapter, factory_for_object, class_for_object,
+    serializer_for_object, serializer_for_key_tuple)
 from ckanext.publicamundi.lib.metadata.schemata import *
 
 
@@ -27,10 +28,10 @@ def deduce(key0, *rkeys):
         return wrap_method
     return decorate
 
-class BaseMetadata_Type(type):
+class BaseMetadata_Type(Object_Type):
 
     def __init__(cls, name, bases, cls_dict):
-        type.__init__(cls, name, bases, cls_dict)
+        Object_Type.__init__(cls, name, bases, cls_dict)
         cls._prepare_deducible_fields()
 
     def _prepare_deducible_fields(cls):
@@ -41,11 +42,16 @@ class BaseMetadata_Type(type):
             if field_names:
                 cls._deduce_[f] = set(field_names)
 
+extras_storage_modes = ('flat', 'blob')
+
 @zope.interface.implementer(IBaseMetadata)
 @zope.interface.provider(IFromConvertedData, IIntrospectiveWithLinkedFields)
 class BaseMetadata(Object):
     __metaclass__ = BaseMetadata_Type    
     
+    # The default storage mode for extras (see to_extras)
+    _extras_storage_ = 'flat'
+
     ## IBaseMetadata interface ##
     
     @classmethod
@@ -56,30 +62,59 @@ class BaseMetadata(Object):
             data = {k[0]: data[k] for k in data if (k and len(k) < 2)}
         return cls._from_converted_data(data)
     
-    def to_extras(self):
+    def to_extras(self, storage=None):
         '''Dictize self in a proper way so that it's fields can be stored under
         package_extra KV pairs (aka extras).
+
+        If storage is 'flat', every (non-empty) leaf field is stored as a separate 
+        extra. If 'blob', the whole object is stored as a single extra (under the
+        key given by get_blob_key), and only (leaf fields of) searchable fields 
+        are stored also as separate extras, so that they are still indexed for
+        search (see get_searchable_keys).
         '''
+        
+        storage = storage or self._extras_storage_
+        assert storage in extras_storage_modes
+        
         key_prefix = self._dataset_type_
         
         opts = {
-            'serialize-keys': True, 
             'serialize-values': 'default',
-            'key-prefix': key_prefix,
         }
-        
         flattened = self.to_dict(flat=True, opts=opts)
-        for k, v in flattened.iteritems():
+        
+        if storage == 'blob':
+            yield self.get_blob_key(), serializer_for_object(self, 'blob').dumps()
+            searchable_keys = self.get_searchable_keys()
+            flattened = {kt: v for kt, v in flattened.iteritems() 
+                if kt[0] in searchable_keys}
+        
+        kser = serializer_for_key_tuple(key_prefix)
+        for kt, v in flattened.iteritems():
             if not v is None:
-                yield k, v
+                yield kser.dumps(kt), v
+
+    @classmethod
+    def get_blob_key(cls):
+        '''Get the key of the extra that (in blob storage mode) holds the object.
+        '''
+        return '%s__blob' % (cls._dataset_type_)
+    
+    @classmethod
+    @memoize
+    def get_searchable_keys(cls):
+        '''Get the keys of top-level fields tagged as "searchable", i.e. fields that 
+        are also stored as separate extras in blob storage mode.
+        '''
+        return frozenset(k for k, f in cls.iter_fields(exclude_properties=True)
+            if f.queryTaggedValue('searchable'))
 
     @classmethod
     def iter_linked_fields(cls):
-        flattened_fields = cls.get_flattened_fields()
-        for kp, uf in flattened_fields.iteritems():
-            link = uf.queryTaggedValue('links-to')
-            if link: 
-                yield kp, uf, link
+        index = cls.get_flattened_field_index()
+        is_linked = lambda uf: uf.queryTaggedValue('links-to')
+        for kp, uf in index.iteritems(predicate=is_linked):
+            yield kp, uf, uf.queryTaggedValue('links-to')
 
     def deduce_fields(self, *keys):
         return self._deduce_fields(*keys, inherit=True, include_native=True)
@@ -91,16 +126,29 @@ class BaseMetadata(Object):
         md, factory = None, cls
         key_prefix = cls._dataset_type_
         
-        # Load object from converted data
+        # Load object from converted data 
 
-        md = factory()
         opts = {
             'key-prefix': key_prefix, 
             'unserialize-keys': True, 
             'unserialize-values': 'default', 
         }
+        md = factory()
         md.from_dict(data, is_flat=True, opts=opts)
         
+        # If a blob is present, and flat keys are only given for searchable fields
+        # (i.e. as stored in blob mode), load all other fields from the blob. Note 
+        # that searchable fields are always loaded from flat keys, as these may 
+        # have been modified (e.g. data from a package_show fed to package_update).
+
+        blob = data.get(cls.get_blob_key())
+        if blob and not cls._has_non_searchable_keys(data):
+            searchable_keys = cls.get_searchable_keys()
+            md1 = serializer_for_object(md, 'blob').loads(blob)
+            for k in searchable_keys:
+                setattr(md1, k, getattr(md, k))
+            md = md1
+        
         # Try to deduce empty fields from their linked core fields
 
         updates = {}
@@ -115,6 +163,19 @@ class BaseMetadata(Object):
 
         return md
 
+    @classmethod
+    def _has_non_searchable_keys(cls, data):
+        '''Check if converted data contain flat keys for non-searchable fields.
+        '''
+        searchable_keys = cls.get_searchable_keys()
+        key_prefix = cls._dataset_type_ + '.'
+        n = len(key_prefix)
+        for k in data:
+            if isinstance(k, basestring) and k.startswith(key_prefix):
+                if not k[n:].split('.', 1)[0] in searchable_keys:
+                    return True
+        return False
+
     # Implementation: deduce_fields #
     
     def _deduce_fields(self, *keys, **opts):
@@ -15,6 +15,8 @@ class PostalAddress(Object):
     
     zope.interface.implements(IPostalAddress)
 
+    _compact_ = True
+
     address = None
     postalcode = None
 
@@ -23,6 +25,8 @@ class ContactInfo(Object):
     
     zope.interface.implements(IContactInfo)
 
+    _compact_ = True
+
     email = None
     address = None
     publish = None
@@ -32,6 +36,8 @@ class Point(Object):
     
     zope.interface.implements(IPoint)
 
+    _compact_ = True
+
     x = None
     y = None
 
@@ -54,6 +60,8 @@ class ResponsibleParty(Object):
     
     zope.interface.implements(IResponsibleParty)
 
+    _compact_ = True
+
     organization = None
     email = None
     role = None
@@ -63,6 +71,8 @@ class FreeKeyword(Object):
     
     zope.interface.implements(IFreeKeyword)
 
+    _compact_ = True
+
     value = None
     originating_vocabulary = None
     reference_date = None
@@ -84,6 +94,8 @@ class GeographicBoundingBox(Object):
     
     zope.interface.implements(IGeographicBoundingBox)
 
+    _compact_ = True
+
     nblat = None
     sblat = None
     eblng = None
@@ -94,6 +106,8 @@ class TemporalExtent(Object):
     
     zope.interface.implements(ITemporalExtent)
 
+    _compact_ = True
+
     start = None
     end = None
 
@@ -109,6 +123,8 @@ class SpatialResolution(Object):
     
     zope.interface.implements(ISpatialResolution)
 
+    _compact_ = True
+
     distance = None
     uom = None
 
@@ -117,6 +133,8 @@ class ReferenceSystem(Object):
     
     zope.interface.implements(IReferenceSystem)
 
+    _compact_ = True
+
     code = None
     code_space = None
     version = None
@@ -126,6 +144,8 @@ class Conformity(Object):
     
     zope.interface.implements(IConformity)
 
+    _compact_ = True
+
     title = None
     date = None
     date_type = None
@@ -1,3 +1,4 @@
+import os
 import re
 import json
 import uuid
@@ -5,6 +6,7 @@ import datetime
 import zope.interface
 import zope.schema
 from zope.schema.vocabulary import SimpleVocabulary
+import jinja2
 from lxml import etree
 
 # Fixme: Replace with native parser
@@ -16,6 +18,8 @@ from ckan.lib.base import model
 from ckanext.publicamundi import reference_data
 from ckanext.publicamundi.lib import vocabularies
 from ckanext.publicamundi.lib import languages
+from ckanext.publicamundi.lib import xml_cache
+from ckanext.publicamundi.lib.memoizer import memoize
 from ckanext.publicamundi.lib.metadata.base import Object, object_null_adapter
 from ckanext.publicamundi.lib.metadata.schemata import IInspireMetadata
 from ckanext.publicamundi.lib.metadata import xml_serializers
@@ -62,6 +66,8 @@ class InspireMetadata(Metadata):
     
     zope.interface.implements(IInspireMetadata)
 
+    _compact_ = True
+
     ## Factories for fields ##
 
     contact = list
@@ -166,9 +172,30 @@ class InspireMetadata(Metadata):
 
 # XML serialization
 
+templates_dir = os.path.realpath(
+    os.path.join(os.path.dirname(__file__), '../../../templates'))
+
+@memoize
+def _get_template(name):
+    '''Load (and compile) a template from our templates directory.
+    
+    The template environment is a standalone one, i.e. it does not depend on
+    any Pylons globals (so can be used outside of a web request), and each 
+    template is compiled once per process.
+    '''
+    
+    env = jinja2.Environment(
+        loader=jinja2.FileSystemLoader(templates_dir),
+        autoescape=True,
+        auto_reload=False,
+        extensions=['jinja2.ext.do', 'jinja2.ext.with_'])
+    return env.get_template(name)
+
 @object_xml_serialize_adapter(IInspireMetadata)
 class InspireMetadataXmlSerializer(xml_serializers.BaseObjectSerializer):
 
+    xsd_file = reference_data.get_path('xsd/isotc211.org-2005/gmd/metadataEntity.xsd')
+
     def to_xsd(self, wrap_into_schema=False, type_prefix='', annotate=False):
         '''Return the XSD document as an etree Element.
         '''
@@ -176,38 +203,54 @@ class InspireMetadataXmlSerializer(xml_serializers.BaseObjectSerializer):
         # Note We do not support providing parts of it 
         assert wrap_into_schema
 
-        xsd_file = reference_data.get_path('xsd/isotc211.org-2005/gmd/metadataEntity.xsd')
-
-        xsd = None
-        with open(xsd_file, 'r') as fp:
-            xsd = etree.parse(fp)
+        # Note Return a copy, as the parsed document is shared
+        xsd = xml_cache.parse_xml(self.xsd_file, copy_tree=True)
         return xsd.getroot()
 
+    def validate_xml(self, e):
+        '''Validate an XML document (an etree Element or ElementTree) against 
+        the INSPIRE XSD schema. Return a list of (line, message) errors.
+        '''
+        return xml_cache.validate_xml(e, self.xsd_file)
+
+    template_name = 'package/inspire_iso.xml'
+
     def dumps(self, o=None):
         '''Dump object (instance of InspireMetadata) o as an INSPIRE-complant XML 
         document.
         '''
-
-        import ckan.plugins as p
+        return b''.join(self.iter_dumps(o))
+    
+    def _record_tag(self):
+        return '{http://www.isotc211.org/2005/gmd}MD_Metadata'
+    
+    def iter_dumps(self, o=None):
+        '''Dump object o as an INSPIRE-compliant XML document, as chunks of 
+        (utf-8 encoded) bytes generated by the template.
+        
+        Note The template is rendered by a standalone environment (i.e not by 
+        toolkit.render), so no request context is needed.
+        '''
 
         if o is None:
             o = self.obj
-
-        s = p.toolkit.render('package/inspire_iso.xml', extra_vars={ 'data': o })
-        # Convert: render() always returns unicode
-        return s.encode('utf-8') 
+        
+        template = _get_template(self.template_name)
+        for s in template.generate(data=o):
+            yield s.encode('utf-8')
 
     def to_xml(self, o=None, nsmap=None):
         '''Build and return an etree Element to serialize an object (instance of
         InspireMetadata) o.
 
         Here, in contrast to what base XML serializer does, we build the etree by
-        parsing the XML string (generated by a Jinja2 template).
+        feeding the output of a Jinja2 template to an (incremental) XML parser.
         '''
 
-        s = self.dumps(o)
-        e = etree.fromstring(s)
-        return e
+        parser = etree.XMLParser(resolve_entities=False)
+        for s in self.iter_dumps(o):
+            parser.feed(s)
+        return parser.close()
 
     def from_xml(self, e):
         '''Build and return an InspireMetadata object from a (serialized) etree Element e.
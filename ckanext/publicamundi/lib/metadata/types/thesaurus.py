@@ -62,6 +62,8 @@ class ThesaurusTerms(Object):
     
     zope.interface.implements(IThesaurusTerms)
 
+    _compact_ = True
+
     thesaurus = Thesaurus 
     
     terms = list
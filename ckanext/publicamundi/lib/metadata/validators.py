@@ -12,6 +12,7 @@ from ckan.lib.navl.dictization_functions import missing, StopOnError, Invalid
 
 from ckanext.publicamundi.lib import logger
 from ckanext.publicamundi.lib import dictization
+from ckanext.publicamundi.lib.util import diff_dicts
 import ckanext.publicamundi.lib.metadata as ext_metadata
 
 _ = toolkit._
@@ -94,17 +95,34 @@ def postprocess_dataset_for_edit(key, data, errors, context):
 
     data[(key_prefix,)] = md
     
+    extras = list(md.to_extras())
+    
     # 2. Validate as an object
+    
+    # Note If we update a (previously valid) package, validate only the fields 
+    # that have changed since it was stored.
 
     if not 'skip_validation' in context:
-        validation_errors = md.validate(dictize_errors=True)
+        changed_keys = None
+        if pkg and prev_state != 'invalid':
+            prev_extras = pkg.extras
+            if cls.get_blob_key() in prev_extras:
+                # Compare as flat extras (a blob tells nothing on what has changed)
+                prev_md = cls.from_converted_data(prev_extras)
+                prev_extras = dict(prev_md.to_extras(storage='flat'))
+            flat_extras = extras
+            if md._extras_storage_ != 'flat':
+                flat_extras = list(md.to_extras(storage='flat'))
+            changed_keys = _find_changed_keys(key_prefix, prev_extras, flat_extras)
+            debug('Validating only changed fields: %s' %(sorted(changed_keys)))
+        validation_errors = md.validate(dictize_errors=True, keys=changed_keys)
         # Fixme Map validation_errors to errors
         #assert not validation_errors
    
     # 3. Convert fields to extras
     
     extras_list = data[('extras',)]
-    extras_list.extend(({'key': k, 'value': v} for k, v in md.to_extras()))
+    extras_list.extend(({'key': k, 'value': v} for k, v in extras))
     
     # 4. Compute next state
     
@@ -149,6 +167,9 @@ def preprocess_dataset_for_edit(key, data, errors, context):
         key_converter = lambda k: '.'.join([key_prefix] + map(str, k))
         r = dictization.flatten(r, key_converter)
         data.update({ (k,): v for k, v in r.iteritems() })
+        # A nested dict is a complete object, so ignore any (stale) blob 
+        blob_key = ext_metadata.class_for_metadata(dtype).get_blob_key()
+        data.pop((blob_key,), None)
 
     #raise Breakpoint('preprocess_dataset_for_edit')
     pass
@@ -314,6 +335,30 @@ def guess_resource_type_if_empty(key, data, errors, context):
 # Helpers
 #
 
+def _find_changed_keys(key_prefix, prev_extras, extras):
+    '''Find the top-level fields (of a dataset-type) whose extras differ from 
+    the previously stored ones.
+    
+    Both extras are expected as flattened key/value pairs under key_prefix.
+    '''
+    
+    prefix = key_prefix + '.'
+    prev_extras = {k: v for k, v in prev_extras.iteritems() if k.startswith(prefix)}
+    extras = {k: v for k, v in extras if k.startswith(prefix)}
+
+    kser = ext_metadata.serializer_for_key_tuple(key_prefix)
+    
+    changed_keys = set()
+    for change_type, k, changes in diff_dicts(prev_extras, extras):
+        if change_type == 'change':
+            # Note A dotted key may be reported either as is or inside a list 
+            dotted_keys = [k[0] if isinstance(k, list) else k]
+        else:
+            dotted_keys = [t[0] for t in changes]
+        changed_keys.update(kser.loads(k1)[0] for k1 in dotted_keys)
+    
+    return changed_keys
+
 def _must_validate(context, data):
     '''Indicate whether an object (or a particular field of it) should be validated
     under the given context.
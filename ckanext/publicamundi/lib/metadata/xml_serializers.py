@@ -14,6 +14,7 @@ from ckanext.publicamundi.lib.metadata import adapter_registry
 from ckanext.publicamundi.lib.metadata.fields import *
 from ckanext.publicamundi.lib.metadata.ibase import IXmlSerializer, IObject
 from ckanext.publicamundi.lib.metadata.base import Object, FieldContext
+from ckanext.publicamundi.lib.metadata.lazy import materialize
 
 __all__ = [
     'field_xml_serialize_adapter',
@@ -44,18 +45,27 @@ def object_xml_serialize_adapter(required_iface):
 
 # Utilities
 
+_lookup_cache = AdapterLookupCache('xml_serializer_for_field', adapter_registry)
+
 def serializer_for_field(field):
     '''Get an XML serializer for a zope.schema.Field instance.
     ''' 
     assert isinstance(field, zope.schema.Field)
-    serializer = adapter_registry.queryMultiAdapter(
-        [field], IXmlSerializer, 'serialize-xml')
-    return serializer
+    
+    provided = zope.interface.providedBy(field)
+    factory = _lookup_cache.get(provided, False)
+    if factory is False:
+        factory = adapter_registry.lookup(
+            [provided], IXmlSerializer, 'serialize-xml')
+        _lookup_cache.set(provided, factory)
+    
+    return factory(field) if factory else None
 
 def serializer_for_object(obj):
     '''Get an XML serializer for an IObject object.
     ''' 
     assert IObject.providedBy(obj)
+    obj = materialize(obj)
     serializer = adapter_registry.queryMultiAdapter(
         [obj], IXmlSerializer, 'serialize-xml')
     return serializer
@@ -76,6 +86,23 @@ def serializer_factory_for_object(obj_iface):
         [obj_iface], IXmlSerializer, 'serialize-xml')
     return factory
 
+class _ChunkBuffer(object):
+    '''A minimal file-like sink that collects written chunks until drained.
+    '''
+
+    __slots__ = ('chunks',)
+    
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, s):
+        self.chunks.append(s)
+
+    def drain(self):
+        s = b''.join(self.chunks)
+        self.chunks = []
+        return s
+
 xml_serializer_for_field = serializer_for_field
 
 xml_serializer_factory_for_field = serializer_factory_for_field
@@ -163,6 +190,58 @@ class BaseSerializer(object):
         o = self.from_xml(e)
         return o
     
+    def iter_dumps(self, o=None):
+        '''Dump object o as an XML document, generated incrementally as a 
+        sequence of (utf-8 encoded) byte chunks.
+        
+        In contrast to dumps(), the whole XML tree is never built in memory. 
+        '''
+        buf = _ChunkBuffer()
+        with etree.xmlfile(buf, encoding='utf-8') as xf:
+            xf.write_declaration()
+            for _ in self._write_xml(xf, o, nsmap={ None: self.target_namespace }):
+                xf.flush()
+                chunk = buf.drain()
+                if chunk:
+                    yield chunk
+        chunk = buf.drain()
+        if chunk:
+            yield chunk
+
+    def dump(self, fp, o=None):
+        '''Dump object o as an XML document, written incrementally to a 
+        file-like object fp.
+        '''
+        for chunk in self.iter_dumps(o):
+            fp.write(chunk)
+    
+    def iter_loads(self, source, tag=None):
+        '''Load objects from a (possibly multi-record) XML source, yielding them 
+        one by one. 
+        
+        The source (a filename or a file-like object) is parsed incrementally, and 
+        every element that is tagged as a record (see tag) is loaded via from_xml. 
+        Processed elements are cleared, so memory usage does not depend on the
+        number of records.
+        
+        If tag is not given, the serializer's own (qualified) element name is 
+        used. 
+        '''
+        if tag is None:
+            tag = self._record_tag()
+        
+        context = etree.iterparse(
+            source, events=('end',), tag=tag, resolve_entities=False)
+        for event, e in context:
+            try:
+                o = self.from_xml(e)
+            finally:
+                # Discard this element, along with all processed siblings
+                e.clear()
+                while e.getprevious() is not None:
+                    del e.getparent()[0]
+            yield o
+
     # Implementation
     
     def _to_xsd_type(self, type_prefix):
@@ -190,6 +269,26 @@ class BaseSerializer(object):
         '''
         raise_for_stub_method()
     
+    def _record_tag(self):
+        '''Return the (qualified) tag of the elements that an XML dump of this 
+        serializer consists of.
+        '''
+        return QName(self.target_namespace, self.name).text
+
+    def _write_xml(self, xf, o, nsmap=None, attrib=None):
+        '''Write the XML element that serializes object o into an incremental 
+        writer xf (an etree.xmlfile context). 
+        
+        This is a generator that yields whenever a part of output is complete. 
+        This base implementation builds the whole element (via to_xml) and writes
+        it at once: it should be overriden by serializers for composite types.
+        '''
+        e = self.to_xml(o, nsmap=(nsmap or { None: self.target_namespace }))
+        if attrib:
+            e.attrib.update(attrib)
+        xf.write(e)
+        yield
+    
     def _root_xsd_element(self):
         '''Create and return an (empty) xs:schema element
         '''
@@ -288,6 +387,24 @@ class BaseFieldSerializer(BaseSerializer):
             o = self.field.context.value
         self._to_xml(o, e)
         return e
+    
+    def _write_xml(self, xf, o, nsmap=None, attrib=None):
+        if o is None:
+            o = self.field.context.value
+        
+        # Serialize as a leaf: use a scratch element to collect text/attributes
+        
+        e = Element('_')
+        self._to_xml(o, e)
+        assert not len(e), 'Expected a leaf (childless) element'
+        if attrib:
+            e.attrib.update(attrib)
+        
+        qname = QName(self.target_namespace, self.name)
+        with xf.element(qname, attrib=dict(e.attrib), nsmap=nsmap):
+            if e.text:
+                xf.write(e.text)
+        yield
 
 class BaseObjectSerializer(BaseSerializer):
     
@@ -669,6 +786,21 @@ class ListFieldSerializer(BaseFieldSerializer):
         for y in l:
             e.append(ys.to_xml(y))
     
+    def _write_xml(self, xf, l, nsmap=None, attrib=None):
+        if l is None:
+            l = self.field.context.value
+        assert isinstance(l, list) or isinstance(l, tuple)
+        
+        yf = self.field.value_type
+        ys = serializer_for_field(yf)
+        ys.target_namespace = self.target_namespace
+        
+        qname = QName(self.target_namespace, self.name)
+        with xf.element(qname, attrib=(attrib or {}), nsmap=nsmap):
+            for y in l:
+                for _ in ys._write_xml(xf, y):
+                    yield
+    
     def _from_xml(self, e):
         l = list()
         
@@ -759,6 +891,25 @@ class DictFieldSerializer(BaseFieldSerializer):
             ye.attrib[ks.name] = k
             e.append(ye)
     
+    def _write_xml(self, xf, d, nsmap=None, attrib=None):
+        if d is None:
+            d = self.field.context.value
+        assert isinstance(d, dict)
+
+        yf = self.field.value_type
+        ys = serializer_for_field(yf)
+        ys.target_namespace = self.target_namespace
+       
+        kf = self.field.key_type
+        ks = serializer_for_field(kf)
+        ks.target_namespace = self.target_namespace
+        
+        qname = QName(self.target_namespace, self.name)
+        with xf.element(qname, attrib=(attrib or {}), nsmap=nsmap):
+            for k, y in d.items():
+                for _ in ys._write_xml(xf, y, attrib={ ks.name: k }):
+                    yield
+    
     def _from_xml(self, e):
         d = dict()
         
@@ -810,6 +961,18 @@ class ObjectFieldSerializer(BaseFieldSerializer):
         ys.target_namespace = self.target_namespace
         
         e.append(ys.to_xml(o))
+    
+    def _write_xml(self, xf, o, nsmap=None, attrib=None):
+        if o is None:
+            o = self.field.context.value
+        
+        ys = serializer_for_object(o)
+        ys.target_namespace = self.target_namespace
+        
+        qname = QName(self.target_namespace, self.name)
+        with xf.element(qname, attrib=(attrib or {}), nsmap=nsmap):
+            for _ in ys._write_xml(xf, o):
+                yield
 
     def _from_xml(self, e):
         f = self.field
@@ -872,6 +1035,23 @@ class ObjectSerializer(BaseObjectSerializer):
             ys = serializer_for_field(yf1)
             ys.target_namespace = self.target_namespace
             e.append(ys.to_xml(yv)) 
+    
+    def _write_xml(self, xf, obj, nsmap=None, attrib=None):
+        if obj is None:
+            obj = self.obj
+        assert isinstance(obj, type(self.obj))
+        
+        qname = QName(self.target_namespace, self.name)
+        with xf.element(qname, attrib=(attrib or {}), nsmap=nsmap):
+            for k, yf in obj.iter_fields(exclude_properties=True):
+                yv = yf.get(obj)
+                if yv is None:
+                    continue
+                yf1 = yf.bind(FieldContext(key=k, value=yv))
+                ys = serializer_for_field(yf1)
+                ys.target_namespace = self.target_namespace
+                for _ in ys._write_xml(xf, yv):
+                    yield
 
     def _from_xml(self, e):
         schema = self.obj.get_schema()
@@ -0,0 +1,135 @@
+'''Provide a process-wide cache for compiled XML artifacts.
+
+Parsing an XML schema or compiling an XSLT stylesheet is an expensive step,
+while the underlying files (under reference_data) rarely change. So, keep
+the compiled objects (per file) and reuse them across requests:
+
+    >>> xslt = get_xslt(reference_data.get_path('xsl/iso-19139-to-dcat-ap.xsl'))
+    >>> result = xslt(xml_dom)
+
+An entry is recompiled if the modification time of its file has changed since
+it was compiled. Note that compiled objects are shared, so callers should never
+modify them (e.g. a tree returned by parse_xml should be copied if needed).
+
+'''
+
+import os
+import copy
+import threading
+from lxml import etree
+
+from ckanext.publicamundi.lib import logger
+
+__all__ = [
+    'parse_xml',
+    'get_xml_schema',
+    'get_xslt',
+    'validate_xml',
+    'clear',
+    'stats',
+]
+
+class ArtifactCache(object):
+    '''A thread-safe cache of artifacts compiled from files.
+
+    Entries are keyed by (kind, path) and are invalidated when the file's
+    mtime changes. Note the lock is reentrant, as compiling an artifact may 
+    need another one (e.g. a parsed tree).
+    '''
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._data = {}
+        self._lock = threading.RLock()
+
+    def get(self, kind, path, compile_fn):
+        path = os.path.realpath(path)
+        mtime = os.path.getmtime(path)
+        key = (kind, path)
+
+        t = self._data.get(key)
+        if t and t[0] == mtime:
+            self.hits += 1
+            return t[1]
+
+        with self._lock:
+            # Check again, as another thread may have compiled it meanwhile
+            t = self._data.get(key)
+            if t and t[0] == mtime:
+                self.hits += 1
+                return t[1]
+            self.misses += 1
+            logger.debug('Compiling %s from %s', kind, path)
+            result = compile_fn(path)
+            self._data[key] = (mtime, result)
+
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._data),
+        }
+
+_cache = ArtifactCache()
+
+def _parse_xml(path):
+    parser = etree.XMLParser(resolve_entities=False)
+    return etree.parse(path, parser)
+
+def _compile_xml_schema(path):
+    return etree.XMLSchema(parse_xml(path))
+
+def _compile_xslt(path):
+    return etree.XSLT(parse_xml(path))
+
+def parse_xml(path, copy_tree=False):
+    '''Get the parsed XML document (an etree ElementTree) for the given path.
+
+    If copy_tree is given, a (deep) copy is returned, which can be safely
+    modified by the caller.
+    '''
+    tree = _cache.get('tree', path, _parse_xml)
+    return copy.deepcopy(tree) if copy_tree else tree
+
+def get_xml_schema(path):
+    '''Get a (compiled) XMLSchema validator for the XSD document at path
+    '''
+    return _cache.get('xml-schema', path, _compile_xml_schema)
+
+def get_xslt(path):
+    '''Get a (compiled) XSLT transformer for the XSL document at path
+    '''
+    return _cache.get('xslt', path, _compile_xslt)
+
+_validation_lock = threading.Lock()
+
+def validate_xml(xml, xsd_path):
+    '''Validate an XML document (an etree Element or ElementTree) against the
+    XSD document at xsd_path.
+
+    Return a list of errors (as `(line, message)` tuples), empty if valid.
+    '''
+
+    xsd = get_xml_schema(xsd_path)
+    # Note The validator keeps its error log, so do not share it while validating
+    with _validation_lock:
+        if xsd.validate(xml):
+            return []
+        return [(err.line, err.message) for err in xsd.error_log]
+
+def clear():
+    '''Clear all cached artifacts
+    '''
+    _cache.clear()
+
+def stats():
+    return _cache.stats()
@@ -1,4 +1,5 @@
 import re
+import copy
 import datetime
 import json
 import weberror
@@ -15,13 +16,14 @@ import ckan.logic as logic
 
 import ckanext.publicamundi.model as ext_model
 import ckanext.publicamundi.lib.metadata as ext_metadata
+import ckanext.publicamundi.lib.metadata.lazy as ext_lazy
 import ckanext.publicamundi.lib.metadata.validators as ext_validators
 import ckanext.publicamundi.lib.actions as ext_actions
 import ckanext.publicamundi.lib.template_helpers as ext_template_helpers
 import ckanext.publicamundi.lib.languages as ext_languages
 import ckanext.publicamundi.lib.pycsw_sync as ext_pycsw_sync
 
-from ckanext.publicamundi.lib.metadata import class_for_metadata
+from ckanext.publicamundi.lib.metadata import class_for_metadata, object_cache
 from ckanext.publicamundi.lib.util import (to_json, random_name)
 
 _ = toolkit._
@@ -131,6 +133,15 @@ class DatasetForm(p.SingletonPlugin, toolkit.DefaultDatasetForm):
 
         cls._extra_fields = aslist(config.get('ckanext.publicamundi.extra_fields', ''))
 
+        # Set the storage mode for metadata extras
+        
+        from ckanext.publicamundi.lib.metadata.types import (
+            BaseMetadata, extras_storage_modes)
+        extras_storage = config.get('ckanext.publicamundi.extras_storage', 'flat')
+        if not extras_storage in extras_storage_modes:
+            raise ValueError('Unknown storage mode for extras: %r' % (extras_storage))
+        BaseMetadata._extras_storage_ = extras_storage
+
         # Modify the pattern for valid names for {package, groups, organizations}
         
         if asbool(config.get('ckanext.publicamundi.validation.relax_name_pattern')):
@@ -142,6 +153,19 @@ class DatasetForm(p.SingletonPlugin, toolkit.DefaultDatasetForm):
 
         from ckanext.publicamundi import cache_manager
         cache_manager.setup(config)
+        
+        # Setup cache for formatted metadata
+
+        from ckanext.publicamundi.lib.metadata import format_cache
+        format_cache.setup(
+            backend=config.get('ckanext.publicamundi.format_cache.backend', 'none'),
+            maxsize=config.get('ckanext.publicamundi.format_cache.maxsize'))
+        
+        # Setup cache for metadata objects (built for shown packages)
+
+        object_cache.setup(
+            backend=config.get('ckanext.publicamundi.object_cache.backend', 'memory'),
+            maxsize=config.get('ckanext.publicamundi.object_cache.maxsize'))
     
         return
 
@@ -256,6 +280,7 @@ class DatasetForm(p.SingletonPlugin, toolkit.DefaultDatasetForm):
             'mimetype_autocomplete': ext_actions.autocomplete.mimetype_autocomplete,
             'dataset_export': ext_actions.package.dataset_export,
             'dataset_import': ext_actions.package.dataset_import,
+            'dataset_import_batch': ext_actions.package.dataset_import_batch,
             'dataset_export_dcat': ext_actions.package.dataset_export_dcat,
             'group_list_authz': ext_actions.group.group_list_authz,
         }
@@ -320,6 +345,9 @@ class DatasetForm(p.SingletonPlugin, toolkit.DefaultDatasetForm):
                 # Build chain of processors for field
                 schema[field_name] = [
                     ignore_missing, get_field_processor(field)]
+            # Accept a blob (e.g. from a package_show fed to package_update), as in
+            # blob mode it holds all non-searchable fields (see to_extras)
+            schema[cls1.get_blob_key()] = [ignore_missing, unicode]
         
         # Add before/after package-level processors
 
@@ -385,6 +413,7 @@ class DatasetForm(p.SingletonPlugin, toolkit.DefaultDatasetForm):
             for field_name, field in cls1.get_flattened_fields(opts=opts1).items():
                 schema[field_name] = [
                     convert_from_extras, ignore_missing, get_field_processor(field)]
+            schema[cls1.get_blob_key()] = [convert_from_extras, ignore_missing]
           
         # Add before/after package-level processors
         
@@ -453,6 +482,7 @@ class DatasetForm(p.SingletonPlugin, toolkit.DefaultDatasetForm):
 
     def after_update(self, context, pkg_dict):
         log1.debug('after_update: Package %s is updated', pkg_dict.get('name'))
+        object_cache.invalidate(pkg_dict['id'])
         pass
 
     def after_show(self, context, pkg_dict, view=None):
@@ -474,10 +504,7 @@ class DatasetForm(p.SingletonPlugin, toolkit.DefaultDatasetForm):
             return # noop: extras are not yet promoted to 1st-level fields
     
         for_view = context.get('for_view', False)
-        for_edit = ( # is this package prepared for edit ?
-            (rr.get('controller') == 'package' and rr.get('action') == 'edit') or
-            (rr.get('controller') == 'api' and rr.get('action') == 'action' and
-                rr.get('logic_function') in DatasetForm.after_show._api_edit_actions))
+        for_edit = self._is_shown_for_edit()
         return_json = ( # do we need to return a json-friendly result ?
             context.get('return_json', False) or
             (rr.get('controller') == 'api' and rr.get('action') == 'action' and
@@ -496,21 +523,29 @@ class DatasetForm(p.SingletonPlugin, toolkit.DefaultDatasetForm):
         # Note Do not attempt to pop() flat keys here (e.g. to replace them by a 
         # nested structure), because resource forms will clear all extra fields !!
 
-        # Turn to an object
-        
-        md = class_for_metadata(dtype).from_converted_data(pkg_dict)
+        if for_edit or not (view and callable(view)):
+            view = None
+
+        # Lookup for an object (or a json-friendly result) already built for this 
+        # revision of the package. Note an object is not cached when editing, as 
+        # it may be modified by the caller.
 
-        # Provide a different view, if not editing
+        cache_key = None
+        if not for_edit:
+            cache_key = object_cache.make_key(pkg_dict, return_json, view)
         
-        if (not for_edit) and view and callable(view):
-            try:
-                md = view(md)
-            except Exception as ex:
-                log1.warn('Cannot build view %r for package %r: %s',
-                    view, pkg_dict.get('name'), str(ex))
-                pass # noop: keep the original view
+        if return_json or for_edit:
+            # Build it now: a json-friendly result will be serialized anyway, while
+            # an object for editing will populate the form.
+            result = self._get_metadata(pkg_dict, dtype, return_json, view, cache_key)
+        else:
+            # Build it on first access (if ever). Note that converted data are
+            # copied, because pkg_dict may be modified (e.g. by resource forms).
+            data = dict(pkg_dict)
+            result = ext_lazy.LazyObject(class_for_metadata(dtype), 
+                lambda: self._get_metadata(data, dtype, False, view, cache_key))
         
-        pkg_dict[key_prefix] = md
+        pkg_dict[key_prefix] = result
         
         # Fix for json-friendly results (so json.dumps can handle them)
 
@@ -519,10 +554,62 @@ class DatasetForm(p.SingletonPlugin, toolkit.DefaultDatasetForm):
             key_prefix_1 = key_prefix + '.'
             for k in (y for y in pkg_dict.keys() if y.startswith(key_prefix_1)):
                 pkg_dict.pop(k)
-            pkg_dict[key_prefix] = md.to_json(return_string=False)
          
         return pkg_dict
     
+    def _is_shown_for_edit(self):
+        '''Check if a package is shown in order to be edited (e.g. at an edit form)
+        '''
+        c = toolkit.c
+        rr = c.environ['pylons.routes_dict'] if c.environ else {}
+        return (
+            (rr.get('controller') == 'package' and rr.get('action') == 'edit') or
+            (rr.get('controller') == 'api' and rr.get('action') == 'action' and
+                rr.get('logic_function') in DatasetForm.after_show._api_edit_actions))
+
+    def _get_metadata(self, pkg_dict, dtype, return_json, view, cache_key):
+        '''Get the metadata object (or a json-friendly result) for pkg_dict, either 
+        from cache (under cache_key, if given) or by building it.
+        '''
+        
+        result = object_cache.get(cache_key) if cache_key else None
+        
+        if result is None:
+            result = self._build_metadata(pkg_dict, dtype, return_json, view)
+            if result is None:
+                # The view has failed: build (but do not cache) the original view
+                cache_key = None
+                result = self._build_metadata(pkg_dict, dtype, return_json)
+            if cache_key:
+                object_cache.put(cache_key, result)
+        elif return_json:
+            # Note The caller is free to modify a json-friendly result
+            result = copy.deepcopy(result)
+        
+        return result
+
+    def _build_metadata(self, pkg_dict, dtype, return_json, view=None):
+        '''Build the metadata object (optionally a view of it) for pkg_dict.
+        
+        Return None if the view cannot be built.
+        '''
+        
+        # Turn to an object
+        
+        md = class_for_metadata(dtype).from_converted_data(pkg_dict)
+
+        # Provide a different view
+        
+        if view:
+            try:
+                md = view(md)
+            except Exception as ex:
+                log1.warn('Cannot build view %r for package %r: %s',
+                    view, pkg_dict.get('name'), str(ex))
+                return None
+        
+        return md.to_json(return_string=False) if return_json else md
+    
     after_show._api_show_actions = {
         'package_show', 'dataset_show', 'user_show'
     }
@@ -555,6 +642,15 @@ class DatasetForm(p.SingletonPlugin, toolkit.DefaultDatasetForm):
         such as tags) of all the terms sent to the indexer.
         '''
         log1.debug('before_index: Package %s is indexed', pkg_dict.get('name'))
+        
+        # Do not index metadata blobs (searchable fields are also kept as extras)
+        
+        dtype = pkg_dict.get('dataset_type')
+        if dtype in self._dataset_types:
+            blob_key = class_for_metadata(dtype).get_blob_key()
+            pkg_dict.pop(blob_key, None)
+            pkg_dict.pop('extras_' + blob_key, None)
+
         return pkg_dict
 
     def before_view(self, pkg_dict):
@@ -685,6 +781,7 @@ class PackageController(p.SingletonPlugin):
         '''
         
         log1.debug('A package was updated: %s', pkg_dict['id'])
+        object_cache.invalidate(pkg_dict['id'])
         self._create_or_update_csw_record(context['session'], pkg_dict)
         pass
 
@@ -694,6 +791,7 @@ class PackageController(p.SingletonPlugin):
         '''
 
         log1.debug('A package was deleted: %s', pkg_dict['id'])
+        object_cache.invalidate(pkg_dict['id'])
         self._delete_csw_record(context['session'], pkg_dict)
         pass
 
@@ -957,40 +1055,42 @@ class MultilingualDatasetForm(DatasetForm):
         '''Try to replace displayed fields with their translations (if any).
         '''
         
-        from ckanext.publicamundi.lib.metadata import fields, bound_field
-        from ckanext.publicamundi.lib.metadata import class_for_metadata, translator_for
+        from ckanext.publicamundi.lib.metadata.i18n import package_translation
         
-        uf = fields.TextField()
         lang = self.target_language()
+        keys = ('title', 'notes')
+        
+        # Lookup translations for all (translatable) results at once
 
-        for pkg in search_results['results']:
-            source_lang = pkg.get('language')
-            if not source_lang or (source_lang == lang):
-                continue # no need to translate
-            dtype = pkg['dataset_type']
-            md = class_for_metadata(dtype)(identifier=pkg['id']) 
-            translator = translator_for(md, source_lang)
-            # Lookup translations in the context of this package
+        packages = [pkg for pkg in search_results['results']
+            if pkg.get('language') and (pkg['language'] != lang)]
+        translations = package_translation.get_translations(
+            ((pkg['id'], pkg['language']) for pkg in packages), keys, lang)
+        if not translations:
+            return search_results # no need to translate
+        
+        for pkg in packages:
             translated = False
-            for k in ('title', 'notes'):
-                tr = translator.get_field_translator(bound_field(uf, (k,), pkg[k]))
-                yf = tr.get(lang) if tr else None
-                if yf:
-                    pkg[k] = yf.context.value
+            for k in keys:
+                v = translations.get((pkg['id'], k))
+                if v:
+                    pkg[k] = v
                     translated = True
             # If at least one translation was found, mark as translated
             if translated:
                 pkg['translated_to_language'] = lang
-        
+         
         return search_results
 
     def after_update(self, context, pkg_dict):
+        super(MultilingualDatasetForm, self).after_update(context, pkg_dict)
         log1.info('Discard translations for modified keys of package %s', pkg_dict['name'])
         # Todo: Discard translations for modified keys 
         pass
     
     def after_delete(self, context, pkg_dict):
         log1.info('Cleaning up translations for package %s', pkg_dict['id'])
+        object_cache.invalidate(pkg_dict['id'])
         # Todo: Cleanup translations
         pass
 
@@ -1005,8 +1105,6 @@ class MultilingualDatasetForm(DatasetForm):
         except:
             req_params = {} # not a web request
 
-        dtype = pkg_dict.get('dataset_type')
-        
         # Determine language context
 
         source_language = pkg_dict.get('language')
@@ -1026,17 +1124,25 @@ class MultilingualDatasetForm(DatasetForm):
 
         translated = None    
         if should_translate and (source_language != language):
-            translated = self.TranslatedView(source_language, language)
+            translated = self.TranslatedView(source_language, language, pkg_dict)
 
         parent = super(MultilingualDatasetForm, self)
         pkg_dict = parent.after_show(context, pkg_dict, view=translated)
         if not pkg_dict:
             return # noop: super method returned prematurely
-        md = pkg_dict[dtype]
 
-        if not translated or not translated.translator:
-            # Nothing more to do (either translation not needed or not working)
+        if not translated or self._is_shown_for_edit():
+            # Nothing more to do (translation not needed)
             return pkg_dict
+        
+        # Note The metadata object (pkg_dict[dtype]) is not built yet, so do not 
+        # request a translator from it (it would force it to be built)
+
+        try:
+            translator = translated.get_translator(pkg_dict)
+        except Exception as ex:
+            log1.warn('Cannot translate package %r: %s', pkg_dict.get('name'), str(ex))
+            return pkg_dict # noop: translation is not working
  
         pkg_dict['translated_to_language'] = language
 
@@ -1045,7 +1151,7 @@ class MultilingualDatasetForm(DatasetForm):
         #  * core (CKAN) resource metadata
         
         uf = fields.TextField()
-        field_translator = translated.translator.get_field_translator
+        field_translator = translator.get_field_translator
         
         # Translate core package metadata
         for k in ('title', 'notes'):
@@ -1117,20 +1223,45 @@ class MultilingualDatasetForm(DatasetForm):
     
     class TranslatedView(object):
         
-        def __init__(self, source_language, language):
+        def __init__(self, source_language, language, pkg_dict=None):
             self.source_language = source_language
             self.language = language
+            self.pkg_dict = pkg_dict
             self.translator = None
-            
-        def __call__(self, md):
-            assert self.translator is None, 'Expected to be called once!'
-            self.translator = ext_metadata.translator_for(md, self.source_language)
+        
+        @property
+        def cache_key(self):
+            # Note Translations do not affect the revision of a package (and may be
+            # modified by another process), so identify them by their version. They
+            # are loaded once per package (and shared with core fields) anyway.
             try:
-                result = self.translator.get(self.language)
+                translator = self.get_translator(self.pkg_dict)
             except Exception as ex:
-                self.translator = False # is unusable
-                raise
-            return result
+                return None # cannot identify translations
+            version = translator.get_version(self.language)
+            if not version:
+                return None
+            return 'translated-%s-%s-%s' % (
+                self.source_language, self.language, version)
+        
+        def get_translator(self, pkg_dict):
+            '''Get a translator in the context of the package (e.g. to translate 
+            core fields), without having to build its metadata object.
+            '''
+            if self.translator is None:
+                md = class_for_metadata(pkg_dict['dataset_type'])(identifier=pkg_dict['id'])
+                self.translator = ext_metadata.translator_for(md, self.source_language)
+            return self.translator
+            
+        def __call__(self, md):
+            # Note Share translations (loaded once per package) with core fields
+            if self.translator and self.translator.md.identifier == md.identifier:
+                translator = self.translator.rebind(md)
+            else:
+                translator = ext_metadata.translator_for(md, self.source_language)
+                if self.translator is None:
+                    self.translator = translator
+            return translator.get(self.language)
     
     def target_language(self):
         '''Determine the target language for metadata.
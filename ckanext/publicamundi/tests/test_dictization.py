@@ -54,6 +54,37 @@ def test_inversed_2():
     s2 = json.dumps(y2)
     eq_(s0, s2)
 
+def test_iter_flattened():
+    pairs = list(dictization.iter_flattened(d))
+    eq_(len(pairs), len(d1))
+    eq_(dict(pairs), d1)
+    
+    # Empty containers are not kept
+    eq_(dictization.flatten({'a': [], 'b': {}, 'c': (1, 2)}), 
+        {('c', 0): 1, ('c', 1): 2})
+
+def test_unflatten_lists():
+    # Detect lists on (sorted) integer keys, starting from 0
+    eq_(dictization.unflatten({('a', 0): 'x', ('a', 1): 'y'}), {'a': ['x', 'y']})
+    eq_(dictization.unflatten({('a', '0'): 'x', ('a', '1'): 'y'}), {'a': ['x', 'y']})
+    eq_(dictization.unflatten({('a', 1): 'x', ('a', 2): 'y'}), {'a': {1: 'x', 2: 'y'}})
+    eq_(dictization.unflatten({(0,): 'x', (1,): 'y', ('b',): 'z'}), {0: 'x', 1: 'y', 'b': 'z'})
+    
+    # String keys are sorted as strings, so '10' comes before '2'
+    y = { ('a', str(i)): i for i in range(11) }
+    eq_(dictization.unflatten(y), {'a': { str(i): i for i in range(11) }})
+
+def test_unflatten_shadowed():
+    # A leaf value shadows deeper keys under the same path
+    y = {('a',): 1, ('a', 'b'): 2, ('c', 'd'): 3}
+    eq_(dictization.unflatten(y), {'a': 1, 'c': {'d': 3}})
+    
+    eq_(dictization.unflatten({}), {})
+
+def test_unflatten_key_converter():
+    y = {'a.0': 1, 'a.1': 2, 'b.c': 3}
+    eq_(dictization.unflatten(y, lambda k: tuple(k.split('.'))), {'a': [1, 2], 'b': {'c': 3}})
+
 if __name__ == '__main__':
 
     print
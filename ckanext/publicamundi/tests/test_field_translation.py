@@ -97,6 +97,137 @@ class TestController(ckan.tests.TestController):
             assert translated_yf.context.value == translated_value 
         pass
 
+    def test_preload(self):
+        
+        language = 'el'
+        pkg = self.packages.values()[0]
+        tr = package_translation.FieldTranslation(pkg['id'], pkg['language'])
+        tr.discard()
+        
+        uf = zope.schema.Text()
+        yf1 = bound_field(uf, ('title',), pkg['title'])
+        yf2 = bound_field(uf, ('notes',), pkg['notes'])
+        tr.translate(yf1, language, u'** %s **' % (pkg['title']))
+        
+        # Translations are loaded once per language
+        
+        tr1 = package_translation.FieldTranslation(pkg['id'], pkg['language'])
+        preloaded = tr1.preload(language)
+        assert preloaded == {'title': u'** %s **' % (pkg['title'])}
+        assert tr1.preload(language) is preloaded
+        assert tr1.get(yf1, language).context.value == preloaded['title']
+        assert tr1.get(yf2, language) is None
+        
+        # Preloaded translations are kept up-to-date
+        
+        tr1.translate(yf2, language, u'** %s **' % (pkg['notes']))
+        assert tr1.get(yf2, language).context.value == u'** %s **' % (pkg['notes'])
+        tr1.discard(yf2)
+        assert tr1.get(yf2, language) is None
+        assert tr1.get(yf1, language).context.value == u'** %s **' % (pkg['title'])
+
+    def test_get_version(self):
+
+        language = 'el'
+        pkg = self.packages.values()[0]
+        make_translation = lambda: package_translation.FieldTranslation(
+            pkg['id'], pkg['language'])
+
+        tr = make_translation()
+        tr.discard()
+        v0 = tr.get_version(language)
+
+        uf = zope.schema.Text()
+        yf1 = bound_field(uf, ('title',), pkg['title'])
+
+        # A version changes along with translations (as seen by any instance)
+
+        tr.translate(yf1, language, u'** %s **' % (pkg['title']))
+        v1 = make_translation().get_version(language)
+        assert v1 != v0 and v1 == tr.get_version(language)
+
+        tr.translate(yf1, language, u'++ %s ++' % (pkg['title']))
+        v2 = make_translation().get_version(language)
+        assert v2 != v1 and v2 != v0
+
+        tr.discard(yf1)
+        assert make_translation().get_version(language) == v0
+
+    def test_get_translations(self):
+        
+        language = 'el'
+        packages = []
+        for pkg_name, pkg in self.packages.items():
+            tr = package_translation.FieldTranslation(pkg['id'], pkg['language'])
+            tr.discard()
+            yf = bound_field(zope.schema.Text(), ('title',), pkg['title'])
+            tr.translate(yf, language, u'** %s **' % (pkg['title']))
+            packages.append((pkg['id'], pkg['language']))
+        
+        translations = package_translation.get_translations(
+            packages, ['title', 'notes'], language)
+        assert len(translations) == len(packages)
+        for pkg_name, pkg in self.packages.items():
+            assert translations[(pkg['id'], 'title')] == u'** %s **' % (pkg['title'])
+            assert not (pkg['id'], 'notes') in translations
+        
+        # Translations for another source language are not returned
+        translations = package_translation.get_translations(
+            [(pkg_id, language) for pkg_id, _ in packages], ['title'], language)
+        assert not translations
+
+    def test_upsert_translations(self):
+        
+        language = 'el'
+        pkg = self.packages.values()[0]
+        tr = package_translation.FieldTranslation(pkg['id'], pkg['language'])
+        tr.discard()
+        
+        records = [{
+            'package_id': pkg['id'],
+            'source_language': pkg['language'],
+            'language': language,
+            'key': k,
+            'value': u'** %s **' % (k),
+        } for k in ('title', 'notes', 'foo.baz')]
+        
+        progress = []
+        counts = package_translation.upsert_translations(
+            records, batch_size=2, progress=progress.append)
+        assert counts == {'created': 3, 'updated': 0, 'skipped': 0}
+        assert len(progress) == 2 and progress[-1] == counts
+        
+        records[0]['value'] = u'** title (updated) **'
+        records.append({'package_id': pkg['id'], 'key': 'title'}) # invalid
+        counts = package_translation.upsert_translations(records)
+        assert counts == {'created': 0, 'updated': 3, 'skipped': 1}
+        
+        tr = package_translation.FieldTranslation(pkg['id'], pkg['language'])
+        assert tr.preload(language) == {
+            'title': u'** title (updated) **', 
+            'notes': u'** notes **',
+            'foo.baz': u'** foo.baz **',
+        }
+
+    def test_translate_batch(self):
+        
+        language = 'el'
+        pkg = self.packages.values()[0]
+        tr = package_translation.FieldTranslation(pkg['id'], pkg['language'])
+        tr.discard()
+        
+        uf = zope.schema.Text()
+        with tr.batch():
+            for k in ('title', 'notes'):
+                yf = bound_field(uf, (k,), pkg[k])
+                tr.translate(yf, language, u'** %s **' % (pkg[k]))
+            # Nothing is written yet
+            tr1 = package_translation.FieldTranslation(pkg['id'], pkg['language'])
+            assert not tr1.preload(language)
+        
+        tr1 = package_translation.FieldTranslation(pkg['id'], pkg['language'])
+        assert len(tr1.preload(language)) == 2
+
     def test_term_translation(self):
         
         # Todo
@@ -249,6 +249,104 @@ def test_field_lists():
     print ' -- format:booo %s -- ' %(type(f))
     print s
    
+def test_field_lookup_cache():
+    
+    from ckanext.publicamundi.lib.metadata import adapter_registry
+
+    cache = formatters._lookup_cache
+    
+    f = zope.schema.List(
+        title=u'A list of spatial resolution objects',
+        value_type=zope.schema.Object(schema=schemata.ISpatialResolution))
+    v = [fixtures.spatialres2, fixtures.spatialres1]
+    
+    formatter1 = formatter_for_field(f, 'default')
+    assert formatter1
+    
+    hits = cache.hits
+    f1 = f.bind(FieldContext(key='f', value=v))
+    formatter2 = formatter_for_field(f1, 'default')
+    assert cache.hits == hits + 1
+    assert type(formatter2) is type(formatter1)
+    assert formatter2.field is f1
+    assert formatter2.requested_name == 'default'
+    assert formatter2.format(v) == formatter1.format(v)
+
+    # Registering an adapter should invalidate the cache
+    
+    adapter_registry.changed(adapter_registry)
+    misses = cache.misses
+    formatter3 = formatter_for_field(f, 'default')
+    assert cache.misses == misses + 1
+    assert type(formatter3) is type(formatter1)
+
+def test_object_format_cache():
+    
+    import copy
+    from ckanext.publicamundi.lib.metadata import format_cache
+    
+    format_cache.setup(backend='memory')
+    try:
+        _test_object_format_cache()
+    finally:
+        format_cache.setup()
+    
+    # Disabled by default
+    
+    x = copy.deepcopy(fixtures.foo1)
+    formatter = formatter_for_object(x, 'default')
+    stats = format_cache.stats()
+    assert formatter.format(x, {'quote': True}) == formatter._format(x, {'quote': True})
+    assert format_cache.stats()['hits'] == stats['hits']
+    assert format_cache.stats()['misses'] == stats['misses']
+
+def _test_object_format_cache():
+    
+    import copy
+    from ckanext.publicamundi.lib.metadata import format_cache
+    
+    x = copy.deepcopy(fixtures.foo1)
+    formatter = formatter_for_object(x, 'default')
+    
+    s1 = formatter.format(x, {'quote': True})
+    stats = format_cache.stats()
+    assert stats['misses'] > 0
+    
+    # Hit for an equal object, miss for other opts
+    
+    y = copy.deepcopy(x)
+    assert formatter.format(y, {'quote': True}) == s1
+    stats1 = format_cache.stats()
+    assert stats1['hits'] == stats['hits'] + 1 
+    assert stats1['misses'] == stats['misses']
+    
+    s2 = formatter.format(x)
+    assert format_cache.stats()['misses'] > stats1['misses']
+    assert s2 == formatter._format(x, {})
+    
+    # Miss after the object is modified (even in-place)
+    
+    stats = format_cache.stats()
+    y.title = u'Another Title'
+    s3 = formatter.format(y, {'quote': True})
+    assert format_cache.stats()['misses'] > stats['misses']
+    assert s3 != s1 and s3.find(u'Another Title') > 0
+    
+    x.get_digest()
+    x.tags[0] = u'omega'
+    s4 = formatter.format(x, {'quote': True})
+    assert s4 != s1 and s4.find(u'omega') > 0
+    assert s4 == formatter._format(copy.deepcopy(x), {'quote': True})
+    
+    # Not cached for opts that cannot be identified
+    
+    stats = format_cache.stats()
+    opts = {'quote': True, 'foo': object()}
+    formatter.format(x, opts)
+    formatter.format(x, opts)
+    assert format_cache.stats()['hits'] == stats['hits']
+    assert format_cache.stats()['size'] == stats['size']
+
 if __name__ == '__main__':
     
     #_test_object_dictize_with_format('thesaurus_gemet_concepts')
@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import itertools
+import multiprocessing
+import pylons
+from paste.registry import Registry
+from ckan.lib.cli import MockTranslator
+
+from ckanext.publicamundi import commands
+from ckanext.publicamundi.lib.actions import package as package_actions
+
+samples_dir = os.path.join(os.path.dirname(__file__), 'samples')
+
+sample_names = [
+    '11786ee2-828a-4513-9117-7d3b1dc93b7b.xml',
+    '12e4e303-6fe8-4f95-b1cb-991b0c3b6c92.xml',
+    '57d0f331-6950-4deb-a2f6-30e560915a2e.xml',
+]
+
+class TestImportBatch(object):
+
+    def setup(self):
+        # Note Provide a translator, as the paster command does
+        self.registry = Registry()
+        self.registry.prepare()
+        self.registry.register(pylons.translator, MockTranslator())
+        
+        self.tmpdir = tempfile.mkdtemp()
+        self.paths = []
+        for name in sample_names:
+            path = os.path.join(self.tmpdir, name)
+            shutil.copy(os.path.join(samples_dir, name), path)
+            self.paths.append(path)
+
+    def teardown(self):
+        self.registry.cleanup()
+        shutil.rmtree(self.tmpdir)
+
+    def test_file_sources(self):
+        
+        # Consume a batch (as dataset_import_batch does) before reading any source
+        
+        sources = commands.iter_file_sources(self.paths)
+        batch = list(itertools.islice(sources, 2))
+        assert len(batch) == 2
+        for path, source in zip(self.paths, batch):
+            assert source.name == path
+            with open(path, 'r') as fp:
+                assert source.read() == fp.read()
+        
+        assert len(list(sources)) == 1
+
+    def test_parse_batch(self):
+        
+        sources = commands.iter_file_sources(self.paths)
+        while True:
+            batch = list(itertools.islice(sources, 2))
+            if not batch:
+                break
+            parsed = package_actions._parse_batch(batch, 'inspire', 'acme')
+            assert len(parsed) == len(batch)
+            for pkg_dict, errors in parsed:
+                assert not errors, 'Failed to parse: %r' % (errors)
+                assert pkg_dict['dataset_type'] == 'inspire'
+                assert pkg_dict['owner_org'] == 'acme'
+                assert pkg_dict['inspire']
+
+    def test_parse_batch_with_pool(self):
+        
+        pool = multiprocessing.Pool(2, initializer=package_actions._init_worker)
+        try:
+            batch = list(commands.iter_file_sources(self.paths))
+            parsed = package_actions._parse_batch(batch, 'inspire', 'acme', pool=pool)
+        finally:
+            pool.close()
+            pool.join()
+        
+        assert len(parsed) == len(self.paths)
+        assert all(pkg_dict and not errors for pkg_dict, errors in parsed)
+
+    def test_untrusted_params(self):
+        
+        from ckanext.publicamundi.lib.actions import Invalid
+        
+        data_dict = {'owner_org': 'acme', 'archive': self.paths[0]}
+        for params, expected_keys in [
+                ({}, ['archive']),
+                ({'num_workers': 4}, ['archive', 'num_workers']),
+                ({'num_workers': 'x', 'batch_size': 'y'}, 
+                    ['archive', 'num_workers', 'batch_size']),
+            ]:
+            dd = dict(data_dict, **params)
+            try:
+                package_actions.dataset_import_batch({}, dd)
+            except Invalid as ex:
+                assert sorted(ex.error_dict.keys()) == sorted(expected_keys)
+            else:
+                assert False, 'Expected to fail (untrusted caller)'
+        
+        # A trusted caller can only fail on malformed parameters
+        
+        dd = dict(data_dict, num_workers='x')
+        try:
+            package_actions.dataset_import_batch({'local_import': True}, dd)
+        except Invalid as ex:
+            assert ex.error_dict.keys() == ['num_workers']
+        else:
+            assert False, 'Expected to fail (malformed num_workers)'
@@ -0,0 +1,100 @@
+import copy
+import json
+import nose.tools
+import zope.interface
+
+from ckanext.publicamundi.lib.json_encoder import JsonEncoder
+from ckanext.publicamundi.lib.metadata import Metadata
+from ckanext.publicamundi.lib.metadata import serializer_for_object, xml_serializer_for
+from ckanext.publicamundi.lib.metadata import lazy
+from ckanext.publicamundi.lib.metadata.lazy import (
+    LazyObject, is_materialized, materialize)
+from ckanext.publicamundi.lib.metadata.types import InspireMetadata
+from ckanext.publicamundi.lib.metadata.schemata import IInspireMetadata
+from ckanext.publicamundi.tests import fixtures
+
+def _make_lazy(obj):
+    return LazyObject(type(obj), lambda: copy.deepcopy(obj))
+
+class TestLazyObject(object):
+
+    def setup(self):
+        lazy.clear()
+
+    def test_not_materialized(self):
+        md = _make_lazy(fixtures.inspire1)
+        
+        assert isinstance(md, InspireMetadata)
+        assert isinstance(md, Metadata)
+        assert md
+        assert repr(md) == '<lazy InspireMetadata>'
+        assert not is_materialized(md)
+        assert lazy.stats() == {'created': 1, 'materialized': 0}
+
+    def test_materialized_on_access(self):
+        md = _make_lazy(fixtures.inspire1)
+        
+        assert md.title == fixtures.inspire1.title
+        assert is_materialized(md)
+        assert md == fixtures.inspire1
+        assert hash(md) == hash(materialize(md))
+        assert IInspireMetadata.providedBy(md)
+        
+        # Built only once
+        assert md.abstract == fixtures.inspire1.abstract
+        assert lazy.stats() == {'created': 1, 'materialized': 1}
+
+    def test_set_attribute(self):
+        md = _make_lazy(fixtures.inspire1)
+        md.title = u'Another title'
+        assert md.title == u'Another title'
+        assert fixtures.inspire1.title != u'Another title'
+
+    def test_copy(self):
+        md = _make_lazy(fixtures.inspire1)
+        md1 = copy.deepcopy(md)
+        assert type(md1) is InspireMetadata
+        assert md1 == fixtures.inspire1
+
+    def test_json_encode(self):
+        md = _make_lazy(fixtures.inspire1)
+        s = json.dumps({'inspire': md}, cls=JsonEncoder)
+        d = json.loads(s)['inspire']
+        assert d == fixtures.inspire1.to_json(return_string=False)
+        assert lazy.stats()['materialized'] == 1
+
+    def test_equality(self):
+        md = _make_lazy(fixtures.inspire1)
+        
+        # Symmetric, whatever side the proxy is on
+        assert fixtures.inspire1 == md and md == fixtures.inspire1
+        assert not (fixtures.inspire1 != md)
+        assert fixtures.inspire2 != md and md != fixtures.inspire2
+
+    def test_materialize(self):
+        md = _make_lazy(fixtures.inspire1)
+        md1 = materialize(md)
+        assert type(md1) is InspireMetadata
+        assert materialize(md) is md1
+        assert materialize(md1) is md1
+    
+    def test_serialize(self):
+        md = _make_lazy(fixtures.inspire1)
+        
+        for name in ['default', 'blob']:
+            ser = serializer_for_object(md, name)
+            ser1 = serializer_for_object(fixtures.inspire1, name)
+            s = ser.dumps()
+            assert s == ser1.dumps()
+            assert type(ser.loads(s)) is InspireMetadata
+        
+        xser = xml_serializer_for(md)
+        assert xser.dumps() == xml_serializer_for(fixtures.inspire1).dumps()
+
+    @nose.tools.raises(ValueError)
+    def test_factory_error(self):
+        def factory():
+            raise ValueError('Cannot build')
+        md = LazyObject(InspireMetadata, factory)
+        md.title
+
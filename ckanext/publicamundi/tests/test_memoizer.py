@@ -0,0 +1,131 @@
+import threading
+import nose.tools
+
+from ckanext.publicamundi.lib import memoizer
+from ckanext.publicamundi.lib.memoizer import memoize
+from ckanext.publicamundi.tests import fixtures
+
+def test_memoize():
+
+    calls = []
+
+    @memoize
+    def f(x):
+        calls.append(x)
+        return x * 2
+
+    assert f(2) == 4 and f(2) == 4 and f(3) == 6
+    assert calls == [2, 3]
+    
+    stats = f.cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 2 and stats['size'] == 2
+
+    f.cache.clear()
+    assert len(f.cache) == 0
+    assert f(2) == 4
+    assert calls == [2, 3, 2]
+
+def test_memoize_unhashable():
+
+    @memoize
+    def f(d):
+        return len(d)
+
+    assert f({'a': 1}) == 1
+    assert len(f.cache) == 0
+
+def test_memoize_bounded():
+
+    calls = []
+
+    @memoize(maxsize=2)
+    def f(x):
+        calls.append(x)
+        return -x
+
+    f(1); f(2); f(1); f(3)
+    assert len(f.cache) == 2
+    
+    # The least recently used (2) should be evicted
+    f(1); f(3)
+    assert calls == [1, 2, 3]
+    f(2)
+    assert calls == [1, 2, 3, 2]
+
+def test_memoize_threads():
+
+    @memoize(maxsize=10)
+    def f(x):
+        return x + 1
+
+    def run():
+        for i in xrange(1000):
+            assert f(i % 20) == (i % 20) + 1
+
+    threads = [threading.Thread(target=run) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    
+    assert len(f.cache) <= 10
+
+def test_introspection():
+
+    x = fixtures.foo1
+    cls = type(x)
+
+    fields1 = cls.get_flattened_fields(opts={'serialize-keys': True})
+    fields1.clear()
+    fields2 = cls.get_flattened_fields(opts={'serialize-keys': True})
+    assert fields2 
+    
+    names = cls.get_field_names(order=True)
+    names.pop()
+    assert len(cls.get_field_names(order=True)) == len(names) + 1
+    
+    assert list(cls.iter_fields()) == list(cls.iter_fields())
+    
+    stats = memoizer.stats()
+    assert any(s['hits'] > 0 for s in stats.values())
+
+class A(object):
+    
+    @classmethod
+    @memoize(name='A.f')
+    def f(cls, x):
+        return x
+
+class B(object):
+    
+    @classmethod
+    @memoize(maxsize=8)
+    def f(cls, x):
+        return x
+
+def test_stats_names():
+
+    A.f(1); A.f(1)
+    B.f(1)
+
+    stats = memoizer.stats()
+    a = stats['A.f']
+    b = stats[__name__ + '.f']
+    assert a['hits'] == 1 and a['misses'] == 1
+    assert b['hits'] == 0 and b['misses'] == 1 and b['maxsize'] == 8
+
+def test_registry_is_weak():
+    
+    import gc
+
+    @memoize
+    def g(x):
+        return x
+    
+    g(1)
+    name = __name__ + '.g'
+    assert name in memoizer.stats()
+    
+    del g
+    gc.collect()
+    assert not name in memoizer.stats()
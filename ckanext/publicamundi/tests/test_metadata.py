@@ -9,6 +9,8 @@ from datadiff.tools import assert_equal
 from ckanext.publicamundi.lib.json_encoder import JsonEncoder
 from ckanext.publicamundi.lib.metadata import IObject, IIntrospective, IMetadata
 from ckanext.publicamundi.lib.metadata import Object, Metadata 
+from ckanext.publicamundi.lib.metadata.base import (
+    flatten_schema, FlattenedFieldIndex)
 from ckanext.publicamundi.lib.metadata import types
 from ckanext.publicamundi.lib.metadata import schemata
 from ckanext.publicamundi.lib.metadata.schemata import (
@@ -264,6 +266,271 @@ def test_deduce_fields_foo():
     yield _test_deduce_fields_foo, 'foo1' 
     yield _test_deduce_fields_foo, 'foo2' 
 
+def test_flattened_field_index():
+
+    yield _test_flattened_field_index, 'contact1'
+    yield _test_flattened_field_index, 'foo1'
+    yield _test_flattened_field_index, 'inspire1'
+
+def _test_flattened_field_index(x):
+
+    obj = getattr(fixtures, x)
+    cls = type(obj)
+    
+    index = cls.get_flattened_field_index()
+    assert index is cls.get_flattened_field_index()
+    
+    # Materialized keys should be exactly those of a flattened schema
+
+    expected = flatten_schema(cls.get_schema())
+    assert index.materialize() == expected
+    assert len(index) == len(expected)
+    
+    # Every pattern maps to a single leaf field
+    
+    patterns = index.patterns()
+    assert len(patterns) == len(set(patterns))
+    assert len(patterns) <= len(expected)
+    
+    for kt, field in expected.iteritems():
+        assert index.lookup(kt) is field
+
+    for pattern in patterns:
+        if FlattenedFieldIndex.ANY in pattern:
+            i = pattern.index(FlattenedFieldIndex.ANY)
+            assert index.lookup(pattern[:i] + (999999,) + pattern[i+1:]) is None
+    
+    assert index.lookup(('no-such-field',)) is None
+
+def test_compact_objects():
+    
+    for x in ['contact1', 'inspire1']:
+        yield _test_compact_object, x
+
+def _test_compact_object(x):
+    
+    import pickle
+    
+    obj = getattr(fixtures, x)
+    cls = type(obj)
+    assert cls._compact_
+    
+    # Field values are not kept into the instance's __dict__
+    keys = [k for k, _ in cls.iter_fields(exclude_properties=True)]
+    d = getattr(obj, '__dict__', {})
+    assert not any(k in d for k in keys)
+    
+    # Defaults are shared, factories are called per instance
+    obj1, obj2 = cls(), cls()
+    for k in keys:
+        v1, v2 = getattr(obj1, k), getattr(obj2, k)
+        assert v1 == v2
+        if isinstance(v1, list):
+            assert not (v1 is v2)
+
+    d1 = obj.to_dict(flat=False)
+    assert_equal(d1, cls().from_dict(d1).to_dict(flat=False))
+    
+    for obj1 in (copy.deepcopy(obj), pickle.loads(pickle.dumps(obj, 0)),
+            pickle.loads(pickle.dumps(obj, 2))):
+        assert obj1 == obj
+        assert obj1.to_dict(flat=False) == d1
+        assert obj1.validate() == obj.validate()
+
+    obj1 = copy.deepcopy(obj)
+    k = keys[0]
+    setattr(obj1, k, None)
+    assert getattr(obj1, k) is None
+    assert not (getattr(obj, k) is None)
+
+def test_overlay():
+    
+    for x in ['inspire1', 'foo1']:
+        yield _test_overlay, x
+
+def _test_overlay(x):
+    
+    from ckanext.publicamundi.lib.metadata.i18n.base import make_overlay
+    
+    obj = getattr(fixtures, x)
+    d = obj.to_dict(flat=True)
+    d0 = copy.deepcopy(d)
+    
+    overrides = [(kt, u'**%s**' % (v)) for kt, v in d.iteritems() 
+        if isinstance(v, unicode)]
+    assert overrides
+    
+    obj1 = make_overlay(obj, overrides)
+    assert type(obj1) is type(obj)
+    
+    # The source object is left untouched
+    assert obj.to_dict(flat=True) == d0
+    
+    d1 = obj.to_dict(flat=True)
+    d1.update(overrides)
+    assert obj1.to_dict(flat=True) == d1
+    
+    # Same as if built from a (flattened) dict
+    obj2 = type(obj)().from_dict(d1, is_flat=True)
+    assert obj1 == obj2
+    
+    # Unaffected fields are shared
+    changed = set(kt[0] for kt, _ in overrides)
+    for k, _ in obj.iter_fields(exclude_properties=True):
+        if not k in changed:
+            assert getattr(obj1, k) is getattr(obj, k)
+
+def test_digest():
+    
+    for x in ['contact1', 'inspire1', 'foo1']:
+        yield _test_digest, x
+
+def _test_digest(x):
+    
+    import pickle
+    
+    obj = getattr(fixtures, x)
+    digest = obj.get_digest()
+    assert digest == obj.get_digest()
+    
+    obj1 = copy.deepcopy(obj)
+    assert obj1.get_digest() == digest
+    assert pickle.loads(pickle.dumps(obj)).get_digest() == digest
+    assert type(obj)().from_dict(obj.to_dict(flat=False)).get_digest() == digest
+    
+    assert obj1 == obj
+    
+    # Invalidated on mutation (even of a nested object)
+    
+    k, v = sorted((k, v) for k, v in obj.to_dict(flat=True).iteritems() 
+        if isinstance(v, unicode))[-1]
+    obj1 = copy.deepcopy(obj)
+    o = obj1
+    for i in k[:-1]:
+        o = o[i] if isinstance(o, (list, dict)) else getattr(o, i)
+    obj1.get_digest()
+    setattr(o, k[-1], v + u'!')
+    assert obj1.get_digest() != digest
+    assert obj1 != obj
+
+    setattr(o, k[-1], v)
+    assert obj1.get_digest() == digest
+    assert obj1 == obj
+
+def test_digest_of_equal_values():
+
+    from ckanext.publicamundi.lib.metadata.types import (
+        ContactInfo, SpatialResolution)
+
+    c1 = ContactInfo(email=u'nobody@example.com')
+    c2 = ContactInfo(email='nobody@example.com')
+    c1.get_digest(), c2.get_digest()
+    assert c1 == c2 and c1.get_digest() == c2.get_digest()
+
+    r1 = SpatialResolution(distance=5, uom=u'km')
+    r2 = SpatialResolution(distance=5.0, uom='km')
+    r1.get_digest(), r2.get_digest()
+    assert r1 == r2 and r1.get_digest() == r2.get_digest()
+
+    r2.distance = 5.5
+    assert r1 != r2 and r1.get_digest() != r2.get_digest()
+
+def test_digest_invalidation():
+
+    obj = copy.deepcopy(fixtures.inspire1)
+    other = copy.deepcopy(fixtures.foo1)
+    digest, other_digest = obj.get_digest(), other.get_digest()
+
+    # Setting a field on an unrelated object keeps cached digests
+    other.title = u'Baz'
+    assert obj._get_cached_digest() == digest
+    assert other._get_cached_digest() is None
+    assert other.get_digest() != other_digest
+
+    # In-place changes are not tracked by a digest, but never affect equality
+    obj1 = copy.deepcopy(obj)
+    obj1.get_digest()
+    assert obj1 == obj
+    obj1.topic_category[0] = 'farming'
+    assert obj1 != obj
+    assert obj1.to_dict() != obj.to_dict()
+    obj1.invalidate_digest()
+    assert obj1.get_digest() != digest
+
+def test_extras_storage():
+    
+    for x in ['inspire1', 'foo1']:
+        yield _test_extras_storage, x
+
+def _test_extras_storage(x):
+    
+    obj = getattr(fixtures, x)
+    cls = type(obj)
+    key_prefix = obj._dataset_type_
+    
+    opts = {
+        'serialize-keys': True, 
+        'serialize-values': 'default',
+        'key-prefix': key_prefix,
+    }
+    expected_extras = {k: v for k, v in obj.to_dict(flat=True, opts=opts).iteritems() 
+        if v is not None}
+    extras = dict(obj.to_extras(storage='flat'))
+    assert extras == expected_extras
+    
+    extras = dict(obj.to_extras(storage='blob'))
+    blob = extras.pop(cls.get_blob_key())
+    assert isinstance(blob, unicode)
+    searchable_keys = cls.get_searchable_keys()
+    assert searchable_keys
+    assert set(k.split('.')[1] for k in extras) == searchable_keys.intersection(
+        k for k, _ in obj.iter_fields(exclude_properties=True) if getattr(obj, k))
+    assert set(extras).issubset(expected_extras)
+    
+    extras[cls.get_blob_key()] = blob
+    obj1 = cls.from_converted_data(extras)
+    # Note A blob should be as good as a JSON dump
+    obj2 = cls().from_json(obj.to_json())
+    assert obj1 == obj2
+    assert obj1.to_dict(flat=True) == obj2.to_dict(flat=True)
+
+def test_extras_storage_round_trip():
+    
+    for x in ['inspire1', 'foo1']:
+        yield _test_extras_storage_round_trip, x
+
+def _test_extras_storage_round_trip(x):
+    
+    obj = getattr(fixtures, x)
+    cls = type(obj)
+    key_prefix = obj._dataset_type_
+    expected = cls().from_json(obj.to_json())
+    
+    # Feed a package shown in blob mode (i.e. a blob plus flat keys for searchable
+    # fields) to an update (e.g. as resource_create does)
+    
+    shown = dict(obj.to_extras(storage='blob'))
+    data = {(k,): v for k, v in shown.iteritems()}
+    data[('id',)] = obj.identifier
+    obj1 = cls.from_converted_data(data, for_edit=True)
+    assert obj1.to_dict(flat=True) == expected.to_dict(flat=True)
+    
+    # Searchable fields are loaded from (possibly modified) flat keys
+    
+    data[('%s.title' % (key_prefix),)] = u'Another title'
+    obj2 = cls.from_converted_data(data, for_edit=True)
+    assert obj2.title == u'Another title'
+    obj2.title = obj1.title
+    assert obj2.to_dict(flat=True) == obj1.to_dict(flat=True)
+    
+    # A blob is ignored when flat keys are given for non-searchable fields
+    
+    data = {(k,): v for k, v in obj.to_extras(storage='flat')}
+    data[(cls.get_blob_key(),)] = shown[cls.get_blob_key()]
+    data[('%s.title' % (key_prefix),)] = u'Another title'
+    obj3 = cls.from_converted_data(data, for_edit=True)
+    assert obj3.title == u'Another title'
+
 if __name__  == '__main__':
      
     x = fixtures.foo1
@@ -0,0 +1,83 @@
+import nose.tools
+
+from ckanext.publicamundi.lib.metadata import object_cache
+from ckanext.publicamundi.tests import fixtures
+
+pkg_dict = {
+    'id': '3a8ff5a4-4bb8-4f6f-9a1d-5d7bd3a2ab12',
+    'revision_id': 'fd5b4fc7-4e5b-4b0d-8ab5-c6a1ba3a5d2b',
+    'dataset_type': 'inspire',
+}
+
+class View(object):
+    
+    def __init__(self, cache_key):
+        self.cache_key = cache_key
+
+class TestObjectCache(object):
+
+    def setup(self):
+        object_cache.setup('memory')
+
+    def teardown(self):
+        object_cache.setup('memory')
+
+    def test_keys(self):
+        k1 = object_cache.make_key(pkg_dict)
+        assert k1 == object_cache.make_key(dict(pkg_dict))
+        assert k1 != object_cache.make_key(pkg_dict, return_json=True)
+        assert k1 != object_cache.make_key(pkg_dict, view=View('translated-el-en'))
+        
+        # A view that cannot be identified is not cached
+        assert object_cache.make_key(pkg_dict, view=lambda md: md) is None
+        
+        # A different revision yields a different key
+        pkg_dict1 = dict(pkg_dict, revision_id='3b6a3a50-0d79-4e3a-8b8b-2b6a5ba0d3a1')
+        assert k1 != object_cache.make_key(pkg_dict1)
+        
+        # Revision is needed
+        pkg_dict2 = dict(pkg_dict)
+        del pkg_dict2['revision_id']
+        assert object_cache.make_key(pkg_dict2) is None
+        pkg_dict2['metadata_modified'] = '2015-01-01T00:00:00'
+        assert object_cache.make_key(pkg_dict2)
+
+    def test_get_put(self):
+        md = fixtures.inspire1
+        k1 = object_cache.make_key(pkg_dict)
+        assert object_cache.get(k1) is None
+        object_cache.put(k1, md)
+        assert object_cache.get(k1) is md
+        
+        k2 = object_cache.make_key(pkg_dict, return_json=True)
+        object_cache.put(k2, md.to_json(return_string=False))
+        assert object_cache.get(k2) == md.to_json(return_string=False)
+        
+        stats = object_cache.stats()
+        assert stats['size'] == 2 and stats['hits'] == 2 and stats['misses'] == 1
+
+    def test_invalidate(self):
+        md = fixtures.inspire1
+        k1 = object_cache.make_key(pkg_dict)
+        k2 = object_cache.make_key(pkg_dict, view=View('translated-el-en'))
+        other_pkg_dict = dict(pkg_dict, id='0f5e6c3c-5cf7-4d0e-a9a4-3e7e10c2b0a7')
+        k3 = object_cache.make_key(other_pkg_dict)
+        for k in (k1, k2, k3):
+            object_cache.put(k, md)
+        
+        object_cache.invalidate(pkg_dict['id'])
+        assert object_cache.get(k1) is None
+        assert object_cache.get(k2) is None
+        assert object_cache.get(k3) is md
+
+        # Invalidating an unknown package is a noop
+        object_cache.invalidate('e4c7d0ba-86a1-4a0d-a9b5-13c9ab0b5a9e')
+
+    def test_backend_none(self):
+        object_cache.setup('none')
+        assert object_cache.make_key(pkg_dict) is None
+
+    @nose.tools.raises(ValueError)
+    def test_unknown_backend(self):
+        object_cache.setup('redis')
+
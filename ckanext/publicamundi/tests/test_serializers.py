@@ -10,6 +10,7 @@ from datadiff.tools import assert_equal
 from zope.interface.verify import verifyObject
 
 from ckanext.publicamundi.lib.metadata import ISerializer
+from ckanext.publicamundi.lib.metadata.ibase import IKeyTupleSerializer
 from ckanext.publicamundi.lib.metadata import serializers
 from ckanext.publicamundi.lib.metadata.serializers import \
     serializer_for_key_tuple, serializer_for_field
@@ -53,6 +54,42 @@ def test_key_tuples():
         k = ser.dumps(kt1)
         assert ser.loads(k) == kt1
 
+def test_key_tuples_interned():
+    
+    x = fixtures.foo1
+    d = x.to_dict(flat=True)
+    
+    ser = serializer_for_key_tuple('foo')
+    assert IKeyTupleSerializer.providedBy(ser)
+    
+    d1 = ser.dumps_all(d)
+    assert len(d1) == len(d)
+    for kt, v in d.iteritems():
+        k = ser.dumps(kt)
+        assert k.startswith('foo.')
+        assert d1[k] == v
+        assert ser.dumps(kt) is k 
+        assert serializer_for_key_tuple('foo').dumps(list(kt)) is k
+        kt1 = ser.loads(k)
+        assert kt1 == tuple(map(str, kt))
+        assert ser.loads(unicode(k)) is kt1
+    
+    # Keys not under our prefix are skipped
+    d1['baz.a.b'] = 1
+    d2 = ser.loads_all(d1)
+    assert d2 == {tuple(map(str, kt)): v for kt, v in d.iteritems()}
+    
+    # Malformed keys are not interned
+    try:
+        ser.loads('baz.a.b')
+    except ValueError:
+        pass
+    else:
+        assert False, 'Expected ValueError for a malformed key'
+    
+    assert (ser.get_key_predicate(basestring, strict=True) is 
+        ser.get_key_predicate(basestring, strict=True))
+
 def _test_fixture_fields(fixture_name):
     
     x = getattr(fixtures, fixture_name)
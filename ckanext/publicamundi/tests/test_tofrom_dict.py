@@ -8,10 +8,11 @@ from datetime import date, time, datetime
 from itertools import chain
 
 from ckanext.publicamundi.lib.util import dot_lookup, diff_dicts
+from ckanext.publicamundi.lib.metadata import adapter_registry
 from ckanext.publicamundi.lib.metadata.base import (
-    Object, serializer_for_object,
+    Object, DictizePlan, serializer_for_object,
     serializer_for_field, serializer_for_key_tuple)
-from ckanext.publicamundi.lib.dictization import flatten
+from ckanext.publicamundi.lib.dictization import flatten, unflatten
 from ckanext.publicamundi.lib.metadata import schemata
 from ckanext.publicamundi.lib.metadata import types
 from ckanext.publicamundi.tests import fixtures
@@ -322,6 +323,67 @@ def _test_dictize(fixture_name):
         opts = { 'serialize-keys': True, 'key-prefix': 'test1', 'max-depth': n }
         yield _test_dictize_flattened, fixture_name, opts
 
+@nose.tools.istest
+def test_dictize_plan_cached():
+    
+    x = fixtures.foo1
+    
+    opts = { 'serialize-values': 'json-s' }
+    d1 = x.to_dict(flat=True, opts=opts)
+    
+    spec = DictizePlan.make_spec(opts)
+    plan = DictizePlan.for_class(type(x), spec)
+    assert plan is DictizePlan.for_class(type(x), spec)
+    assert not (plan is DictizePlan.for_class(type(x), DictizePlan.make_spec({})))
+    
+    # A plan should be recompiled after a change on the adapter registry
+    
+    adapter_registry.changed(adapter_registry)
+    plan1 = DictizePlan.for_class(type(x), spec)
+    assert not (plan1 is plan)
+    
+    d2 = x.to_dict(flat=True, opts=opts)
+    assert_equal(d1, d2)
+
+@nose.tools.istest
+def test_load_flattened():
+
+    fixture_names = [
+        'contact1', 
+        'foo1', 'foo2', 'foo3', 'foo4', 'foo5', 'foo6', 'foo7', 'foo8',
+        'baz1',
+        'inspire1', 'inspire2',
+    ]
+
+    for name in fixture_names:
+        yield _test_load_flattened, name, {}
+        yield _test_load_flattened, name, { 'serialize-values': 'default' }
+        yield _test_load_flattened, name, { 'serialize-values': 'json-s' }
+
+def _test_load_flattened(fixture_name, opts):
+    
+    x = getattr(fixtures, fixture_name)
+    factory = type(x)
+    
+    opts1 = {
+        'unserialize-values': opts.get('serialize-values', False),
+        'use-defaults': False,
+    }
+    
+    df = x.to_dict(flat=True, opts=opts)
+    # Add some junk, which should be ignored
+    df[('no-such-field',)] = 0
+    df[('no-such-field', 'a')] = 1
+    
+    # Load via a compiled plan
+    x1 = factory().from_dict(df, is_flat=True, opts=opts1)
+    
+    # Load via an intermediate nested dict
+    x2 = factory()
+    factory.Loader(x2, opts1).load(unflatten(df))
+
+    assert x1 == x2
+
 #
 # Fixture changesets
 #
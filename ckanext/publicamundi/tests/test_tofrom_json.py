@@ -42,6 +42,26 @@ def _test_fixture_object(name):
     assert s1d == s3d
     assert s1f == s3f
 
+def test_json_writer():
+    for name in ['contact1', 'bbox1', 'foo1', 'inspire1', 'thesaurus_gemet_concepts']:
+        yield _test_json_writer, name
+
+def _test_json_writer(name):
+    
+    from ckanext.publicamundi.lib.metadata import serializer_for
+    
+    x1 = getattr(fixtures, name)
+    d1 = x1.to_json(return_string=False)
+
+    s1 = x1.to_json()
+    assert isinstance(s1, str)
+    assert json.loads(s1) == d1
+    assert json.loads(s1) == json.loads(json.dumps(d1))
+    
+    s2 = serializer_for(x1, 'blob').dumps()
+    assert json.loads(s2) == d1
+    assert len(s2) <= len(s1)
+
 if __name__ == '__main__':
     _test_fixture_object('foo1')
 
@@ -5,6 +5,7 @@ import json
 import datetime
 import nose.tools
 
+from ckanext.publicamundi.lib.metadata.base import ErrorRecord
 from ckanext.publicamundi.lib.metadata.types import *
 
 from ckanext.publicamundi.tests import helpers
@@ -178,6 +179,88 @@ def test_valid_x3():
     '''Verify a valid object'''
     helpers.assert_faulty_keys(x3, expected_keys=[])
 
+@nose.tools.istest
+def test_validate_many():
+    yield _test_validate_many, [x11, x12, x13, x14]
+    yield _test_validate_many, [x21, x22, x24, x3]
+    yield _test_validate_many, [x3, x3, x11]
+
+def _collect_error_messages(errs_dict, prefix=()):
+    res = {}
+    for k, v in errs_dict.items():
+        if isinstance(v, dict):
+            res.update(_collect_error_messages(v, prefix + (k,)))
+        else:
+            res[prefix + (k,)] = sorted(v)
+    return res
+
+def _test_validate_many(objs):
+    '''Compare error records from batch validation to dictized errors'''
+    
+    results = FooMetadata.validate_many(objs)
+    assert len(results) == len(objs)
+    
+    for x, records in zip(objs, results):
+        expected = _collect_error_messages(x.validate(dictize_errors=True))
+        
+        assert all(isinstance(r, ErrorRecord) for r in records)
+        found = {}
+        for r in records:
+            found.setdefault(r.key, []).append(r.message)
+            if r.key[-1] != '__after':
+                assert r.message.startswith(r.code + ':')
+        for k in found:
+            found[k].sort()
+        
+        assert found == expected
+
+def test_validate_keys():
+    '''Validate only a subset of (top-level) fields'''
+    
+    errs_dict = x11.validate(dictize_errors=True, keys=['url', 'tags', 'title'])
+    assert set(errs_dict.keys()) == set(['url', 'tags'])
+    
+    errs_dict = x11.validate(dictize_errors=True, keys=[])
+    assert not errs_dict
+
+    # Own invariants are always checked, invariants on fields only if included
+    
+    errs_dict = x21.validate(dictize_errors=True, keys=['tags'])
+    assert set(errs_dict.keys()) == set(['__after'])
+    
+    errs_dict = x21.validate(dictize_errors=True, keys=['tags', 'temporal_extent'])
+    assert set(errs_dict.keys()) == set(['__after', 'temporal_extent'])
+    
+    # Keys are not applied to nested objects
+
+    errs_dict = x21.validate(dictize_errors=True, keys=['contact_info'])
+    assert errs_dict['contact_info'] == x21.validate(dictize_errors=True)['contact_info']
+
+def test_find_changed_keys():
+    from ckanext.publicamundi.lib.metadata.validators import _find_changed_keys
+    
+    prev_extras = {
+        'foo.title': u'Hello',
+        'foo.tags.0': u'alpha',
+        'foo.tags.1': u'beta',
+        'foo.url': u'http://example.com',
+        'foo.contact_info.email': u'a@example.com',
+        'language': u'en',
+    }
+    extras = [
+        ('foo.title', u'Hello'),
+        ('foo.tags.0', u'alpha'),
+        ('foo.url', u'http://example.com/1'),
+        ('foo.contact_info.email', u'a@example.com'),
+        ('foo.rating', u'5'),
+    ]
+    
+    changed_keys = _find_changed_keys('foo', prev_extras, extras)
+    assert changed_keys == set(['tags', 'url', 'rating'])
+    
+    changed_keys = _find_changed_keys('foo', prev_extras, prev_extras.items())
+    assert not changed_keys
+
 ## Main ##
 
 if __name__ == '__main__':
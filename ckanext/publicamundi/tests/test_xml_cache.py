@@ -0,0 +1,91 @@
+import os
+import time
+import shutil
+import tempfile
+import nose.tools
+from lxml import etree
+
+from ckanext.publicamundi import reference_data
+from ckanext.publicamundi.lib import xml_cache
+
+xsl_data = '''<?xml version="1.0"?>
+<xsl:stylesheet version="1.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform">
+  <xsl:template match="/"><out><xsl:value-of select="%s"/></out></xsl:template>
+</xsl:stylesheet>
+'''
+
+class TestXmlCache(object):
+
+    def setup(self):
+        self.tmpdir = tempfile.mkdtemp()
+        xml_cache.clear()
+
+    def teardown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, name, data, mtime=None):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'w') as fp:
+            fp.write(data)
+        if mtime:
+            os.utime(path, (mtime, mtime))
+        return path
+
+    def test_xslt_is_cached(self):
+        path = self._write('a.xsl', xsl_data % ('count(//a)'))
+
+        t1 = xml_cache.get_xslt(path)
+        t2 = xml_cache.get_xslt(path)
+        assert t1 is t2
+
+        # Note Missed twice: for the parsed stylesheet and for the transformer
+        stats = xml_cache.stats()
+        assert stats['hits'] == 1 and stats['misses'] == 2
+
+        result = t1(etree.fromstring('<r><a/><a/></r>'))
+        assert str(result.getroot().text) == '2'
+
+    def test_xslt_invalidated_on_mtime(self):
+        t0 = int(time.time()) - 100
+        path = self._write('a.xsl', xsl_data % ('count(//a)'), mtime=t0)
+        t1 = xml_cache.get_xslt(path)
+
+        path = self._write('a.xsl', xsl_data % ('count(//b)'), mtime=t0 + 10)
+        t2 = xml_cache.get_xslt(path)
+        assert not (t1 is t2)
+
+        result = t2(etree.fromstring('<r><a/><b/><b/><b/></r>'))
+        assert str(result.getroot().text) == '3'
+
+    def test_parse_xml_copy(self):
+        path = self._write('a.xml', '<r><a/></r>')
+
+        tree = xml_cache.parse_xml(path)
+        assert tree is xml_cache.parse_xml(path)
+
+        tree1 = xml_cache.parse_xml(path, copy_tree=True)
+        assert not (tree1 is tree)
+        tree1.getroot().append(etree.Element('b'))
+        assert len(tree.getroot()) == 1
+
+    def test_validate_xml(self):
+        xsd_path = self._write('a.xsd', '''<?xml version="1.0"?>
+            <xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema">
+              <xs:element name="r" type="xs:int"/>
+            </xs:schema>''')
+
+        errors = xml_cache.validate_xml(etree.fromstring('<r>42</r>'), xsd_path)
+        assert errors == []
+
+        errors = xml_cache.validate_xml(etree.fromstring('<r>x</r>'), xsd_path)
+        assert len(errors) == 1
+        assert errors[0][0] == 1
+
+        assert xml_cache.get_xml_schema(xsd_path) is xml_cache.get_xml_schema(xsd_path)
+
+    def test_reference_xsd(self):
+        xsd_file = reference_data.get_path(
+            'xsd/isotc211.org-2005/gmd/metadataEntity.xsd')
+        xsd = xml_cache.get_xml_schema(xsd_file)
+        assert isinstance(xsd, etree.XMLSchema)
+
@@ -1,6 +1,7 @@
 # -*- encoding: utf-8 -*-
 
 import re
+import io
 import datetime
 import pytz
 import isodate
@@ -127,6 +128,76 @@ def _test_fixture_object(fixture_name):
     assert keys == keys1
     assert all([ d[k] == d1[k] for k in keys ])
 
+    # Dump incrementally, should produce the same XML tree
+    
+    chunks = list(ser.iter_dumps(x))
+    assert len(chunks) > 1
+    s2 = b''.join(chunks)
+    
+    parser = lxml.etree.XMLParser(remove_blank_text=True)
+    assert (
+        lxml.etree.tostring(lxml.etree.fromstring(s, parser)) == 
+        lxml.etree.tostring(lxml.etree.fromstring(s2, parser)))
+    assert xsd_validator.validate(lxml.etree.fromstring(s2))
+    
+    x2 = ser.loads(s2)
+    assert x2.to_dict(flat=True) == d1
+
+@nose.tools.istest
+def test_iter_loads():
+    yield _test_iter_loads, ['pt1', 'pt1']
+    yield _test_iter_loads, ['contact1', 'contact2', 'contact3']
+    yield _test_iter_loads, ['foo1', 'foo2', 'foo3', 'foo4']
+    yield _test_iter_loads, ['foo1']
+
+def _test_iter_loads(fixture_names):
+    '''Test loading a multi-record XML document
+    '''
+    
+    target_namespace = 'http://example.com/test-multiple-records'
+    
+    objs = [getattr(fixtures, name) for name in fixture_names]
+    ser = xml_serializer_for_object(objs[0]) 
+    ser.target_namespace = target_namespace
+
+    root = lxml.etree.Element('records')
+    for x in objs:
+        root.append(ser.to_xml(x, nsmap={ None: target_namespace }))
+    s = lxml.etree.tostring(root, xml_declaration=True, encoding='utf-8')
+
+    loaded = ser.iter_loads(io.BytesIO(s))
+    assert not isinstance(loaded, list)
+    loaded = list(loaded)
+    assert len(loaded) == len(objs)
+    for x, x1 in zip(objs, loaded):
+        x2 = ser.loads(ser.dumps(x))
+        assert x1.to_dict(flat=True) == x2.to_dict(flat=True)
+
+@nose.tools.istest
+def test_inspire_standalone():
+    yield _test_inspire_standalone, 'inspire1'
+    yield _test_inspire_standalone, 'inspire3'
+
+def _test_inspire_standalone(fixture_name):
+    '''Test that INSPIRE metadata can be dumped without a request context
+    '''
+    
+    x = getattr(fixtures, fixture_name)
+    ser = xml_serializer_for_object(x)
+    
+    s = ser.dumps()
+    assert isinstance(s, str)
+    assert s == b''.join(ser.iter_dumps(x))
+
+    e = ser.to_xml()
+    assert isinstance(e, lxml.etree._Element)
+    assert e.tag == '{http://www.isotc211.org/2005/gmd}MD_Metadata'
+    assert lxml.etree.tostring(e) == lxml.etree.tostring(lxml.etree.fromstring(s))
+    
+    x1 = ser.loads(s)
+    assert x1.identifier == x.identifier
+    assert x1.title == x.title
+
 def test_field_nativestring():
 
     f = zope.schema.NativeString(